@@ -0,0 +1,135 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks and integration tests.
+
+Serves /api/generate and /api/chat (streaming NDJSON or single JSON),
+/api/tags and /api/version. Replies come from a script of canned
+responses, split into word tokens and emitted with a configurable time to
+first token and token rate.
+"""
+
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Union
+
+Script = Union[List[str], Callable[[dict], str]]
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r'\s*\S+|\s+', text) or ['']
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, script: Script, latency: float = 0.0, tokens_per_second: Optional[float] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.script = script
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests: List[dict] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_response(self, payload: dict) -> str:
+        with self._lock:
+            self.requests.append(payload)
+            count = len(self.requests)
+        if callable(self.script):
+            return self.script(payload)
+        return self.script[(count - 1) % len(self.script)]
+
+    def start(self) -> 'FakeOllamaServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeOllamaServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/version':
+            self._send_json({'version': '0.0.0-fake'})
+        elif self.path == '/api/tags':
+            self._send_json({'models': []})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self.path not in ('/api/generate', '/api/chat'):
+            self._send_json({'error': 'not found'}, 404)
+            return
+
+        chat = self.path == '/api/chat'
+        text = self.server.next_response(payload)
+        tokens = tokenize(text)
+        prompt = json.dumps(payload.get('messages')) if chat else payload.get('prompt') or ''
+        time.sleep(self.server.latency)
+
+        def chunk(content: str, done: bool) -> dict:
+            body = {'model': payload.get('model', ''), 'created_at': datetime.now(timezone.utc).isoformat(), 'done': done}
+            if chat:
+                body['message'] = {'role': 'assistant', 'content': content}
+            else:
+                body['response'] = content
+            if done:
+                body.update({'done_reason': 'stop', 'prompt_eval_count': len(prompt) // 4, 'eval_count': len(tokens)})
+            return body
+
+        if payload.get('stream', True) is False:
+            self._pace(len(tokens))
+            self._send_json(chunk(text, True))
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in tokens:
+            self._pace(1)
+            self._write_chunk(json.dumps(chunk(token, False)) + '\n')
+        self._write_chunk(json.dumps(chunk('', True)) + '\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _pace(self, count: int):
+        if self.server.tokens_per_second:
+            time.sleep(count / self.server.tokens_per_second)
+
+    def _write_chunk(self, text: str):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b'\r\n')
+        self.wfile.flush()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Benchmark the request pipeline against a local fake Ollama server.
+
+    python -m benchmarks.run_benchmarks --save benchmarks/baselines/local.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baselines/local.json
+
+Each benchmark reports median/p90/min/max seconds over its repetitions.
+With --compare, any median that grew by more than --threshold is listed
+and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import FakeOllamaServer  # noqa: E402
+from vibe_coder.plan_parser import parse_plan  # noqa: E402
+from vibe_coder.terminal import SudoTerminal  # noqa: E402
+
+RESPONSE = """Let's verify the environment first.
+git --version
+```
+echo "vibe" > vibe.txt
+cat vibe.txt
+```
+The compiler is the final arbiter of truth.
+"""
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        'n': len(ordered),
+        'median': statistics.median(ordered),
+        'p90': ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        'min': ordered[0],
+        'max': ordered[-1],
+    }
+
+
+def repeat(fn: Callable[[], None], n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+@contextmanager
+def in_tempdir():
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            yield directory
+        finally:
+            os.chdir(previous)
+
+
+def bench_cold_start(server: FakeOllamaServer, n: int) -> Dict[str, Dict]:
+    from vibe_coder.core import VirtualVibeCoder
+
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_home:
+        def construct(cold: bool):
+            if cold:
+                # A missing cache file forces every tool probe
+                shutil.rmtree(os.path.join(cache_home, 'vibe_coder'), ignore_errors=True)
+            # The environment is built on first use; touch it to time tool detection
+            VirtualVibeCoder(model_name="bench", ollama_host=server.url).environment
+
+        previous = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = cache_home
+        try:
+            results['cold_start.tool_cache_cold'] = summarize(repeat(lambda: construct(True), n))
+            results['cold_start.tool_cache_warm'] = summarize(repeat(lambda: construct(False), n))
+        finally:
+            if previous is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = previous
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import vibe_coder.core'], check=True)
+    results['cold_start.import_core'] = summarize([time.perf_counter() - start])
+    return results
+
+
+def bench_process_request(server: FakeOllamaServer, n: int, backend: str) -> Dict[str, Dict]:
+    from vibe_coder.core import VirtualVibeCoder
+
+    phases: Dict[str, List[float]] = {'llm': [], 'parse': [], 'execute': [], 'total': []}
+    with in_tempdir():
+        coder = VirtualVibeCoder(model_name="bench", ollama_host=server.url, backend=backend)
+        invoke, execute = coder._invoke_llm, coder._execute_plan
+
+        def timed_invoke(messages):
+            start = time.perf_counter()
+            try:
+                return invoke(messages)
+            finally:
+                phases['llm'].append(time.perf_counter() - start)
+
+        def timed_execute(plan, request):
+            start = time.perf_counter()
+            parse_plan(plan)
+            phases['parse'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            try:
+                return execute(plan, request)
+            finally:
+                phases['execute'].append(time.perf_counter() - start)
+
+        coder._invoke_llm, coder._execute_plan = timed_invoke, timed_execute
+        for _ in range(n):
+            coder.conversation_history.clear()
+            start = time.perf_counter()
+            coder.process_request("Write vibe.txt and show it")
+            phases['total'].append(time.perf_counter() - start)
+
+    return {f'process_request.{backend}.{phase}': summarize(samples) for phase, samples in phases.items()}
+
+
+def bench_execute_command(n: int) -> Dict[str, Dict]:
+    results = {}
+    with in_tempdir():
+        terminal = SudoTerminal()
+        results['execute_command.subprocess'] = summarize(repeat(lambda: terminal.execute_command("true"), n))
+        session = SudoTerminal(persistent_shell=True)
+        try:
+            results['execute_command.persistent_shell'] = summarize(repeat(lambda: session.execute_command("true"), n))
+        finally:
+            session.close()
+    return results
+
+
+def bench_execute_plan(steps: int, n: int) -> Dict[str, Dict]:
+    from vibe_coder.core import VirtualVibeCoder
+
+    plan = '\n'.join(f"Step {i}\n```\necho {i} > file_{i}.txt\n```" for i in range(steps))
+    results = {}
+    with in_tempdir():
+        coder = VirtualVibeCoder(model_name="bench")
+        for workers in (1, 4):
+            coder.max_parallel_steps = workers
+            samples = repeat(lambda: coder._execute_plan(plan, "bench"), n)
+            summary = summarize(samples)
+            summary['steps_per_second'] = steps / summary['median']
+            results[f'execute_plan.{steps}_blocks.workers_{workers}'] = summary
+
+    big = RESPONSE * 2000
+    results['parse_plan.large_response'] = summarize(repeat(lambda: parse_plan(big), n))
+    results['parse_plan.large_response']['bytes'] = len(big)
+    return results
+
+
+def metadata() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def compare(results: Dict[str, Dict], baseline_path: str, threshold: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, summary in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['median'], summary['median']
+        change = (after - before) / before if before else 0.0
+        marker = ''
+        if change > threshold:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:55s} {before * 1000:10.3f}ms -> {after * 1000:10.3f}ms ({change:+.1%}){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vibe Coder benchmarks")
+    parser.add_argument("--repeat", type=int, default=10, help="Repetitions per benchmark")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake server time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=2000, help="Fake server generation rate")
+    parser.add_argument("--plan-steps", type=int, default=50, help="Blocks in the large-plan benchmark")
+    parser.add_argument("--save", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", help="Compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown before flagging")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict] = {}
+    with FakeOllamaServer([RESPONSE], latency=args.latency, tokens_per_second=args.tokens_per_second) as server:
+        results.update(bench_cold_start(server, args.repeat))
+        for backend in ('completion', 'chat'):
+            results.update(bench_process_request(server, args.repeat, backend))
+    results.update(bench_execute_command(args.repeat * 10))
+    results.update(bench_execute_plan(args.plan_steps, args.repeat))
+
+    report = {'meta': metadata(), 'config': vars(args), 'results': results}
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        sys.exit(1 if compare(results, args.compare, args.threshold) else 0)
+    for name, summary in sorted(results.items()):
+        print(f"{name:55s} median {summary['median'] * 1000:10.3f}ms  p90 {summary['p90'] * 1000:10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
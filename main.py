@@ -4,18 +4,98 @@ Virtual Vibe Coder - AI-assisted development on Arch Linux
 """
 
 import argparse
-from vibe_coder.core import VirtualVibeCoder
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-import readline  # For better input handling
+from vibe_coder import __version__
 
-console = Console()
+# Heavy modules (rich, the LLM client, tool detection) are loaded on first
+# use so that --help, --version and the first prompt appear immediately
+console = None
+
+def get_console():
+    global console
+    if console is None:
+        from rich.console import Console
+        console = Console()
+    return console
+
+def keep_alive(value):
+    """--keep-alive: a duration such as 30m, or seconds as a number"""
+    try:
+        return float(value)
+    except ValueError:
+        return value
 
 def main():
     parser = argparse.ArgumentParser(description="Virtual Vibe Coder")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
     parser.add_argument("--model", default="deepseek-r1:8b", help="Ollama model to use")
+    parser.add_argument("--models", metavar="SMALL,...,BIG",
+                        help="Try each request on the first model, escalating to the next when its plan fails")
+    parser.add_argument("--batch", metavar="FILE.jsonl", help="Process requests from a JSONL file and exit")
+    parser.add_argument("--output", default="results.jsonl", help="Batch mode: JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Batch mode: number of worker processes")
+    parser.add_argument("--workdir", help="Batch and server mode: directory for per-request or per-session working directories "
+                             "(server default: $XDG_DATA_HOME/vibe_coder/sessions)")
+    parser.add_argument("--start-offset", type=int, default=0, help="Batch mode: skip input lines before this offset")
+    parser.add_argument("--no-resume", action="store_true", help="Batch mode: rerun requests already in the output file")
+    parser.add_argument("--resume", metavar="SESSION", help="Continue a stored session ('last' for the most recent)")
+    parser.add_argument("--sessions", action="store_true", help="List recent sessions and exit")
+    parser.add_argument("--search", metavar="TEXT", help="Search past sessions' turns and commands and exit")
+    parser.add_argument("--session-db", metavar="FILE", help="Session database (default: $XDG_DATA_HOME/vibe_coder/sessions.db)")
+    parser.add_argument("--no-history", action="store_true", help="Do not record this session")
+    parser.add_argument("--serve", action="store_true", help="Serve many sessions over HTTP instead of the REPL")
+    parser.add_argument("--host", default="0.0.0.0", help="Server mode: address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Server mode: port to listen on")
+    parser.add_argument("--model-slots", type=int, default=1, help="Server mode: generations run on the model at once")
+    parser.add_argument("--max-queue", type=int, default=32, help="Server mode: generations allowed to wait for the model")
+    parser.add_argument("--max-sessions", type=int, default=32, help="Server mode: open sessions allowed at once")
+    parser.add_argument("--rollback-failed-plans", action="store_true",
+                        help="Snapshot the current directory before each plan and restore it if a step fails")
+    parser.add_argument("--verify", action="store_true",
+                        help="After each plan, run the tests and builds affected by the files it changed")
+    parser.add_argument("--backend", choices=("completion", "chat"), default="completion",
+                        help="Ollama endpoint: chat reuses the model's KV cache across turns")
+    parser.add_argument("--keep-alive", type=keep_alive, metavar="DURATION",
+                        help="How long Ollama keeps the model loaded after a request (e.g. 30m; -1 for ever)")
+    parser.add_argument("--warm-up", action="store_true",
+                        help="Load the model and the system prompt in the background at start-up")
+    parser.add_argument("--temperature", type=float, help="Sampling temperature (default: the model's)")
+    parser.add_argument("--seed", type=int, help="Sampling seed, for reproducible responses")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse responses to repeated prompts across runs (needs --temperature 0 or --seed)")
+    parser.add_argument("--persistent-shell", action="store_true",
+                        help="Run commands in one long-lived bash, so exports and activated virtualenvs persist")
+    parser.add_argument("--json-plans", action="store_true",
+                        help="Ask the model for a JSON plan matching a schema instead of a markdown answer")
+    parser.add_argument("--trace", metavar="FILE.jsonl", help="Append per-phase spans to a JSON-lines trace file")
+    parser.add_argument("--metrics", metavar="FILE.prom", help="Write latency histograms in Prometheus text format")
     args = parser.parse_args()
+    if args.cache and args.temperature != 0 and args.seed is None:
+        parser.error("--cache needs --temperature 0 or --seed: sampled responses are not reused")
+    
+    if args.trace or args.metrics or args.serve:
+        from vibe_coder import tracing
+        # The server keeps histograms in memory for its /metrics endpoint
+        tracing.configure(trace_path=args.trace, metrics_path=args.metrics, enabled=True)
+    
+    if args.batch:
+        run_batch_mode(args)
+        return
+    
+    from vibe_coder.sessions import SessionStore
+    store = None if args.no_history else SessionStore(args.session_db)
+    if args.serve:
+        run_serve_mode(args, store)
+        return
+    if args.sessions or args.search:
+        if store is None:
+            parser.error("--sessions and --search need the session history")
+        show_sessions(store, args.search)
+        return
+    
+    from rich.panel import Panel
+    import readline  # For better input handling
+    from vibe_coder.core import VirtualVibeCoder
+    console = get_console()
     
     console.print(Panel.fit(
         "[bold cyan]Virtual Vibe Coder[/bold cyan]\n"
@@ -25,19 +105,44 @@ def main():
     
     # Initialize the vibe coder
     try:
-        vibe_coder = VirtualVibeCoder(model_name=args.model)
+        session_id = args.resume
+        if session_id == 'last':
+            session_id = store and store.latest_session()
+        if args.resume and not (store and session_id):
+            console.print("[red]No stored session to resume[/red]")
+            return
+        router = model_router(args)
+        vibe_coder = VirtualVibeCoder(model_name=router.models[0] if router else args.model,
+                                      session_store=store, session_id=session_id,
+                                      rollback_failed_plans=args.rollback_failed_plans,
+                                      verify_plans=args.verify, verify_cache=verify_cache(args), router=router,
+                                      json_plans=args.json_plans, persistent_shell=args.persistent_shell,
+                                      temperature=args.temperature, seed=args.seed, cache=response_cache(args),
+                                      backend=args.backend, keep_alive=args.keep_alive, warm_up=args.warm_up)
         console.print("[green]✓ Vibe Coder initialized successfully[/green]")
-        console.print(vibe_coder.get_environment_info())
     except Exception as e:
         console.print(f"[red]Error initializing Vibe Coder: {e}[/red]")
         return
     
+    if session_id:
+        console.print(f"[green]Resumed session {session_id} "
+                      f"({len(vibe_coder.conversation_history)} messages in context)[/green]")
+        interrupted = store.interrupted_request(session_id)
+        if interrupted:
+            console.print("[yellow]The last request was interrupted:[/yellow]")
+            console.print(interrupted, markup=False)
+    elif store is not None:
+        console.print(f"[dim]Session {vibe_coder.session_id} (continue later with --resume)[/dim]")
+    
     console.print("\n[bold]Vibe Coding Principles Active:[/bold]")
     console.print("• Runnable is better than beautiful")
     console.print("• Verified is better than explicit") 
     console.print("• The compiler is the final arbiter of truth")
     console.print("• Thinking mode is not a waste of time\n")
     
+    # Connect and probe tools while the user types; 'info' shows the result
+    vibe_coder.preload()
+    
     # Interactive loop
     while True:
         try:
@@ -50,7 +155,7 @@ def main():
 [bold]Available commands:[/bold]
 • [cyan]help[/cyan] - Show this help
 • [cyan]info[/cyan] - Show environment information  
-• [cyan]clear[/cyan] - Clear conversation history
+• [cyan]clear[/cyan] - Clear conversation history and start a new session
 • [cyan]quit[/cyan] - Exit the Vibe Coder
 
 [bold]Examples:[/bold]
@@ -64,7 +169,7 @@ def main():
                 console.print(vibe_coder.get_environment_info())
                 continue
             elif user_input.lower() == 'clear':
-                vibe_coder.conversation_history.clear()
+                vibe_coder.new_session()
                 console.print("[green]Conversation history cleared[/green]")
                 continue
             elif not user_input.strip():
@@ -73,6 +178,7 @@ def main():
             with console.status("[bold green]Vibing...[/bold green]"):
                 response = vibe_coder.process_request(user_input)
             
+            from rich.markdown import Markdown
             console.print(Panel(
                 Markdown(response),
                 title="🤖 Vibe Coder Response",
@@ -85,5 +191,115 @@ def main():
         except Exception as e:
             console.print(f"[red]Error: {e}[/red]")
 
+def show_sessions(store, query=None):
+    """Print recent sessions, or past turns and commands matching a query"""
+    import time
+    console = get_console()
+    
+    def when(timestamp):
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(timestamp))
+    
+    if query:
+        hits = store.search(query)
+        for hit in hits:
+            text = ' '.join(hit.text.split())
+            console.print(f"{hit.session}  {when(hit.created)}  {hit.kind}: {text}", markup=False, highlight=False)
+        if not hits:
+            console.print("No matches")
+        return
+    sessions = store.sessions()
+    for session in sessions:
+        console.print(f"{session.id}  {when(session.created)}  {session.turns:3d} turns  {session.title}",
+                      markup=False, highlight=False)
+    if not sessions:
+        console.print("No stored sessions")
+
+def model_list(args):
+    """The model tiers given with --models, cheapest first"""
+    return [model.strip() for model in (args.models or '').split(',') if model.strip()]
+
+def model_router(args):
+    """Model tiers from --models; their metrics are written with the others"""
+    if not model_list(args):
+        return None
+    from vibe_coder import tracing
+    from vibe_coder.router import ModelRouter
+    router = ModelRouter(model_list(args))
+    tracing.get_tracer().add_collector(router.prometheus_text)
+    return router
+
+def verify_cache(args):
+    """Results of verified plans, kept across runs"""
+    if not args.verify:
+        return None
+    from vibe_coder.verify import VerifyCache, default_cache_path
+    return VerifyCache(default_cache_path())
+
+def response_cache(args):
+    """LLM responses, kept across runs with --cache"""
+    if not args.cache:
+        return None
+    from vibe_coder.llm_cache import ResponseCache, default_cache_path
+    return ResponseCache(db_path=default_cache_path())
+
+def run_serve_mode(args, store):
+    """Serve sessions over HTTP until interrupted"""
+    from vibe_coder.server import run_server
+    console = get_console()
+    
+    def ready(server):
+        console.print(f"[green]Serving on http://{args.host}:{server.port} "
+                      f"({args.model_slots} model slot(s), up to {args.max_sessions} sessions)[/green]")
+    
+    router = model_router(args)
+    run_server(args.host, args.port, model_name=router.models[0] if router else args.model,
+               model_slots=args.model_slots,
+               max_waiting=args.max_queue, max_sessions=args.max_sessions,
+               session_store=store, workspace_root=args.workdir,
+               rollback_failed_plans=args.rollback_failed_plans,
+               verify_plans=args.verify, verify_cache=verify_cache(args), router=router,
+               json_plans=args.json_plans, persistent_shell=args.persistent_shell,
+               temperature=args.temperature, seed=args.seed, cache=response_cache(args),
+               backend=args.backend, keep_alive=args.keep_alive, warm_up=args.warm_up, on_ready=ready)
+
+def run_batch_mode(args):
+    """Run a JSONL file of requests without the interactive loop"""
+    from vibe_coder.batch import run_batch
+    from vibe_coder.llm_cache import default_cache_path
+    from vibe_coder.verify import default_cache_path as default_verify_cache_path
+    console = get_console()
+    
+    def report(result):
+        status = "[red]✗[/red]" if result['error'] else "[green]✓[/green]"
+        console.print(f"{status} #{result['offset']} {result['request_id'] or ''} ({result['duration_seconds']:.1f}s)")
+    
+    counts = run_batch(
+        args.batch, args.output,
+        model_name=args.model,
+        workers=args.workers,
+        base_dir=args.workdir,
+        start_offset=args.start_offset,
+        resume=not args.no_resume,
+        on_result=report,
+        coder_options={
+            'persistent_shell': args.persistent_shell,
+            'temperature': args.temperature,
+            'seed': args.seed,
+            'backend': args.backend,
+            'keep_alive': args.keep_alive,
+            # Every worker loads the model while the others start
+            'warm_up': args.warm_up,
+            'json_plans': args.json_plans,
+            'rollback_failed_plans': args.rollback_failed_plans,
+            'verify_plans': args.verify,
+            # Each worker opens the shared cache files and builds its own router
+            'cache_path': default_cache_path() if args.cache else None,
+            'verify_cache_path': default_verify_cache_path() if args.verify else None,
+            'models': model_list(args),
+        }
+    )
+    console.print(f"[bold]Processed {counts['processed']} requests "
+                  f"({counts['failed']} failed, {counts['resumed']} resumed from an earlier run) -> {args.output}[/bold]")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import json
+import os
+import shlex
+
+from vibe_coder import tracing
+from vibe_coder.batch import completed_offsets, default_coder_factory, request_text, run_batch
+
+
+class FakeTerminal:
+    def execute_command(self, command):
+        os.chdir(shlex.split(command)[1])
+        return "", "", 0
+
+
+class FakeEnvironment:
+    terminal = FakeTerminal()
+
+
+class FakeCoder:
+    def __init__(self, model_name):
+        self.environment = FakeEnvironment()
+        self.conversation_history = []
+
+    def process_request(self, text):
+        with open("request.txt", "w") as f:
+            f.write(text)
+        tracing.observe("fake_request", 0.1)
+        return f"handled {text}"
+
+
+def fake_factory(model_name):
+    return FakeCoder(model_name)
+
+
+def write_requests(path, count):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"request_id": f"r-{i}", "title": f"title {i}", "body": "body"}) + "\n")
+
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestBatch:
+    def test_request_text(self):
+        """Test that prompts come from request/prompt or title and body"""
+        assert request_text({"request": "do it"}) == "do it"
+        assert request_text({"title": "T", "body": "B"}) == "T\n\nB"
+
+    def test_worker_opens_cache(self, tmp_path):
+        """Test that a worker's coder gets a response cache from its path"""
+        coder = default_coder_factory("test-model", cache_path=str(tmp_path / "cache.db"), temperature=0)
+        assert coder.cache is not None and coder.temperature == 0
+        assert default_coder_factory("test-model").cache is None
+        routed = default_coder_factory("test-model", models=["small", "big"], verify_plans=True)
+        assert routed.model_name == "small" and routed.router.models == ["small", "big"]
+
+    def test_run_batch_isolated(self, tmp_path):
+        """Test that every request runs in its own directory with timings"""
+        requests, output = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+        write_requests(requests, 5)
+
+        counts = run_batch(requests, output, workers=2, base_dir=str(tmp_path / "work dir"), factory=fake_factory)
+
+        results = sorted(read_results(output), key=lambda r: r["offset"])
+        assert counts == {"processed": 5, "failed": 0, "resumed": 0}
+        assert [r["request_id"] for r in results] == [f"r-{i}" for i in range(5)]
+        assert len({r["workdir"] for r in results}) == 5
+        with open(os.path.join(results[3]["workdir"], "request.txt")) as f:
+            assert f.read() == "title 3\n\nbody"
+        assert all(r["duration_seconds"] >= 0 for r in results)
+
+    def test_resume_skips_done(self, tmp_path):
+        """Test that a rerun only processes requests missing from the output"""
+        requests, output = str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl")
+        write_requests(requests, 4)
+        run_batch(requests, output, workers=1, base_dir=str(tmp_path / "work"), start_offset=2, factory=fake_factory)
+        assert completed_offsets(output) == {2, 3}
+
+        counts = run_batch(requests, output, workers=1, base_dir=str(tmp_path / "work"), factory=fake_factory)
+
+        assert counts["processed"] == 2 and counts["resumed"] == 2
+        assert completed_offsets(output) == {0, 1, 2, 3}
+
+    def test_metrics_merged_from_workers(self, tmp_path):
+        """Test that the metrics file counts the requests of every worker"""
+        requests, output, metrics = (str(tmp_path / name) for name in ("in.jsonl", "out.jsonl", "vibe.prom"))
+        write_requests(requests, 6)
+        tracing.configure(metrics_path=metrics)
+        try:
+            run_batch(requests, output, workers=3, base_dir=str(tmp_path / "work"), factory=fake_factory)
+        finally:
+            tracing.configure()
+
+        with open(metrics) as f:
+            assert f'{tracing.METRIC_NAME}_count{{phase="fake_request"}} 6' in f.read()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vibe_coder.capture import CommandResult, OutputCapture
+from vibe_coder.terminal import SudoTerminal
+
+
+class TestOutputCapture:
+    def test_small_output_kept_whole(self):
+        """Output within the limits is returned unchanged and never spilled"""
+        capture = OutputCapture(head_bytes=16, tail_bytes=16)
+        capture.feed(b"one\ntwo\n")
+        capture.feed(b"three")
+        capture.close()
+        assert capture.text() == "one\ntwo\nthree"
+        assert (capture.bytes, capture.lines) == (13, 3)
+        assert capture.path is None
+
+    def test_large_output_spills_everything(self):
+        """Past the limits, memory holds head and tail and the file holds all of it"""
+        data = b''.join(b"line %d\n" % i for i in range(10000))
+        with tempfile.TemporaryDirectory() as tmp:
+            capture = OutputCapture(head_bytes=64, tail_bytes=128, spill_dir=tmp)
+            for i in range(0, len(data), 1000):
+                capture.feed(data[i:i + 1000])
+                assert len(capture.head) + len(capture.tail) <= 64 + 128
+            capture.close()
+
+            with open(capture.path, 'rb') as f:
+                assert f.read() == data
+            text = capture.text()
+            assert text.startswith("line 0\n")
+            assert text.endswith("line 9999\n")
+            assert f"full output in {capture.path}" in text
+            assert capture.lines == 10000
+
+    def test_failure_result(self):
+        """Errors carry counters like any other output"""
+        result = CommandResult.failure("Command timed out after 1 seconds")
+        assert result.output() == ("", "Command timed out after 1 seconds", -1)
+        assert result.stderr_lines == 1
+
+
+class TestTerminalCapture:
+    def test_noisy_command_bounded(self):
+        """A command printing megabytes keeps only a bounded summary in memory"""
+        with tempfile.TemporaryDirectory() as tmp:
+            terminal = SudoTerminal(head_bytes=1024, tail_bytes=1024, spill_dir=tmp)
+            result = terminal.capture_command("seq 1 200000")
+            assert result.returncode == 0
+            assert result.stdout_lines == 200000
+            assert len(result.stdout) < 4096
+            assert result.stdout.rstrip().endswith("200000")
+            assert os.path.getsize(result.stdout_path) == result.stdout_bytes
+            terminal.close()
+            assert not os.path.exists(result.stdout_path)
+
+    def test_persistent_shell_bounded(self):
+        """The persistent shell streams into the same bounded capture"""
+        with tempfile.TemporaryDirectory() as tmp:
+            terminal = SudoTerminal(persistent_shell=True, head_bytes=1024, tail_bytes=1024, spill_dir=tmp)
+            try:
+                result = terminal.capture_command("seq 1 200000; echo done >&2")
+                assert result.stdout_lines == 200000
+                assert result.stdout.rstrip().endswith("200000")
+                assert result.stderr == "done\n"
+                assert terminal.execute_command("echo $((1 + 1))") == ("2\n", "", 0)
+            finally:
+                terminal.close()
+
+    def test_spill_files_rotated(self):
+        """Only the newest spill files are kept"""
+        with tempfile.TemporaryDirectory() as tmp:
+            terminal = SudoTerminal(head_bytes=16, tail_bytes=16, spill_dir=tmp, max_spill_files=2)
+            for _ in range(4):
+                terminal.capture_command("seq 1 1000")
+            assert len(os.listdir(tmp)) == 2
+
+    def test_timeout_still_enforced(self):
+        """A command that outlives its timeout is killed"""
+        stdout, stderr, code = SudoTerminal().execute_command("sleep 5", timeout=1)
+        assert code == -1
+        assert "timed out" in stderr
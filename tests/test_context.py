@@ -0,0 +1,67 @@
+import json
+
+from vibe_coder.context import ContextBuilder, approximate_tokens
+
+
+def turn(i, size=40):
+    return [
+        {"role": "user", "content": f"request {i}"},
+        {"role": "assistant", "content": f"answer {i} " + "x" * size},
+    ]
+
+
+class TestContextBuilder:
+    def test_newest_history_fills_budget(self):
+        """Test that the newest turns are kept and the oldest dropped"""
+        history = turn(1, 100) + turn(2, 100) + turn(3, 100)
+        builder = ContextBuilder(budget_tokens=60)
+
+        messages = builder.build("system", history, "new request")
+
+        assert messages[0] == {"role": "system", "content": "system"}
+        assert messages[-1] == {"role": "user", "content": "new request"}
+        assert [m["content"] for m in messages[1:-1]] == [m["content"] for m in turn(3, 100)]
+
+    def test_oversized_output_truncated(self):
+        """Test that a huge execution log is cut to head and tail"""
+        log = "\n".join(f"line {i}" for i in range(10000))
+        builder = ContextBuilder(budget_tokens=4096, max_message_tokens=100)
+
+        messages = builder.build("system", [{"role": "user", "content": "build"},
+                                            {"role": "assistant", "content": log}], "next")
+
+        content = messages[2]["content"]
+        assert content.startswith("line 0\n")
+        assert content.endswith("line 9999")
+        assert "truncated" in content
+        assert approximate_tokens(content) < 150
+
+    def test_pluggable_tokenizer(self):
+        """Test that a custom tokenizer drives the budget"""
+        builder = ContextBuilder(budget_tokens=6, tokenizer=lambda text: len(text.split()))
+
+        messages = builder.build("sys", turn(1, size=0), "go")
+
+        assert len(messages) == 4
+
+    def test_serialize_matches_json(self):
+        """Test that cached serialization is identical to json.dumps"""
+        builder = ContextBuilder()
+        messages = builder.build("system \"quoted\"", turn(1) + turn(2), "ünïcode")
+
+        assert builder.serialize(messages) == json.dumps(messages)
+        assert builder.serialize(messages) == json.dumps(messages)
+
+    def test_prefix_stable_across_turns(self):
+        """Test that the window start only moves when the budget overflows"""
+        builder = ContextBuilder(budget_tokens=200, refill_ratio=0.5)
+        history = []
+        prompts = []
+        for i in range(8):
+            messages = builder.build("system", history, f"request {i}")
+            prompts.append(builder.serialize(messages[:-1]))
+            history += turn(i, 60)
+
+        # Consecutive prompts either extend the previous one or re-anchor
+        extended = sum(prompts[i + 1].startswith(prompts[i][:-1]) for i in range(len(prompts) - 1))
+        assert extended >= 5
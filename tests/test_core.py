@@ -1,9 +1,14 @@
+import asyncio
+import json
 import pytest
 import tempfile
 import os
+import time
 from unittest.mock import Mock, patch
 
 from vibe_coder.core import VirtualVibeCoder
+from vibe_coder.llm_cache import ResponseCache
+from vibe_coder.router import ModelRouter
 from vibe_coder.terminal import SudoTerminal
 
 
@@ -38,6 +43,155 @@ class TestVirtualVibeCoder:
             
             assert len(coder.conversation_history) == 4  # 2 user + 2 assistant
 
+    def test_tagged_block_keeps_indentation(self):
+        """Test that a fenced Python block runs with its language and indentation intact"""
+        with patch('vibe_coder.core.Ollama'):
+            coder = VirtualVibeCoder(model_name="test-model")
+        previous = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            coder.environment.terminal.execute_command(f"cd {tmp}")
+            try:
+                result = coder._execute_plan("```python\nfor i in range(2):\n    print(i)\n```\n", "count")
+            finally:
+                coder.environment.terminal.execute_command(f"cd {previous}")
+        assert "Exit code: 0" in result
+        assert "Output: 0\n1\n" in result
+
+    def test_snippets_sent_but_not_kept(self):
+        """Test that workspace snippets reach the model but stay out of the history"""
+        previous = os.getcwd()
+        with patch('vibe_coder.core.Ollama') as mock_llm, tempfile.TemporaryDirectory() as tmp:
+            mock_llm.return_value.invoke.return_value = "No commands"
+            coder = VirtualVibeCoder(model_name="test-model")
+            with open(os.path.join(tmp, "weather.py"), "w") as f:
+                f.write("def fetch_forecast(city):\n    pass\n")
+            coder.environment.terminal.execute_command(f"cd {tmp}")
+            try:
+                coder.workspace_index().refresh()
+                coder.process_request("fix fetch_forecast")
+            finally:
+                coder.environment.terminal.execute_command(f"cd {previous}")
+
+        prompt = mock_llm.return_value.invoke.call_args.args[0]
+        assert "def fetch_forecast(city):" in prompt
+        assert "def fetch_forecast(city):" not in coder.conversation_history[0]["content"]
+
+    def test_failed_plan_rolled_back(self):
+        """Test that a plan with a failing step leaves the directory as it was"""
+        with patch('vibe_coder.core.Ollama'), tempfile.TemporaryDirectory() as tmp:
+            coder = VirtualVibeCoder(model_name="test-model", workdir=tmp, rollback_failed_plans=True)
+            with open(os.path.join(tmp, "app.py"), "w") as f:
+                f.write("VERSION = 1\n")
+
+            result = coder._execute_plan("```bash\necho 'VERSION = 2' > app.py\ntouch new.txt\nfalse\n```\n", "bump")
+
+            assert "rolled back" in result
+            with open(os.path.join(tmp, "app.py")) as f:
+                assert f.read() == "VERSION = 1\n"
+            assert sorted(os.listdir(tmp)) == ["app.py"]
+
+            coder._execute_plan("```bash\ntouch kept.txt\n```\n", "touch")
+            assert sorted(os.listdir(tmp)) == ["app.py", "kept.txt"]
+
+    def test_plan_verified(self):
+        """Test that tests importing a file the plan changed are run after it"""
+        with patch('vibe_coder.core.Ollama'), tempfile.TemporaryDirectory() as tmp:
+            coder = VirtualVibeCoder(model_name="test-model", workdir=tmp, verify_plans=True)
+            with open(os.path.join(tmp, "test_lib.py"), "w") as f:
+                f.write("import lib\n\ndef test_answer():\n    assert lib.ANSWER == 42\n")
+
+            result = coder._execute_plan("```bash\necho 'ANSWER = 42' > lib.py\n```\n", "add lib")
+
+            assert "Verification of lib.py:" in result
+            assert "passed python3 -m pytest -q test_lib.py" in result
+
+    def test_failed_plan_escalates(self):
+        """Test that a failing plan from the small model is handed to the big one"""
+        responses = {"small": "```bash\nfalse\n```\n", "big": "```bash\necho fixed\n```\n"}
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.side_effect = lambda model, **kwargs: Mock(invoke=Mock(return_value=responses[model]))
+            router = ModelRouter(["small", "big"])
+            coder = VirtualVibeCoder(model_name="small", router=router)
+
+            result = coder.process_request("print something")
+
+        assert "Escalating to big (failed)" in result
+        assert "Output: fixed" in result
+        assert router.stats()["small"]["escalation_rate"] == 1.0
+        assert "Models: small -> big" not in coder.get_environment_info()
+        assert "Model: small -> big (local)" in coder.get_environment_info()
+
+    def test_stream_escalates_answer_without_blocks(self):
+        """Test that a streamed answer with nothing to run is handed to the next tier"""
+        tokens = {"small": ["Just ", "do it."], "big": ["```\n", "echo done\n", "```\n"]}
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.side_effect = lambda model, **kwargs: Mock(stream=Mock(return_value=iter(tokens[model])))
+            coder = VirtualVibeCoder(model_name="small", router=ModelRouter(["small", "big"]))
+
+            events = list(coder.stream_request("say done"))
+
+        kinds = [event.kind for event in events]
+        assert kinds.index('escalate') < kinds.index('block_result')
+        assert events[kinds.index('escalate')].text == "Escalating to big (no_blocks)"
+        assert events[-1].kind == 'done' and "echo done" in events[-1].text
+
+    def test_persistent_shell_keeps_exports(self):
+        """Test that the coder's terminal keeps exported variables with a persistent shell"""
+        with patch('vibe_coder.core.Ollama'):
+            coder = VirtualVibeCoder(model_name="test-model", persistent_shell=True)
+            terminal = coder.environment.terminal
+            try:
+                terminal.execute_command("export VIBE_PLAN_TEST=kept")
+                assert terminal.execute_command("echo $VIBE_PLAN_TEST")[0].strip() == "kept"
+            finally:
+                terminal.close()
+
+    def test_example_blocks_not_run(self):
+        """Test that config and diff examples are reported instead of run as shell"""
+        with patch('vibe_coder.core.Ollama'), tempfile.TemporaryDirectory() as tmp:
+            coder = VirtualVibeCoder(model_name="test-model", workdir=tmp)
+
+            result = coder._run_plan("```json\n{\"touch\": 1}\n```\n```yaml\ntouch: yes\n```\n"
+                                     "```\necho untagged\n```\n", "show config")
+
+        assert "Skipped json block" in result.log and "Skipped yaml block" in result.log
+        assert "Output: untagged" in result.log
+        assert result.steps == 1 and not result.failed
+
+    def test_json_plan_executed(self):
+        """Test that a JSON plan's steps run in their cwd, falling back to markdown when it is not JSON"""
+        steps = [
+            {"id": 1, "language": "bash", "command": "mkdir -p sub"},
+            {"id": 2, "language": "bash", "command": "pwd", "cwd": "sub", "depends_on": [1]},
+            {"id": 3, "language": "python", "command": "import os; print(os.getcwd())", "cwd": "sub",
+             "depends_on": [1]},
+        ]
+        with patch('vibe_coder.core.Ollama'), tempfile.TemporaryDirectory() as tmp:
+            coder = VirtualVibeCoder(model_name="test-model", workdir=tmp, json_plans=True)
+
+            result = coder._execute_plan(json.dumps({"reasoning": "", "steps": steps}), "make sub")
+
+            sub = os.path.realpath(os.path.join(tmp, "sub"))
+            assert result.count(sub) == 2
+            assert coder.environment.terminal.get_current_directory() == tmp
+            assert "Output: scraped" in coder._execute_plan("```python\nprint('scraped')\n```\n", "scrape")
+
+    def test_stream_request_events(self):
+        """Test that streamed blocks are executed before generation finishes"""
+        tokens = ["Run this:\n", "```\n", "echo streamed\n", "```\n", "All done"]
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.return_value.stream.return_value = iter(tokens)
+            coder = VirtualVibeCoder(model_name="test-model")
+
+            events = list(coder.stream_request("test request"))
+
+        kinds = [event.kind for event in events]
+        assert kinds.index('block_result') < kinds.index('token', kinds.index('block_ready'))
+        result = next(event for event in events if event.kind == 'block_result')
+        assert 'streamed' in result.text
+        assert events[-1].kind == 'done'
+        assert len(coder.conversation_history) == 2
+
 
 class TestSudoTerminal:
     def test_execute_basic_command(self):
@@ -81,4 +235,143 @@ class TestSudoTerminal:
         new_dir = terminal.get_current_directory()
         
         assert code == 0
-        assert new_dir != original_dir
\ No newline at end of file
+        assert new_dir != original_dir
+
+    def test_terminals_keep_own_directory(self):
+        """Test that cd and relative file operations stay within one terminal"""
+        previous = os.getcwd()
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            terminals = [SudoTerminal(), SudoTerminal(cwd=second)]
+            terminals[0].execute_command(f"cd {first}")
+            terminals[1].execute_command("mkdir sub && cd sub")
+            assert terminals[1].execute_command("cd sub")[2] == 0
+
+            for terminal in terminals:
+                assert terminal.write_file("note.txt", terminal.current_dir)[0]
+                assert terminal.execute_command("cat note.txt")[0] == terminal.current_dir
+
+            assert terminals[0].current_dir == first
+            assert terminals[1].current_dir == os.path.join(second, "sub")
+            assert terminals[1].execute_command("cd missing")[2] != 0
+            assert terminals[0].execute_command("cd .. && pwd")[0].strip() == os.path.dirname(first)
+            assert terminals[0].current_dir == first
+        assert os.getcwd() == previous
+
+
+class TestPersistentShell:
+    def test_state_persists_between_commands(self):
+        """Test that exported variables survive across commands"""
+        terminal = SudoTerminal(persistent_shell=True)
+        try:
+            terminal.execute_command("export VIBE_TEST=persisted")
+            stdout, stderr, code = terminal.execute_command("echo $VIBE_TEST")
+
+            assert code == 0
+            assert stdout == "persisted\n"
+        finally:
+            terminal.close()
+
+    def test_exit_code_and_stderr(self):
+        """Test that exit code and stderr are recovered per command"""
+        terminal = SudoTerminal(persistent_shell=True)
+        try:
+            stdout, stderr, code = terminal.execute_command("echo out; echo err >&2; false")
+
+            assert (stdout, stderr, code) == ("out\n", "err\n", 1)
+        finally:
+            terminal.close()
+
+    def test_timeout_keeps_session(self):
+        """Test that a timed out command does not kill the session"""
+        terminal = SudoTerminal(persistent_shell=True)
+        try:
+            terminal.execute_command("export VIBE_TEST=alive")
+            stdout, stderr, code = terminal.execute_command("sleep 10", timeout=1)
+            assert code == -1
+            assert "timed out" in stderr
+
+            stdout, stderr, code = terminal.execute_command("echo $VIBE_TEST")
+            assert stdout == "alive\n"
+        finally:
+            terminal.close()
+
+
+class TestAsyncTerminal:
+    def test_execute_command_async(self):
+        """Test the async counterpart of execute_command"""
+        terminal = SudoTerminal()
+        stdout, stderr, code = asyncio.run(terminal.execute_command_async("echo out; echo err >&2; exit 3"))
+
+        assert (stdout, stderr, code) == ("out\n", "err\n", 3)
+
+    def test_stream_yields_before_exit(self):
+        """Test that output chunks arrive while the command is still running"""
+        terminal = SudoTerminal()
+
+        async def first_chunk():
+            stream = terminal.stream_command("echo early; sleep 10")
+            try:
+                return await asyncio.wait_for(stream.__anext__(), 5)
+            finally:
+                await stream.aclose()
+
+        assert asyncio.run(first_chunk()) == ('stdout', "early\n")
+
+    def test_concurrency_limit(self):
+        """Test that the semaphore bounds concurrently running commands"""
+        terminal = SudoTerminal(max_concurrency=2)
+
+        async def run_all():
+            start = time.monotonic()
+            await asyncio.gather(*[terminal.execute_command_async("sleep 0.3") for _ in range(4)])
+            return time.monotonic() - start
+
+        assert asyncio.run(run_all()) >= 0.6
+
+
+class TestResponseCaching:
+    def test_deterministic_requests_are_cached(self):
+        """Test that a repeated deterministic request skips the model"""
+        cache = ResponseCache()
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.return_value.invoke.return_value = "Test response"
+            VirtualVibeCoder(model_name="test-model", cache=cache, temperature=0).process_request("same")
+            VirtualVibeCoder(model_name="test-model", cache=cache, temperature=0).process_request("same")
+
+            assert mock_llm.return_value.invoke.call_count == 1
+        assert cache.stats()['hits'] == 1
+
+    def test_sampling_bypasses_cache(self):
+        """Test that caching is disabled for non-deterministic sampling"""
+        with patch('vibe_coder.core.Ollama'):
+            coder = VirtualVibeCoder(model_name="test-model", cache=ResponseCache(), temperature=0.7)
+
+        assert coder.cache is None
+
+
+class TestChatBackend:
+    def test_chat_backend_sends_messages(self):
+        """Test that the chat backend gets structured messages and keep_alive"""
+        with patch('ollama.Client') as mock_client:
+            mock_client.return_value.chat.return_value = {'message': {'content': "Test response"}}
+            coder = VirtualVibeCoder(model_name="test-model", backend="chat", keep_alive="1h")
+
+            response = coder.process_request("test request")
+
+            kwargs = mock_client.return_value.chat.call_args.kwargs
+        assert "Test response" in response
+        assert kwargs['keep_alive'] == "1h"
+        assert kwargs['messages'][0]['role'] == "system"
+        assert kwargs['messages'][-1]['content'].endswith("reasoning for each step.")
+
+    def test_history_prefix_is_stable(self):
+        """Test that the next prompt starts with the previous prompt's messages"""
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.return_value.invoke.return_value = "Test response"
+            coder = VirtualVibeCoder(model_name="test-model")
+
+            coder.process_request("first request")
+            coder.process_request("second request")
+
+            first, second = [call.args[0] for call in mock_llm.return_value.invoke.call_args_list]
+        assert second.startswith(first[:-1])
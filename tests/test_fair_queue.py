@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from vibe_coder.fair_queue import FairGate, QueueFull
+
+
+def wait_for(gate, stat, count):
+    deadline = time.monotonic() + 5
+    while gate.stats()[stat] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+class TestFairGate:
+    def test_round_robin_across_keys(self):
+        """Test that a key with many queued callers does not starve another key"""
+        gate = FairGate(slots=1)
+        order = []
+        release = threading.Event()
+
+        def hold():
+            with gate.slot("holder"):
+                release.wait()
+
+        def call(key):
+            with gate.slot(key):
+                order.append(key)
+
+        threads = [threading.Thread(target=hold)]
+        threads[0].start()
+        wait_for(gate, 'active', 1)
+        for i, key in enumerate(["a", "a", "a", "b"]):
+            thread = threading.Thread(target=call, args=(key,))
+            thread.start()
+            threads.append(thread)
+            wait_for(gate, 'waiting', i + 1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert order == ["a", "b", "a", "a"]
+
+    def test_full_queue_rejects(self):
+        """Test that callers beyond max_waiting fail fast instead of queueing"""
+        gate = FairGate(slots=1, max_waiting=1)
+        release = threading.Event()
+
+        def hold():
+            with gate.slot("a"):
+                release.wait()
+
+        def wait():
+            with gate.slot("b"):
+                pass
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        wait_for(gate, 'active', 1)
+        waiter = threading.Thread(target=wait)
+        waiter.start()
+        wait_for(gate, 'waiting', 1)
+
+        with pytest.raises(QueueFull):
+            with gate.slot("c"):
+                pass
+        release.set()
+        holder.join()
+        waiter.join()
+        assert gate.stats()['rejected_total'] == 1
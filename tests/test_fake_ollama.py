@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from vibe_coder.core import VirtualVibeCoder
+
+
+RESPONSE = "Check the file:\n```\necho fake-ollama\n```\n"
+
+
+@pytest.fixture
+def server():
+    with FakeOllamaServer([RESPONSE], tokens_per_second=10000) as server:
+        yield server
+
+
+class TestFakeOllama:
+    @pytest.mark.parametrize("backend", ["completion", "chat"])
+    def test_process_request_end_to_end(self, server, backend):
+        """Test the full pipeline against the local stand-in server"""
+        coder = VirtualVibeCoder(model_name="fake", ollama_host=server.url, backend=backend)
+
+        response = coder.process_request("say hello")
+
+        assert "Check the file:" in response
+        assert "fake-ollama" in response.split("## Execution Results")[1]
+        assert len(server.requests) == 1
+
+    def test_streaming_tokens(self, server):
+        """Test that the stand-in streams the scripted response token by token"""
+        coder = VirtualVibeCoder(model_name="fake", ollama_host=server.url, backend="chat")
+
+        tokens = [event.text for event in coder.stream_request("say hello") if event.kind == 'token']
+
+        assert len(tokens) > 1
+        assert ''.join(tokens) == RESPONSE
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from vibe_coder.json_plan import PlanFormatError, parse_json_plan, render_plan
+
+
+def plan(*steps, reasoning="Because"):
+    return json.dumps({"reasoning": reasoning, "steps": list(steps)})
+
+
+class TestParseJsonPlan:
+    def test_steps_parsed(self):
+        """Test that steps keep their language, cwd and dependencies"""
+        reasoning, steps = parse_json_plan(plan(
+            {"id": 1, "language": "bash", "command": "mkdir -p src"},
+            {"id": 2, "language": "py", "command": "print(1)", "cwd": "src", "depends_on": [1],
+             "description": "Say one"},
+        ))
+
+        assert reasoning == "Because"
+        assert [(step.id, step.language, step.cwd, step.depends_on) for step in steps] == [
+            (1, "bash", ".", ()), (2, "python", "src", (1,))]
+        assert "**Step 2** (in src), after 1: Say one" in render_plan(reasoning, steps)
+
+    def test_fenced_plan(self):
+        """Test that a plan wrapped in a ```json fence is accepted"""
+        text = "```json\n" + plan({"id": 1, "language": "bash", "command": "ls"}) + "\n```"
+        assert parse_json_plan(text)[1][0].command == "ls"
+
+    def test_invalid_plans(self):
+        """Test that malformed plans are rejected with the reason"""
+        with pytest.raises(PlanFormatError, match="Not JSON"):
+            parse_json_plan("Run ls")
+        with pytest.raises(PlanFormatError, match="not an earlier step"):
+            parse_json_plan(plan({"id": 1, "language": "bash", "command": "ls", "depends_on": [2]},
+                                 {"id": 2, "language": "bash", "command": "pwd"}))
+        with pytest.raises(PlanFormatError, match="not a step id"):
+            parse_json_plan(plan({"id": 1, "language": "bash", "command": "ls"},
+                                 {"id": 2, "language": "bash", "command": "pwd", "depends_on": [[1]]}))
+        with pytest.raises(PlanFormatError, match="unsupported language"):
+            parse_json_plan(plan({"id": 1, "language": "cobol", "command": "DISPLAY 'HI'"}))
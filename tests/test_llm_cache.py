@@ -0,0 +1,58 @@
+from vibe_coder.llm_cache import ResponseCache, cache_key, is_deterministic
+
+
+MESSAGES = '[{"role": "user", "content": "hello"}]'
+
+
+class TestResponseCache:
+    def test_key_depends_on_inputs(self):
+        """Test that model, prompts and sampling settings all change the key"""
+        key = cache_key("model", "system", MESSAGES, 0, None, "completion")
+
+        assert key != cache_key("other", "system", MESSAGES, 0, None, "completion")
+        assert key != cache_key("model", "other", MESSAGES, 0, None, "completion")
+        assert key != cache_key("model", "system", MESSAGES + MESSAGES, 0, None, "completion")
+        assert key != cache_key("model", "system", MESSAGES, 0.7, 1, "completion")
+        assert cache_key("model", "system", MESSAGES, 0.7, 1, "completion") != cache_key(
+            "model", "system", MESSAGES, 0.7, 2, "completion")
+        assert key != cache_key("model", "system", MESSAGES, 0, None, "chat")
+
+    def test_memory_lru(self):
+        """Test that the memory tier evicts the least recently used entry"""
+        cache = ResponseCache(max_entries=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("a")
+        cache.put("c", "C")
+
+        assert cache.get("b") is None
+        assert cache.get("a") == "A"
+        assert cache.stats()['hits'] == 2
+        assert cache.stats()['misses'] == 1
+
+    def test_disk_tier_persists(self, tmp_path):
+        """Test that responses survive a new cache instance"""
+        db_path = str(tmp_path / "cache.db")
+        cache = ResponseCache(db_path=db_path)
+        cache.put("key", "response")
+        cache.close()
+
+        reopened = ResponseCache(db_path=db_path)
+        assert reopened.get("key") == "response"
+        assert reopened.stats()['disk_hits'] == 1
+
+    def test_disk_size_eviction(self, tmp_path):
+        """Test that the disk tier is trimmed to its byte budget"""
+        cache = ResponseCache(max_entries=1, db_path=str(tmp_path / "cache.db"), max_db_bytes=10)
+        cache.put("old", "x" * 6)
+        cache.put("new", "y" * 6)
+
+        assert cache.get("old") is None
+        assert cache.get("new") == "y" * 6
+
+    def test_deterministic_configurations(self):
+        """Test which sampling settings allow caching"""
+        assert is_deterministic(0, None)
+        assert is_deterministic(0.8, 42)
+        assert not is_deterministic(None, None)
+        assert not is_deterministic(0.7, None)
@@ -0,0 +1,141 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vibe_coder import materializer
+from vibe_coder.arch_linux import ArchLinuxEnvironment
+from vibe_coder.materializer import Template, flatten, materialize
+
+STRUCTURE = {
+    'README.md': Template("# $project_name\n"),
+    'run.sh': "#!/bin/sh\necho $$\n",
+    'docs/': None,
+    'src': {
+        'app': {'__init__.py': "", 'main.py': "print('hi')\n"},
+        'data/blob.bin': b'\x00\x01',
+    },
+}
+
+
+def tree(root):
+    found = {}
+    for directory, dirs, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                found[os.path.relpath(path, root)] = f.read()
+        for name in dirs:
+            found[os.path.relpath(os.path.join(directory, name), root) + '/'] = None
+    return found
+
+
+class TestFlatten:
+    def test_nested_structure(self):
+        """Nested dicts, slashed keys and '/' keys all become directories"""
+        dirs, files = flatten(STRUCTURE, {'project_name': 'demo'})
+        assert dirs == {'docs', 'src', 'src/app', 'src/data'}
+        assert files['README.md'] == b"# demo\n"
+        assert files['run.sh'] == b"#!/bin/sh\necho $$\n"
+        assert files['src/data/blob.bin'] == b'\x00\x01'
+
+    def test_rejects_escaping_paths(self):
+        """Paths outside the project are refused before anything is written"""
+        with pytest.raises(ValueError):
+            flatten({'../evil.txt': "x"})
+        with pytest.raises(ValueError):
+            flatten({'/etc/passwd': "x"})
+
+
+class TestMaterialize:
+    def test_new_project(self):
+        """A new project appears complete, with no staging directory left behind"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'demo')
+            result = materialize(root, STRUCTURE, {'project_name': 'demo'})
+            assert result.written == 5
+            assert tree(root)['src/app/main.py'] == b"print('hi')\n"
+            assert 'docs/' in tree(root)
+            assert os.access(os.path.join(root, 'run.sh'), os.X_OK)
+            assert os.listdir(tmp) == ['demo']
+
+    def test_failure_leaves_nothing(self, monkeypatch):
+        """A write failure part-way through leaves no trace"""
+        real_write = materializer._write
+        written = []
+
+        def flaky_write(path, data, exclusive=False):
+            if len(written) == 20:
+                raise OSError("disk full")
+            written.append(path)
+            real_write(path, data, exclusive)
+
+        monkeypatch.setattr(materializer, '_write', flaky_write)
+        structure = {f'pkg/module_{i}.py': f"X = {i}\n" for i in range(40)}
+        with tempfile.TemporaryDirectory() as tmp:
+            with pytest.raises(OSError):
+                materialize(os.path.join(tmp, 'demo'), structure)
+            assert os.listdir(tmp) == []
+
+    def test_existing_project_skips_unchanged(self):
+        """Re-materializing only rewrites files whose content changed"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'demo')
+            materialize(root, STRUCTURE, {'project_name': 'demo'})
+            main = os.path.join(root, 'src/app/main.py')
+            inode = os.stat(main).st_ino
+
+            changed = dict(STRUCTURE, src={'app': {'main.py': "print('hi')\n"}, 'new.py': "y = 2\n"})
+            result = materialize(root, changed, {'project_name': 'demo'})
+            assert (result.written, result.unchanged) == (1, 3)
+            assert os.stat(main).st_ino == inode
+            assert not [name for name in os.listdir(os.path.join(root, 'src')) if 'staging' in name]
+
+    def test_existing_project_failure_changes_nothing(self, monkeypatch):
+        """When an update fails, existing files keep their old content"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = os.path.join(tmp, 'demo')
+            materialize(root, {'a.txt': "old\n"})
+
+            def failing_write(path, data, exclusive=False):
+                raise OSError("disk full")
+
+            monkeypatch.setattr(materializer, '_write', failing_write)
+            with pytest.raises(OSError):
+                materialize(root, {'a.txt': "new\n", 'sub/b.txt': "b\n"})
+            assert tree(root) == {'a.txt': b"old\n"}
+
+    def test_large_scaffold_is_fast(self):
+        """Thousands of files are written in a fraction of a second"""
+        structure = {}
+        for i in range(2000):
+            structure.setdefault(f'pkg{i // 100}', {})[f'mod_{i}.py'] = f"VALUE = {i}\n"
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            result = materialize(os.path.join(tmp, 'big'), structure)
+            assert result.written == 2000
+            assert time.perf_counter() - start < 2
+
+
+class TestCreateProjectStructure:
+    def test_relative_to_terminal_directory(self):
+        """Projects are created under the terminal's directory without changing it"""
+        environment = ArchLinuxEnvironment(lazy_tools=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            environment.terminal.current_dir = tmp
+            ok, message = environment.create_project_structure('demo', STRUCTURE)
+            assert ok, message
+            assert "5 files written" in message
+            assert tree(os.path.join(tmp, 'demo'))['README.md'] == b"# demo\n"
+            assert environment.terminal.get_current_directory() == tmp
+
+    def test_invalid_structure_reported(self):
+        """Errors come back as (False, message) like the rest of the environment"""
+        environment = ArchLinuxEnvironment(lazy_tools=True)
+        ok, message = environment.create_project_structure('demo', {'../x': "x"})
+        assert not ok
+        assert message.startswith("Error creating project structure:")
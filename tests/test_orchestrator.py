@@ -0,0 +1,75 @@
+import asyncio
+import json
+import threading
+import time
+
+from vibe_coder.orchestrator import Orchestrator, load_agent_system, parse_workflow
+
+
+def deps(orchestrator, scenario):
+    return {step.index: step.deps for step in orchestrator.workflow(scenario)}
+
+
+class TestWorkflow:
+    def test_parse_step(self):
+        """Test that workflow steps are parsed from prompt.json notation"""
+        step, = parse_workflow(["coder → request[qa_engineer]: Test scenario creation"])
+
+        assert (step.agent, step.type, step.target, step.description) == \
+            ("coder", "request", "qa_engineer", "Test scenario creation")
+
+    def test_independent_reviews_run_in_parallel(self):
+        """Test that security review and docs do not wait for each other"""
+        orchestrator = Orchestrator(lambda system, prompt: "{}")
+        dependencies = deps(orchestrator, "New feature development")
+
+        assert dependencies[6] == [0, 2, 4]
+        assert dependencies[7] == [0, 2, 4]
+        # The QA response waits for the implementation it tests
+        assert dependencies[5] == [0, 2, 3, 4]
+
+
+class TestOrchestrator:
+    def test_run_scenario(self):
+        """Test that every step produces a protocol message and metrics"""
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def complete(system, prompt):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return json.dumps({"summary": "ok"})
+
+        orchestrator = Orchestrator(complete, load_agent_system())
+        transcript = asyncio.run(orchestrator.run("New feature development", "Build a todo app"))
+
+        assert [m["from"] for m in transcript][:2] == ["product_manager", "architect"]
+        assert len(transcript) == 8
+        assert transcript[1]["to"] == "product_manager"
+        assert transcript[-1]["content"] == {"summary": "ok"}
+        # QA, security review and docs all run once the implementation is out
+        assert max(peak) == 3
+        assert orchestrator.report()["coder"]["calls"] == 2
+
+    def test_small_inboxes_apply_backpressure(self):
+        """Test that one-message inboxes hold senders back without stalling the workflow"""
+        prompts = {}
+
+        def complete(system, prompt):
+            prompts[system] = prompt
+            time.sleep(0.01)
+            return "{}"
+
+        spec = load_agent_system()
+        orchestrator = Orchestrator(complete, spec, inbox_size=1)
+        transcript = asyncio.run(orchestrator.run("New feature development", "Build a todo app"))
+
+        assert len(transcript) == 8
+        # The last step still sees every message that reached its agent
+        last = next(agent for agent in spec["agents"] if agent["id"] == transcript[-1]["from"])
+        assert prompts[last["prompt"]].count('"from"') >= 3
@@ -0,0 +1,125 @@
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vibe_coder.core import VirtualVibeCoder
+from vibe_coder.packages import (ALREADY_INSTALLED, INSTALLED, INVALID, NOT_FOUND, PackageIndex,
+                                 PackageManager, install_targets)
+from vibe_coder.terminal import SudoTerminal
+
+# Installs only packages listed in $STUB_PACMAN/available; logs every call
+STUB_PACMAN = """#!/bin/sh
+db="$STUB_PACMAN"
+echo "$*" >> "$db/calls"
+case "$1" in
+  -Qq) cat "$db/installed" ;;
+  -S)
+    shift
+    for arg in "$@"; do
+      case "$arg" in -*) ;; *) grep -qx "$arg" "$db/available" || { echo "error: target not found: $arg" >&2; missing=1; } ;; esac
+    done
+    [ -z "$missing" ] || exit 1
+    for arg in "$@"; do
+      case "$arg" in -*) ;; *) grep -qx "$arg" "$db/installed" || echo "$arg" >> "$db/installed" ;; esac
+    done
+    touch "$db/local"
+    ;;
+esac
+"""
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        os.mkdir(os.path.join(tmp, 'bin'))
+        os.mkdir(os.path.join(tmp, 'local'))
+        pacman = os.path.join(tmp, 'bin', 'pacman')
+        with open(pacman, 'w') as f:
+            f.write(STUB_PACMAN)
+        os.chmod(pacman, 0o755)
+        for name, lines in (('installed', "git\n"), ('available', "git\njq\nripgrep\n"), ('calls', "")):
+            with open(os.path.join(tmp, name), 'w') as f:
+                f.write(lines)
+        monkeypatch.setenv('STUB_PACMAN', tmp)
+        monkeypatch.setenv('PATH', os.path.join(tmp, 'bin') + os.pathsep + os.environ['PATH'])
+        yield tmp
+
+
+def calls(stub):
+    with open(os.path.join(stub, 'calls')) as f:
+        return f.read().splitlines()
+
+
+def manager(stub):
+    return PackageManager(SudoTerminal(), db_path=os.path.join(stub, 'local'), use_sudo=False)
+
+
+class TestInstallTargets:
+    def test_plain_installs(self):
+        """Plain sync installs are recognized, with or without sudo"""
+        assert install_targets("sudo pacman -S --noconfirm jq ripgrep") == ['jq', 'ripgrep']
+        assert install_targets("pacman -S --needed python") == ['python']
+
+    def test_other_commands_run_as_written(self):
+        """Upgrades, refreshes and compound commands are not merged"""
+        assert install_targets("sudo pacman -Syu") is None
+        assert install_targets("sudo pacman -Sy jq") is None
+        assert install_targets("pacman -S jq && make") is None
+        assert install_targets("pacman -Q jq") is None
+
+
+class TestPackageIndex:
+    def test_cached_until_db_changes(self, stub):
+        """pacman -Qq runs again only after the local DB changes"""
+        index = PackageIndex(db_path=os.path.join(stub, 'local'))
+        assert index.installed() == {'git'}
+        assert index.installed() == {'git'}
+        assert calls(stub) == ['-Qq']
+
+        with open(os.path.join(stub, 'installed'), 'a') as f:
+            f.write("jq\n")
+        os.utime(os.path.join(stub, 'local'), ns=(0, 0))
+        assert index.installed() == {'git', 'jq'}
+        assert calls(stub) == ['-Qq', '-Qq']
+
+
+class TestPackageManager:
+    def test_installed_packages_skipped(self, stub):
+        """Already installed packages never reach pacman -S"""
+        statuses = manager(stub).install(['git'])
+        assert [(s.name, s.status) for s in statuses] == [('git', ALREADY_INSTALLED)]
+        assert not [call for call in calls(stub) if call.startswith('-S')]
+
+    def test_deduped_single_transaction(self, stub):
+        """Repeated and multiple packages go into one pacman call"""
+        statuses = manager(stub).install(['jq', 'git', 'ripgrep', 'jq'])
+        assert [(s.name, s.status) for s in statuses] == [
+            ('jq', INSTALLED), ('git', ALREADY_INSTALLED), ('ripgrep', INSTALLED)]
+        assert [call for call in calls(stub) if call.startswith('-S')] == ['-S --needed --noconfirm jq ripgrep']
+
+    def test_unknown_targets_retried_without(self, stub):
+        """A misspelled package does not stop the others from installing"""
+        statuses = manager(stub).install(['jq', 'nosuchpkg', 'bad;name'])
+        assert [(s.name, s.status) for s in statuses] == [
+            ('jq', INSTALLED), ('nosuchpkg', NOT_FOUND), ('bad;name', INVALID)]
+        assert len([call for call in calls(stub) if call.startswith('-S')]) == 2
+
+
+class TestPlanInstalls:
+    def test_plan_installs_coalesced(self, stub):
+        """All installs in a plan run as one transaction"""
+        plan = "sudo pacman -S --noconfirm jq\ngit status\nsudo pacman -S ripgrep git\n"
+        with patch('vibe_coder.core.Ollama'):
+            coder = VirtualVibeCoder(model_name="test-model", lazy_tools=True)
+        coder.environment.packages = manager(stub)
+        result = coder._execute_plan(plan, "install tools")
+
+        assert [call for call in calls(stub) if call.startswith('-S')] == ['-S --needed --noconfirm jq ripgrep']
+        assert "jq: installed" in result
+        assert "ripgrep: installed" in result
+        assert "git: already installed" in result
@@ -0,0 +1,98 @@
+import time
+
+from vibe_coder.plan_parser import BLOCK, COMMAND, PlanStreamParser, Step, normalize_language, parse_plan
+
+
+PLAN = """Let's start.
+sudo pacman -S python
+```
+echo hello
+```
+Done, now commit:
+git status"""
+
+
+class TestPlanStreamParser:
+    def test_parse_complete_plan(self):
+        """Test that blocks and commands are extracted in document order"""
+        assert parse_plan(PLAN) == [
+            Step(COMMAND, "sudo pacman -S python"),
+            Step(BLOCK, "echo hello\n"),
+            Step(COMMAND, "git status"),
+        ]
+
+    def test_chunked_feed_matches_full_parse(self):
+        """Test that feeding token-sized chunks yields the same steps"""
+        parser = PlanStreamParser()
+        steps = []
+        for i in range(0, len(PLAN), 3):
+            steps.extend(parser.feed(PLAN[i:i + 3]))
+        steps.extend(parser.close())
+
+        assert steps == parse_plan(PLAN)
+
+    def test_block_ready_when_fence_closes(self):
+        """Test that a block is emitted as soon as its closing fence line ends"""
+        parser = PlanStreamParser()
+        assert parser.feed("```\nls\n``") == []
+        assert parser.feed("`") == []
+        assert parser.feed("\nmore text") == [Step(BLOCK, "ls\n")]
+
+    def test_unterminated_block_is_dropped(self):
+        """Test that a block without a closing fence is never executed"""
+        assert parse_plan("```\nrm -rf build\n") == []
+
+    def test_indentation_preserved(self):
+        """Test that Python blocks keep their indentation"""
+        plan = "```python\ndef main():\n    if True:\n        print('hi')\n```\n"
+        assert parse_plan(plan) == [
+            Step(BLOCK, "def main():\n    if True:\n        print('hi')\n", 'python'),
+        ]
+
+    def test_indented_fence_strips_its_own_indent(self):
+        """Test that a fence nested in a list item only removes the fence's indentation"""
+        plan = "1. Create it:\n   ```py\n   for i in range(3):\n       print(i)\n   ```\n"
+        assert parse_plan(plan) == [Step(BLOCK, "for i in range(3):\n    print(i)\n", 'python')]
+
+    def test_language_from_fence_tag(self):
+        """Test that fence info strings are normalized to a language"""
+        assert normalize_language("js") == "javascript"
+        assert normalize_language("{.python3 title=app.py}") == "python"
+        assert normalize_language("Rust") == "rust"
+        assert normalize_language("") == ""
+
+    def test_tilde_and_nested_fences(self):
+        """Test that a longer or different fence can contain a shorter one"""
+        plan = ("~~~markdown\n```bash\nls\n```\n~~~\n"
+                "````\ncat <<EOF\n```\nEOF\n````\n")
+        assert parse_plan(plan) == [
+            Step(BLOCK, "```bash\nls\n```\n", 'markdown'),
+            Step(BLOCK, "cat <<EOF\n```\nEOF\n"),
+        ]
+
+    def test_fence_with_info_string_does_not_close(self):
+        """Test that only a bare fence closes a block"""
+        plan = "```\n```python\nx = 1\n```\n"
+        assert parse_plan(plan) == [Step(BLOCK, "```python\nx = 1\n")]
+
+    def test_inline_commands(self):
+        """Test that commands in backticks or after a prompt are recognized"""
+        plan = "`git init`\n$ sudo pacman -S jq\nRun `git status` afterwards.\n"
+        assert parse_plan(plan) == [Step(COMMAND, "git init"), Step(COMMAND, "sudo pacman -S jq")]
+
+    def test_inline_code_is_not_a_fence(self):
+        """Test that ```code``` on one line does not open a block"""
+        assert parse_plan("```git status```\ngit log\n") == [Step(COMMAND, "git log")]
+
+    def test_linear_time_on_large_responses(self):
+        """Test that many small chunks of a multi-megabyte block parse in linear time"""
+        body = "x = 1\n" * 500000
+        plan = "```python\n" + body + "```\n"
+        start = time.perf_counter()
+        parser = PlanStreamParser()
+        steps = []
+        for i in range(0, len(plan), 64):
+            steps.extend(parser.feed(plan[i:i + 64]))
+        steps.extend(parser.close())
+        assert steps == [Step(BLOCK, body, 'python')]
+        assert time.perf_counter() - start < 5
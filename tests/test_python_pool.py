@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vibe_coder.capture import OutputCapture
+from vibe_coder.python_pool import PythonPool, ResourceLimits, write_script
+from vibe_coder.terminal import SudoTerminal
+
+
+@pytest.fixture
+def pool():
+    pool = PythonPool(size=2)
+    yield pool
+    pool.close()
+
+
+def run(pool, code, cwd=None, timeout=10):
+    path = write_script(code, '.py')
+    try:
+        return pool.run(path, cwd or os.getcwd(), timeout, OutputCapture(), OutputCapture())
+    finally:
+        os.unlink(path)
+
+
+class TestPythonPool:
+    def test_runs_block_as_main(self, pool):
+        """A block runs as __main__ with its output captured"""
+        result = run(pool, "import sys\nif __name__ == '__main__':\n    print('out')\n    print('err', file=sys.stderr)\n")
+        assert result.output() == ("out\n", "err\n", 0)
+
+    def test_fresh_namespace_per_block(self, pool):
+        """Globals from one block are not visible to the next"""
+        run(pool, "leaked = 1\nimport json\njson.leaked = 1\n")
+        result = run(pool, "import json\nprint('leaked' in globals(), hasattr(json, 'leaked'))\n")
+        assert result.stdout == "False False\n"
+
+    def test_cwd_and_local_imports(self, pool):
+        """Blocks run in the given directory and can import modules there"""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, 'helper.py'), 'w') as f:
+                f.write("VALUE = 42\n")
+            result = run(pool, "import os, helper\nprint(os.getcwd(), helper.VALUE)\n", cwd=tmp)
+            assert result.stdout == f"{os.path.realpath(tmp)} 42\n"
+
+    def test_exit_codes(self, pool):
+        """sys.exit codes and uncaught exceptions become exit codes"""
+        assert run(pool, "import sys\nsys.exit(3)\n").returncode == 3
+        result = run(pool, "raise ValueError('boom')\n")
+        assert result.returncode == 1
+        assert "ValueError: boom" in result.stderr
+
+    def test_exits_like_the_interpreter(self, pool):
+        """Non-daemon threads are joined and atexit handlers run before a block exits"""
+        result = run(pool, (
+            "import atexit, sys, threading, time\n"
+            "atexit.register(lambda: print('atexit'))\n"
+            "threading.Thread(target=lambda: (time.sleep(0.2), print('thread'))).start()\n"
+            "sys.stdout.write('buffered ')\n"
+        ))
+        assert result.output() == ("buffered thread\natexit\n", "", 0)
+
+    def test_timeout_kills_block_and_children(self, pool):
+        """A runaway block and the processes it started are killed; the worker survives"""
+        start = time.monotonic()
+        result = run(pool, "import subprocess\nsubprocess.Popen(['sleep', '30'])\nwhile True:\n    pass\n", timeout=1)
+        assert "timed out" in result.stderr
+        assert time.monotonic() - start < 5
+        assert run(pool, "print('still warm')\n").stdout == "still warm\n"
+
+    def test_memory_limit(self):
+        """The address-space limit stops oversized allocations"""
+        pool = PythonPool(size=1, limits=ResourceLimits(memory_bytes=512 * 1024 ** 2))
+        try:
+            result = run(pool, "data = bytearray(2 * 1024 ** 3)\n")
+        finally:
+            pool.close()
+        assert result.returncode == 1
+        assert "MemoryError" in result.stderr
+
+    def test_concurrent_blocks(self, pool):
+        """Blocks on different workers run at the same time"""
+        start = time.monotonic()
+        with ThreadPoolExecutor(2) as executor:
+            results = list(executor.map(lambda _: run(pool, "import time\ntime.sleep(0.5)\n"), range(2)))
+        assert [r.returncode for r in results] == [0, 0]
+        assert time.monotonic() - start < 0.95
+
+    def test_dead_worker_replaced(self, pool):
+        """A worker that dies is replaced by a fresh one"""
+        worker = pool._idle.get()
+        worker.proc.kill()
+        worker.proc.wait()
+        pool._idle.put(worker)
+        assert "Error executing command" in run(pool, "print(1)\n").stderr
+        assert run(pool, "print(1)\n").stdout == "1\n"
+
+
+class TestRunCode:
+    def test_unique_files_removed(self):
+        """Each block gets its own script file next to the project, deleted after it runs"""
+        with tempfile.TemporaryDirectory() as tmp:
+            terminal = SudoTerminal(cwd=tmp)
+            try:
+                with open(os.path.join(tmp, "helper.sh"), "w") as f:
+                    f.write("echo helped\n")
+                shell = terminal.run_code('echo "$0"; . "$(dirname "$0")/helper.sh"\n', '.sh', 'bash')
+                python = terminal.run_code("print(__file__)\n", '.py', 'python3')
+                assert shell.returncode == python.returncode == 0
+                assert shell.stdout.endswith("helped\n")
+                assert shell.stdout.split()[0] != python.stdout.strip()
+                assert os.path.dirname(python.stdout.strip()) == tmp
+                assert os.listdir(tmp) == ["helper.sh"]
+            finally:
+                terminal.close()
+
+    def test_python_sees_shell_environment(self):
+        """Python blocks in a persistent shell see its exported variables"""
+        terminal = SudoTerminal(persistent_shell=True)
+        try:
+            terminal.execute_command("export VIBE_BLOCK_TEST=set")
+            result = terminal.run_code("import os; print(os.environ['VIBE_BLOCK_TEST'])\n", '.py', 'python3')
+            assert result.stdout == "set\n"
+        finally:
+            terminal.close()
@@ -0,0 +1,36 @@
+from vibe_coder.router import CLASSIFIER, FAILED, NO_BLOCKS, ModelRouter, classify_request
+
+
+class TestModelRouter:
+    def test_escalation_reasons(self):
+        """Test that only the last tier's answers are always kept"""
+        router = ModelRouter(["small", "big"])
+
+        assert router.escalation(0, steps=0, failed=False) == NO_BLOCKS
+        assert router.escalation(0, steps=2, failed=True) == FAILED
+        assert router.escalation(0, steps=2, failed=False) is None
+        assert router.escalation(1, steps=0, failed=True) is None
+        assert ModelRouter(["small", "big"], escalate_on_no_blocks=False).escalation(0, 0, False) is None
+
+    def test_classifier_picks_first_tier(self):
+        """Test that hard-sounding requests skip the small model"""
+        router = ModelRouter(["small", "medium", "big"], classifier=lambda request: 5)
+
+        assert classify_request("create a hello world script") == 0
+        assert classify_request("refactor the parser") == 1
+        assert router.first_tier("anything") == 2
+        assert router.escalations[(0, CLASSIFIER)] == 1
+
+    def test_metrics(self):
+        """Test per-tier latency and escalation rates"""
+        router = ModelRouter(["small", "big"])
+        router.observe(0, 0.5)
+        router.observe(0, 0.5)
+        router.escalation(0, steps=0, failed=False)
+        router.observe(1, 3.0)
+
+        assert router.stats()["small"]["escalation_rate"] == 0.5
+        assert router.stats()["big"]["seconds_total"] == 3.0
+        text = router.prometheus_text()
+        assert 'vibe_coder_tier_generation_seconds_count{tier="0",model="small"} 2' in text
+        assert 'vibe_coder_tier_escalations_total{tier="0",model="small",reason="no_blocks"} 1' in text
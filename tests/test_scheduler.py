@@ -0,0 +1,101 @@
+import threading
+
+from vibe_coder.plan_parser import BLOCK, COMMAND
+from vibe_coder.scheduler import ANY, PlanStep, build_dag, run_dag
+
+
+def make_steps(*steps):
+    return [PlanStep(i, kind, content) for i, (kind, content) in enumerate(steps)]
+
+
+def deps(*steps):
+    dag = build_dag(make_steps(*steps), lambda step: True, '/work')
+    return [step.deps for step in dag]
+
+
+class TestBuildDag:
+    def test_independent_file_writes(self):
+        """Test that writes to different files do not depend on each other"""
+        assert deps(
+            (COMMAND, "echo a > a.txt"),
+            (COMMAND, "echo b > b.txt"),
+            (COMMAND, "cat a.txt"),
+        ) == [set(), set(), {0}]
+
+    def test_directory_contains_files(self):
+        """Test that a directory write orders the files written inside it"""
+        assert deps(
+            (COMMAND, "mkdir -p src"),
+            (BLOCK, "cat > src/main.py <<EOF\nprint('hi')\nEOF\n"),
+            (COMMAND, "ruff check docs"),
+        ) == [set(), {0}, set()]
+
+    def test_cd_is_barrier(self):
+        """Test that shell state changes run alone"""
+        dag = build_dag(make_steps(
+            (COMMAND, "touch a"),
+            (COMMAND, "cd build"),
+            (COMMAND, "touch b"),
+        ), lambda step: True, '/work')
+
+        assert dag[1].barrier
+        assert [step.deps for step in dag] == [set(), {0}, {1}]
+
+    def test_paths_follow_cd(self):
+        """Test that paths after a cd resolve in the new directory, and anywhere after a compound cd"""
+        dag = build_dag(make_steps(
+            (COMMAND, "cd build"),
+            (COMMAND, "touch out.txt"),
+            (COMMAND, "cd src && make"),
+            (COMMAND, "touch other.txt"),
+        ), lambda step: True, '/work')
+
+        assert dag[1].writes == {'path:/work/build/out.txt'}
+        assert ANY in dag[3].writes
+
+    def test_package_install_dependencies(self):
+        """Test that installs serialize and users of a package wait for it"""
+        assert deps(
+            (COMMAND, "sudo pacman -S --noconfirm jq"),
+            (COMMAND, "sudo pacman -S --noconfirm ripgrep"),
+            (COMMAND, "ls"),
+            (COMMAND, "jq . data.json"),
+        ) == [set(), {0}, set(), {0, 1, 2}]
+
+    def test_unknown_commands_conflict(self):
+        """Test that commands with unknown effects are ordered against everything"""
+        assert deps(
+            (COMMAND, "git init"),
+            (COMMAND, "echo x > x.txt"),
+            (COMMAND, "make"),
+        ) == [set(), set(), {0, 1}]
+
+
+class TestRunDag:
+    def test_results_in_step_order(self):
+        """Test that parallel steps overlap but results keep document order"""
+        steps = build_dag(make_steps(
+            (COMMAND, "echo a > a.txt"),
+            (COMMAND, "echo b > b.txt"),
+        ), lambda step: True, '/work')
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(step):
+            # Both steps must be running at once to get past the barrier
+            barrier.wait()
+            return [step.content]
+
+        assert run_dag(steps, run, max_workers=2) == [["echo a > a.txt"], ["echo b > b.txt"]]
+
+    def test_unmet_dependencies_run_in_order(self):
+        """Test that a cycle or a missing dependency does not hang the plan"""
+        steps = make_steps((COMMAND, "a"), (COMMAND, "b"), (COMMAND, "c"))
+        steps[0].deps, steps[1].deps, steps[2].deps = {1}, {0}, {7}
+        order = []
+
+        def run(step):
+            order.append(step.content)
+            return [step.content]
+
+        assert run_dag(steps, run, max_workers=2) == [["a"], ["b"], ["c"]]
+        assert order[0] == "a"
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+from vibe_coder import streaming
+from vibe_coder.fair_queue import FairGate
+from vibe_coder.server import VibeServer
+from vibe_coder.streaming import StreamEvent
+
+ids = itertools.count()
+
+
+class FakeCoder:
+    def __init__(self, resume=None, release=None):
+        if resume == "missing":
+            raise KeyError("Unknown session missing")
+        self.session_id = resume or f"s{next(ids)}"
+        self.conversation_history = []
+        self.release = release
+        self.closed = False
+
+    def stream_request(self, text):
+        yield StreamEvent(streaming.TOKEN, f"echo {text}")
+        if self.release is not None:
+            self.release.wait(5)
+        yield StreamEvent(streaming.BLOCK_RESULT, "Exit code: 0", "command")
+        self.conversation_history += [{"role": "user", "content": text}, {"role": "assistant", "content": "ok"}]
+        yield StreamEvent(streaming.DONE, "done")
+
+    def close(self):
+        self.closed = True
+
+
+async def call(port, method, path, body=None):
+    """Send one request; returns (status, body text)"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    payload = json.dumps(body).encode() if body is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, text = response.decode().partition('\r\n\r\n')
+    return int(head.split()[1]), text
+
+
+def events(text):
+    return [(block.split('\n')[0][len('event: '):], json.loads(block.split('\n')[1][len('data: '):]))
+            for block in text.strip().split('\n\n')]
+
+
+def serve(test, factory=FakeCoder, **options):
+    async def main():
+        server = VibeServer(factory, FairGate(), **options)
+        await server.start('127.0.0.1', 0)
+        try:
+            await test(server)
+        finally:
+            await server.close()
+    asyncio.run(main())
+
+
+class TestVibeServer:
+    def test_session_request_streams_events(self):
+        """Test that a request on a session streams its events as SSE"""
+        async def test(server):
+            status, text = await call(server.port, 'POST', '/sessions')
+            assert status == 201
+            session = json.loads(text)['session']
+
+            status, text = await call(server.port, 'POST', f'/sessions/{session}/requests', {"request": "hi"})
+
+            assert status == 200
+            assert events(text) == [
+                ("token", {"text": "echo hi", "step": None}),
+                ("block_result", {"text": "Exit code: 0", "step": "command"}),
+                ("done", {"text": "done", "step": None}),
+            ]
+            status, text = await call(server.port, 'GET', '/health')
+            assert json.loads(text)['sessions'] == 1
+            status, text = await call(server.port, 'GET', '/metrics')
+            assert 'vibe_coder_server_requests_total{outcome="ok"} 1' in text
+
+        serve(test)
+
+    def test_sessions_run_concurrently(self):
+        """Test that a second session is served while the first is still running"""
+        release = threading.Event()
+
+        async def test(server):
+            first = json.loads((await call(server.port, 'POST', '/sessions'))[1])['session']
+            server.sessions[first].coder.release = release
+            second = json.loads((await call(server.port, 'POST', '/sessions'))[1])['session']
+
+            slow = asyncio.create_task(call(server.port, 'POST', f'/sessions/{first}/requests', {"request": "a"}))
+            while not server.sessions[first].busy:
+                await asyncio.sleep(0.01)
+            status, _ = await call(server.port, 'POST', f'/sessions/{first}/requests', {"request": "b"})
+            assert status == 409
+            status, text = await call(server.port, 'POST', f'/sessions/{second}/requests', {"request": "c"})
+            assert status == 200 and events(text)[-1][0] == "done"
+
+            release.set()
+            status, text = await slow
+            assert events(text)[-1][0] == "done"
+
+        serve(test)
+
+    def test_errors(self):
+        """Test the status codes of bad requests and exhausted limits"""
+        async def test(server):
+            assert (await call(server.port, 'GET', '/nowhere'))[0] == 404
+            assert (await call(server.port, 'DELETE', '/health'))[0] == 405
+            assert (await call(server.port, 'POST', '/sessions', {"resume": "missing"}))[0] == 404
+            session = json.loads((await call(server.port, 'POST', '/sessions'))[1])['session']
+            assert (await call(server.port, 'POST', f'/sessions/{session}/requests', {}))[0] == 400
+            assert (await call(server.port, 'POST', '/sessions'))[0] == 503
+
+            coder = server.sessions[session].coder
+            assert (await call(server.port, 'DELETE', f'/sessions/{session}'))[0] == 200
+            assert coder.closed and not server.sessions
+
+        serve(test, max_sessions=1)
+
+    def test_session_limit_holds_for_concurrent_creates(self):
+        """Test that sessions still being created count against the limit"""
+        def slow_factory(resume):
+            time.sleep(0.2)
+            return FakeCoder(resume)
+
+        async def test(server):
+            statuses = sorted(status for status, _ in await asyncio.gather(
+                call(server.port, 'POST', '/sessions'), call(server.port, 'POST', '/sessions')))
+            assert statuses == [201, 503]
+
+        serve(test, slow_factory, max_sessions=1)
+
+    def test_closing_busy_session_waits_for_request(self):
+        """Test that a session closed mid-request keeps its coder until the request ends"""
+        release = threading.Event()
+
+        async def test(server):
+            session = json.loads((await call(server.port, 'POST', '/sessions'))[1])['session']
+            coder = server.sessions[session].coder
+            coder.release = release
+            running = asyncio.create_task(call(server.port, 'POST', f'/sessions/{session}/requests', {"request": "a"}))
+            while not server.sessions[session].busy:
+                await asyncio.sleep(0.01)
+
+            assert (await call(server.port, 'DELETE', f'/sessions/{session}'))[0] == 200
+            assert not coder.closed and not server.sessions
+
+            release.set()
+            assert events((await running)[1])[-1][0] == "done"
+            assert coder.closed
+
+        serve(test)
@@ -0,0 +1,95 @@
+from unittest.mock import patch
+
+from vibe_coder.core import VirtualVibeCoder
+from vibe_coder.sessions import SessionStore
+
+
+def add_exchange(store, session, request, reply):
+    store.append_turn(session, "user", request, request)
+    store.append_turn(session, "assistant", reply)
+
+
+class TestSessionStore:
+    def test_appends_survive_reopen(self, tmp_path):
+        """Test that turns and commands are durable without an explicit close"""
+        path = str(tmp_path / "sessions.db")
+        store = SessionStore(path)
+        store.open_session("s1", "model", "/tmp")
+        add_exchange(store, "s1", "build it", "built")
+        store.append_command("s1", "make", 0, 1.5, "/tmp", 10, 0)
+
+        reopened = SessionStore(path)
+        assert reopened.tail("s1", 1000) == [
+            {"role": "user", "content": "build it"},
+            {"role": "assistant", "content": "built"},
+        ]
+        assert reopened.commands("s1")[0]['command'] == "make"
+        assert reopened.latest_session() == "s1"
+
+    def test_tail_fits_budget(self, tmp_path):
+        """Test that resuming keeps only the newest exchanges that fit"""
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        store.open_session("s1")
+        for i in range(10):
+            add_exchange(store, "s1", f"request {i}", f"reply {i}")
+
+        tail = store.tail("s1", 20, count_tokens=lambda text: 5)
+
+        assert [message["content"] for message in tail] == ["request 8", "reply 8", "request 9", "reply 9"]
+
+    def test_interrupted_request(self, tmp_path):
+        """Test that a request without a reply is reported but not resumed"""
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        store.open_session("s1")
+        add_exchange(store, "s1", "first", "done")
+        store.append_turn("s1", "user", "Context...\n\nUser request: second", "second")
+
+        assert store.interrupted_request("s1") == "second"
+        assert [message["content"] for message in store.tail("s1", 1000)] == ["first", "done"]
+
+    def test_search(self, tmp_path):
+        """Test that search finds turns and commands across sessions"""
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        for session in ("s1", "s2"):
+            store.open_session(session)
+        add_exchange(store, "s1", "set up nginx", "installed nginx")
+        add_exchange(store, "s2", "write a rust cli", "cargo new cli")
+        store.append_command("s2", "cargo build --release", 0, 3.0)
+
+        hits = store.search("cargo")
+
+        assert {(hit.session, hit.kind) for hit in hits} == {("s2", "assistant"), ("s2", "command")}
+        # Punctuation is not parsed as query syntax
+        assert {hit.session for hit in store.search("nginx-")} == {"s1"}
+        assert [session.title for session in store.sessions()] == ["write a rust cli", "set up nginx"]
+
+
+class TestCoderSessions:
+    def test_turns_and_commands_recorded(self, tmp_path):
+        """Test that a request records its turns and commands, and can be resumed"""
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.return_value.invoke.return_value = "```\necho recorded\n```"
+            coder = VirtualVibeCoder(model_name="test-model", session_store=store)
+            coder.process_request("say recorded")
+
+            resumed = VirtualVibeCoder(model_name="test-model", session_store=store, session_id=coder.session_id)
+
+        assert resumed.conversation_history == coder.conversation_history
+        commands = store.commands(coder.session_id)
+        assert [(c['command'], c['exit_code']) for c in commands] == [("echo recorded\n", 0)]
+
+    def test_new_session_keeps_old_one(self, tmp_path):
+        """Test that clearing the history starts a new session instead of deleting"""
+        store = SessionStore(str(tmp_path / "sessions.db"))
+        with patch('vibe_coder.core.Ollama') as mock_llm:
+            mock_llm.return_value.invoke.return_value = "No commands"
+            coder = VirtualVibeCoder(model_name="test-model", session_store=store)
+            coder.process_request("first")
+            old = coder.session_id
+            coder.new_session()
+            coder.process_request("second")
+
+        assert coder.session_id != old
+        assert len(store.tail(old, 10000)) == 2
+        assert len(coder.conversation_history) == 2
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import tempfile
+
+from unittest.mock import patch
+
+from vibe_coder.snapshot import Snapshot
+from vibe_coder.terminal import SudoTerminal
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class TestSnapshot:
+    def test_rollback_restores_tree(self):
+        """Test that changed, added and removed files and directories are put back"""
+        with tempfile.TemporaryDirectory() as root:
+            write(os.path.join(root, "src", "app.py"), "old\n")
+            write(os.path.join(root, "README"), "readme\n")
+            write(os.path.join(root, "build", "out.o"), "object\n")
+            write(os.path.join(root, ".gitignore"), "build/\n")
+            snapshot = Snapshot.take(root)
+
+            write(os.path.join(root, "src", "app.py"), "new\n")
+            os.unlink(os.path.join(root, "README"))
+            write(os.path.join(root, "extra", "added.py"), "added\n")
+            write(os.path.join(root, "build", "out.o"), "rebuilt\n")
+            result = snapshot.rollback()
+
+            assert (result.restored, result.removed, result.lost) == (2, 1, [])
+            assert read(os.path.join(root, "src", "app.py")) == "old\n"
+            assert read(os.path.join(root, "README")) == "readme\n"
+            assert not os.path.exists(os.path.join(root, "extra"))
+            # Ignored files are left alone
+            assert read(os.path.join(root, "build", "out.o")) == "rebuilt\n"
+            assert sorted(os.listdir(root)) == [".gitignore", "README", "build", "src"]
+
+    def test_hard_links(self):
+        """Test that replaced linked files are restored and rewritten ones reported"""
+        with tempfile.TemporaryDirectory() as root:
+            write(os.path.join(root, "replaced.txt"), "one\n")
+            write(os.path.join(root, "rewritten.txt"), "one\n")
+            # Nothing may be copied, so files are linked unless the filesystem reflinks
+            snapshot = Snapshot.take(root, copy_bytes=0)
+            linked = os.stat(os.path.join(root, "rewritten.txt")).st_nlink > 1
+
+            assert SudoTerminal(cwd=root).write_file("replaced.txt", "two\n")[0]
+            with open(os.path.join(root, "rewritten.txt"), "a") as f:
+                f.write("two\n")
+            result = snapshot.rollback()
+
+            assert read(os.path.join(root, "replaced.txt")) == "one\n"
+            assert result.lost == (["rewritten.txt"] if linked else [])
+
+    def test_too_big(self):
+        """Test that trees over the file limit, and the home directory, are not snapshotted"""
+        with tempfile.TemporaryDirectory() as root:
+            for i in range(3):
+                write(os.path.join(root, f"{i}.txt"), "")
+            assert Snapshot.take(root, max_files=2) is None
+        assert Snapshot.take(os.path.expanduser("~")) is None
+
+    def test_store_kept_out_of_project(self):
+        """Test that the copies live next to the project, or are excluded from git inside it"""
+        with tempfile.TemporaryDirectory() as parent:
+            root = os.path.join(parent, "project")
+            write(os.path.join(root, "app.py"), "old\n")
+            subprocess.run(["git", "init", "-q", root], check=True)
+            snapshot = Snapshot.take(root)
+            assert os.path.dirname(snapshot.store) == parent
+            assert sorted(os.listdir(root)) == [".git", "app.py"]
+            snapshot.discard()
+
+            with patch("os.access", return_value=False):
+                snapshot = Snapshot.take(root)
+            assert os.path.dirname(snapshot.store) == root
+            status = subprocess.run(["git", "status", "--porcelain"], cwd=root, capture_output=True, text=True)
+            assert status.stdout == "?? app.py\n"
+            snapshot.discard()
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+# Cumulative import time allowed for vibe_coder.core, in seconds. The REPL
+# prompt should appear within 200 ms, interpreter start-up included.
+IMPORT_BUDGET = 0.15
+
+# Modules that must only load once a request needs them
+DEFERRED_MODULES = ('langchain', 'langchain_community', 'ollama', 'httpx', 'rich', 'pexpect', 'asyncio')
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = {k: v for k, v in os.environ.items() if k != 'PYTHONPATH'}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+
+
+class TestStartup:
+    def test_heavy_modules_not_imported(self):
+        """Importing the package and constructing a coder leaves the heavy modules unloaded"""
+        result = run_python('-c', (
+            "import sys\n"
+            "from vibe_coder.core import VirtualVibeCoder\n"
+            "VirtualVibeCoder(model_name='test-model')\n"
+            f"print(' '.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+        ))
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == ""
+
+    def test_import_time_budget(self):
+        """vibe_coder.core imports within the start-up budget"""
+        # Best of three, measured by the interpreter itself to exclude process start-up
+        times = []
+        for _ in range(3):
+            result = run_python('-X', 'importtime', '-c', 'import vibe_coder.core')
+            assert result.returncode == 0, result.stderr
+            line = [l for l in result.stderr.splitlines() if l.endswith('| vibe_coder.core')][-1]
+            times.append(int(line.split('|')[1]) / 1e6)
+        assert min(times) < IMPORT_BUDGET
+
+    def test_version_flag(self):
+        """--version answers without loading the model client"""
+        from vibe_coder import __version__
+        result = run_python('main.py', '--version')
+        assert result.returncode == 0
+        assert __version__ in result.stdout
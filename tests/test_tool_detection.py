@@ -0,0 +1,50 @@
+import os
+from unittest.mock import patch
+
+from vibe_coder.arch_linux import ArchLinuxEnvironment
+from vibe_coder.tool_detection import TOOL_PROBES, LazyTools, ToolCache, detect_tools
+
+
+class TestToolDetection:
+    def test_detect_all_tools(self, tmp_path):
+        """Test that every probed tool is reported, in probe order"""
+        tools = detect_tools(TOOL_PROBES, ToolCache(str(tmp_path / "tools.json")))
+
+        assert list(tools) == [tool for tool, _ in TOOL_PROBES]
+        assert tools['python'] is True
+
+    def test_cache_skips_probes(self, tmp_path):
+        """Test that a warm cache answers without spawning any probe"""
+        cache_path = str(tmp_path / "tools.json")
+        first = detect_tools(TOOL_PROBES, ToolCache(cache_path))
+
+        with patch('vibe_coder.tool_detection.probe_tool') as probe:
+            second = detect_tools(TOOL_PROBES, ToolCache(cache_path))
+
+        probe.assert_not_called()
+        assert second == first
+
+    def test_cache_invalidated_by_path(self, tmp_path):
+        """Test that changing $PATH forces a fresh probe"""
+        cache_path = str(tmp_path / "tools.json")
+        detect_tools(TOOL_PROBES, ToolCache(cache_path))
+
+        with patch.dict(os.environ, {'PATH': str(tmp_path)}):
+            tools = detect_tools(TOOL_PROBES, ToolCache(cache_path))
+
+        assert not any(tools.values())
+
+    def test_lazy_probes_on_lookup(self, tmp_path):
+        """Test that lazy mode only probes the tools that are read"""
+        tools = LazyTools(TOOL_PROBES, ToolCache(str(tmp_path / "tools.json")))
+
+        assert tools.probed() == {}
+        assert tools['python'] is True
+        assert list(tools.probed()) == ['python']
+
+    def test_environment_lazy_mode(self, tmp_path):
+        """Test that the environment exposes lazy tool detection"""
+        env = ArchLinuxEnvironment(lazy_tools=True, tool_cache=ToolCache(str(tmp_path / "tools.json")))
+
+        assert isinstance(env.available_tools, LazyTools)
+        assert 'git' in env.available_tools
@@ -0,0 +1,117 @@
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from vibe_coder import tracing
+from vibe_coder.plan_parser import COMMAND
+from vibe_coder.scheduler import PlanStep, run_dag
+from vibe_coder.terminal import SudoTerminal, command_name
+
+
+class TestTracer:
+    def test_disabled_tracer_hands_out_noop_span(self):
+        """Without configuration, spans cost nothing and record nothing"""
+        tracer = tracing.Tracer()
+        assert tracer.span('phase') is tracing.NOOP_SPAN
+        tracer.observe('phase', 1.0)
+        assert tracer.histograms == {}
+
+    def test_spans_written_with_parent_ids(self):
+        """Nested spans share a trace id and point at their parent"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            tracer = tracing.Tracer(enabled=True, trace_path=path)
+            with tracer.span('outer'):
+                with tracer.span('inner', command='git') as span:
+                    span.set(exit_code=0)
+            tracer.close()
+
+            with open(path) as f:
+                inner, outer = [json.loads(line) for line in f]
+            assert (inner['name'], outer['name']) == ('inner', 'outer')
+            assert inner['parent_id'] == outer['span_id']
+            assert outer['parent_id'] is None
+            assert inner['trace_id'] == outer['trace_id']
+            assert inner['attrs'] == {'command': 'git', 'exit_code': 0}
+
+    def test_parallel_steps_nest_under_plan(self):
+        """Spans of steps run on the scheduler's pool point at the enclosing span"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            tracing.configure(trace_path=path)
+            try:
+                def run(step):
+                    with tracing.span('step'):
+                        return []
+                with tracing.span('plan'):
+                    run_dag([PlanStep(i, COMMAND, 'true') for i in range(3)], run, max_workers=3)
+            finally:
+                tracing.configure()
+
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+            plan = next(record for record in records if record['name'] == 'plan')
+            assert [record['parent_id'] for record in records if record['name'] == 'step'] == [plan['span_id']] * 3
+
+    def test_exception_recorded_on_span(self):
+        """A failing phase is still timed and marked with the error type"""
+        tracer = tracing.Tracer(enabled=True)
+        try:
+            with tracer.span('llm'):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        assert tracer.histograms[('llm', '')].count == 1
+
+    def test_prometheus_histogram(self):
+        """Buckets are cumulative and labelled with phase and command"""
+        tracer = tracing.Tracer(enabled=True, buckets=(0.1, 1.0))
+        tracer.observe('execute_command', 0.05, command='pacman')
+        tracer.observe('execute_command', 0.5, command='pacman')
+        tracer.observe('execute_command', 5.0, command='pacman')
+        text = tracer.prometheus_text()
+
+        labels = 'phase="execute_command",command="pacman"'
+        assert f'{tracing.METRIC_NAME}_bucket{{{labels},le="0.1"}} 1' in text
+        assert f'{tracing.METRIC_NAME}_bucket{{{labels},le="1.0"}} 2' in text
+        assert f'{tracing.METRIC_NAME}_bucket{{{labels},le="+Inf"}} 3' in text
+        assert f'{tracing.METRIC_NAME}_sum{{{labels}}} 5.55' in text
+        assert f'{tracing.METRIC_NAME}_count{{{labels}}} 3' in text
+
+    def test_flush_writes_metrics_file(self):
+        """flush() leaves a complete metrics file in place"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'vibe.prom')
+            tracer = tracing.Tracer(enabled=True, metrics_path=path)
+            tracer.observe('process_request', 0.2)
+            tracer.flush()
+            with open(path) as f:
+                assert 'phase="process_request"' in f.read()
+            assert os.listdir(tmp) == ['vibe.prom']
+
+
+class TestInstrumentation:
+    def test_command_name(self):
+        """Metrics group commands by program, ignoring sudo and arguments"""
+        assert command_name("sudo pacman -S git") == "pacman"
+        assert command_name("/usr/bin/git status") == "git"
+        assert command_name("") == ""
+        assert command_name("FOO=bar sudo env BAZ=1 make -j4") == "make"
+
+    def test_execute_command_traced(self):
+        """Terminal commands are recorded once tracing is configured"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            tracing.configure(trace_path=path)
+            try:
+                SudoTerminal().execute_command("echo traced")
+            finally:
+                tracing.configure()
+            with open(path) as f:
+                record = json.loads(f.readline())
+            assert record['name'] == 'execute_command'
+            assert record['attrs']['command'] == 'echo'
+            assert record['attrs']['exit_code'] == 0
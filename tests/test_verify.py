@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+
+from vibe_coder.capture import CommandResult
+from vibe_coder.verify import (Verifier, VerifyCache, changed_files, make_goals, parse_makefile,
+                               python_imports)
+
+
+def write(root, path, text):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class Recorder:
+    def __init__(self, code=0):
+        self.commands = []
+        self.code = code
+
+    def __call__(self, command, timeout):
+        self.commands.append(command)
+        return CommandResult("", "", self.code)
+
+
+class TestVerifier:
+    def test_python_import_graph(self):
+        """Test that only test files importing a changed module, directly or not, are run"""
+        with tempfile.TemporaryDirectory() as root:
+            write(root, "src/app/__init__.py", "")
+            write(root, "src/app/models.py", "X = 1\n")
+            write(root, "src/app/views.py", "from .models import X\n")
+            write(root, "src/app/other.py", "Y = 2\n")
+            write(root, "tests/test_views.py", "from app.views import X\n")
+            write(root, "tests/test_other.py", "import app.other\n")
+            verifier = Verifier(root, Recorder())
+            state = verifier.state()
+
+            targets = verifier.targets(["src/app/models.py"], state)
+
+            assert [target.inputs[0] for target in targets] == ["tests/test_views.py"]
+            assert set(targets[0].inputs) == {"tests/test_views.py", "src/app/views.py",
+                                              "src/app/models.py", "src/app/__init__.py"}
+            # The package's __init__ runs for every import of the package
+            assert len(verifier.targets(["src/app/__init__.py"], state)) == 2
+
+    def test_results_cached_on_input_hashes(self):
+        """Test that a pass is reused until one of the target's inputs changes"""
+        with tempfile.TemporaryDirectory() as root:
+            write(root, "lib.py", "A = 1\n")
+            write(root, "test_lib.py", "import lib\n")
+            run = Recorder()
+            verifier = Verifier(root, run, VerifyCache(os.path.join(root, ".cache", "verify.db")))
+
+            assert verifier.verify(["lib.py"])[0].cached is False
+            assert verifier.verify(["lib.py"])[0].cached is True
+            # Same content, new mtime: still cached
+            write(root, "lib.py", "A = 1\n")
+            assert verifier.verify(["lib.py"])[0].cached is True
+            write(root, "lib.py", "A = 2\n")
+            assert verifier.verify(["lib.py"])[0].cached is False
+            assert len(run.commands) == 2 and "pytest -q test_lib.py" in run.commands[0]
+
+            # Failures are never cached
+            failing = Verifier(root, Recorder(code=1))
+            write(root, "lib.py", "A = 3\n")
+            assert not failing.verify(["lib.py"])[0].ok
+            assert not failing.verify(["lib.py"])[0].cached
+
+    def test_makefile_goals(self):
+        """Test that only the outermost targets fed by a changed file are built"""
+        rules, default = parse_makefile(
+            "CC := gcc\n"
+            "all: app tool\n"
+            "app: main.o util.o\n"
+            "\t$(CC) -o $@ $^\n"
+            "tool: tool.c\n"
+            "%.o: %.c util.h\n"
+            ".PHONY: all\n"
+        )
+        assert default == "all"
+        assert make_goals(rules, default, ["tool.c"]) == ["all"]
+        assert make_goals(rules, default, ["README"]) == []
+        del rules["all"]
+        assert make_goals(rules, default, ["util.h"]) == ["app"]
+
+    def test_npm_dependents(self):
+        """Test that a package depending on a changed one by path is tested too"""
+        with tempfile.TemporaryDirectory() as root:
+            write(root, "core/package.json", json.dumps({"scripts": {"test": "node test.js"}}))
+            write(root, "core/index.js", "")
+            write(root, "web/package.json", json.dumps({"scripts": {"build": "vite build"},
+                                                        "dependencies": {"core": "file:../core"}}))
+            write(root, "docs/package.json", json.dumps({"scripts": {"test": "echo \"Error: no test specified\" && exit 1"}}))
+            verifier = Verifier(root, Recorder())
+
+            commands = [target.command for target in verifier.targets(["core/index.js"], verifier.state())]
+
+            assert commands == ["npm --prefix core test", "npm --prefix web run build"]
+
+    def test_changed_files(self):
+        """Test that additions, removals and modifications are all reported"""
+        before = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        after = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        assert changed_files(before, after) == ["b", "c", "d"]
+        assert python_imports("from . import sibling\n", "pkg.mod", False) == {"pkg", "pkg.sibling"}
@@ -0,0 +1,120 @@
+import os
+
+from vibe_coder.workspace import IgnoreFile, WorkspaceIndex, is_ignored, parse_gitignore, tokenize, worth_indexing
+
+
+def write(root, path, content):
+    full = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, 'w') as f:
+        f.write(content)
+
+
+class TestGitignore:
+    def test_patterns(self):
+        """Test anchoring, directory-only rules, globs and negation"""
+        stack = (IgnoreFile('', 0, tuple(parse_gitignore("*.log\n!keep.log\n/build/\ndocs/**/*.tmp\n"))),)
+
+        assert is_ignored("a/debug.log", False, stack)
+        assert not is_ignored("a/keep.log", False, stack)
+        assert is_ignored("build", True, stack)
+        assert not is_ignored("build", False, stack)
+        assert not is_ignored("src/build", True, stack)
+        assert is_ignored("docs/x/y/z.tmp", False, stack)
+
+    def test_tokenize_splits_identifiers(self):
+        """Test that snake_case and camelCase names also yield their parts"""
+        assert tokenize("parseHTTPRequest load_config") == [
+            "parsehttprequest", "parse", "http", "request", "load_config", "load", "config"]
+
+
+class TestWorkspaceIndex:
+    def test_search_respects_gitignore(self, tmp_path):
+        """Test that ignored files are not indexed and matches rank by relevance"""
+        root = str(tmp_path)
+        write(root, ".gitignore", "dist/\n")
+        write(root, "server.py", "def start_server(port):\n    listen(port)\n")
+        write(root, "util.py", "def helper():\n    return 1\n")
+        write(root, "dist/server.py", "def start_server(port): pass\n")
+
+        index = WorkspaceIndex(root)
+        index.refresh()
+
+        hits = index.search("start the server on a port")
+        assert [hit.path for hit in hits] == ["server.py"]
+
+    def test_refresh_only_reads_changed_files(self, tmp_path):
+        """Test that a refresh reindexes modified, new and deleted files only"""
+        root = str(tmp_path)
+        for i in range(20):
+            write(root, f"pkg/mod{i}.py", f"value_{i} = {i}\n")
+        index = WorkspaceIndex(root)
+        assert index.refresh().updated == 20
+        assert index.refresh().updated == 0
+
+        write(root, "pkg/mod3.py", "renamed_value = 3\n")
+        os.utime(os.path.join(root, "pkg/mod3.py"), ns=(1, 1))
+        write(root, "pkg/new.py", "brand_new = 1\n")
+        os.unlink(os.path.join(root, "pkg/mod4.py"))
+        stats = index.refresh()
+
+        assert (stats.files, stats.updated, stats.removed) == (20, 2, 1)
+        assert [hit.path for hit in index.search("renamed_value")] == ["pkg/mod3.py"]
+        assert "pkg/mod4.py" not in [hit.path for hit in index.search("value_4")]
+
+    def test_gitignore_change_rescans(self, tmp_path):
+        """Test that editing .gitignore re-applies it to cached directory listings"""
+        root = str(tmp_path)
+        write(root, "src/generated.py", "generated_table = []\n")
+        index = WorkspaceIndex(root)
+        index.refresh()
+        assert index.search("generated_table")
+
+        write(root, ".gitignore", "generated.py\n")
+        index.refresh()
+        assert "src/generated.py" not in [hit.path for hit in index.search("generated_table")]
+
+    def test_context_fits_budget(self, tmp_path):
+        """Test that snippets are formatted with their lines and kept within the budget"""
+        root = str(tmp_path)
+        write(root, "small.py", "def fetch_weather():\n    pass\n")
+        write(root, "large.py", "def fetch_weather_report():\n" + "    x = 1\n" * 39)
+
+        index = WorkspaceIndex(root)
+        index.refresh()
+        context = index.context("fetch weather", budget_tokens=40)
+
+        assert "small.py (lines 1-2):\n```\ndef fetch_weather():\n    pass\n```" in context
+        assert "large.py" not in context
+
+    def test_gitignore_above_root(self, tmp_path):
+        """Test that an index of a subdirectory applies the repository's .gitignore"""
+        root = str(tmp_path)
+        os.mkdir(os.path.join(root, ".git"))
+        write(root, ".gitignore", "*.gen.py\napp/build/\n")
+        write(root, "app/main.py", "def launch_app(): pass\n")
+        write(root, "app/table.gen.py", "def launch_app_table(): pass\n")
+        write(root, "app/build/out.py", "def launch_app_build(): pass\n")
+
+        index = WorkspaceIndex(os.path.join(root, "app"))
+        index.refresh()
+
+        assert [hit.path for hit in index.search("launch_app")] == ["main.py"]
+
+    def test_context_waits_for_background_refresh(self, tmp_path):
+        """Test that the first request gets no snippets instead of waiting for the index"""
+        root = str(tmp_path)
+        write(root, "server.py", "def start_server(port): pass\n")
+        index = WorkspaceIndex(root)
+
+        assert index.context("start_server", budget_tokens=100) == ''
+        index.refresh_async().join()
+        assert "server.py" in index.context("start_server", budget_tokens=100)
+
+    def test_home_is_not_indexed(self):
+        """Test that / and the home directory are left alone"""
+        home = os.path.expanduser("~")
+
+        assert not worth_indexing("/")
+        assert not worth_indexing(home)
+        assert worth_indexing(os.path.join(home, "project"))
@@ -1,72 +1,46 @@
+import os
+from typing import Iterable, List, Mapping, Optional, Tuple
+from .materializer import materialize
+from .packages import PackageManager, PackageStatus, format_statuses
 from .terminal import SudoTerminal
+from .tool_detection import TOOL_PROBES, LazyTools, ToolCache, detect_tools
 
 class ArchLinuxEnvironment:
-    def __init__(self):
-        self.terminal = SudoTerminal()
+    def __init__(self, lazy_tools: bool = False, tool_cache: Optional[ToolCache] = None,
+                 cwd: Optional[str] = None, persistent_shell: bool = False):
+        self.terminal = SudoTerminal(persistent_shell=persistent_shell, cwd=cwd)
+        self.packages = PackageManager(self.terminal)
+        self.lazy_tools = lazy_tools
+        self.tool_cache = tool_cache if tool_cache is not None else ToolCache()
         self.available_tools = self._detect_tools()
     
-    def _detect_tools(self) -> dict:
+    def _detect_tools(self) -> Mapping[str, bool]:
         """Detect available development tools on the system"""
-        tools = {}
-        
-        # Check programming languages
-        for lang, cmd in [
-            ('python', 'python3 --version'),
-            ('node', 'node --version'),
-            ('gcc', 'gcc --version'),
-            ('rust', 'rustc --version'),
-            ('go', 'go version'),
-            ('java', 'java -version')
-        ]:
-            stdout, stderr, code = self.terminal.execute_command(cmd)
-            tools[lang] = code == 0
-        
-        # Check build tools
-        for tool, cmd in [
-            ('make', 'make --version'),
-            ('cmake', 'cmake --version'),
-            ('cargo', 'cargo --version'),
-            ('npm', 'npm --version'),
-            ('pip', 'pip3 --version')
-        ]:
-            stdout, stderr, code = self.terminal.execute_command(cmd)
-            tools[tool] = code == 0
-        
-        # Check system tools
-        for tool, cmd in [
-            ('git', 'git --version'),
-            ('docker', 'docker --version'),
-            ('vim', 'vim --version'),
-            ('nano', 'nano --version')
-        ]:
-            stdout, stderr, code = self.terminal.execute_command(cmd)
-            tools[tool] = code == 0
-        
-        return tools
+        if self.lazy_tools:
+            # Probe each tool the first time it is looked up
+            return LazyTools(TOOL_PROBES, self.tool_cache)
+        return detect_tools(TOOL_PROBES, self.tool_cache)
     
     def install_package(self, package: str) -> Tuple[bool, str]:
-        """Install a package using pacman"""
-        stdout, stderr, code = self.terminal.execute_command(f"sudo pacman -S --noconfirm {package}")
-        return code == 0, stdout + stderr
+        """Install a package using pacman, unless it is already installed"""
+        status, = self.packages.install([package])
+        return status.ok, format_statuses([status])
+    
+    def install_packages(self, packages: Iterable[str]) -> List[PackageStatus]:
+        """Install several packages in one pacman transaction"""
+        return self.packages.install(packages)
     
-    def create_project_structure(self, project_name: str, structure: dict) -> Tuple[bool, str]:
-        """Create a project directory structure"""
+    def create_project_structure(self, project_name: str, structure: dict,
+                                 variables: Optional[Mapping[str, str]] = None) -> Tuple[bool, str]:
+        """Create a project directory structure, all at once or not at all.
+        
+        structure may nest dicts for subdirectories; Template contents are
+        filled from variables (project_name is always available).
+        """
         try:
-            # Create main directory
-            self.terminal.execute_command(f"mkdir -p {project_name}")
-            self.terminal.execute_command(f"cd {project_name}")
-            
-            # Create files and subdirectories
-            for item, content in structure.items():
-                if item.endswith('/'):
-                    # It's a directory
-                    self.terminal.execute_command(f"mkdir -p {project_name}/{item}")
-                else:
-                    # It's a file
-                    success, message = self.terminal.write_file(f"{project_name}/{item}", content)
-                    if not success:
-                        return False, message
-            
-            return True, f"Project structure created for {project_name}"
+            root = os.path.join(self.terminal.get_current_directory(), project_name)
+            result = materialize(root, structure, {'project_name': project_name, **(variables or {})})
+            return True, (f"Project structure created for {project_name} "
+                          f"({result.written} files written, {result.unchanged} unchanged)")
         except Exception as e:
-            return False, f"Error creating project structure: {str(e)}"
\ No newline at end of file
+            return False, f"Error creating project structure: {str(e)}"
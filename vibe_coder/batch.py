@@ -0,0 +1,159 @@
+import json
+import os
+import shlex
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import tracing
+
+# Set in each worker process by _init_worker
+_coder: Any = None
+_workdir: Optional[str] = None
+
+
+def request_text(record: Dict[str, Any]) -> str:
+    """The prompt of a JSONL record: 'request'/'prompt', or title plus body"""
+    for key in ('request', 'prompt'):
+        if record.get(key):
+            return record[key]
+    return '\n\n'.join(part for part in (record.get('title'), record.get('body')) if part)
+
+
+def read_requests(path: str, start_offset: int = 0, skip: Set[int] = frozenset()) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Stream (offset, record) pairs; the offset is the 0-based line number"""
+    with open(path, 'r') as f:
+        for offset, line in enumerate(f):
+            if offset < start_offset or offset in skip or not line.strip():
+                continue
+            yield offset, json.loads(line)
+
+
+def completed_offsets(output_path: str) -> Set[int]:
+    """Offsets already recorded in an output file, for resuming"""
+    done = set()
+    try:
+        with open(output_path, 'r') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['offset'])
+                except (ValueError, KeyError):
+                    # A line cut short by a crash; that request runs again
+                    continue
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def default_coder_factory(model_name: str, cache_path: Optional[str] = None,
+                          verify_cache_path: Optional[str] = None, models: Optional[List[str]] = None,
+                          **options: Any):
+    """A coder in a worker process.
+
+    Caches and routers cannot be pickled, so the caches' paths and the
+    model tiers are passed instead and built here, once per worker.
+    """
+    from .core import VirtualVibeCoder
+    from .llm_cache import ResponseCache
+    from .router import ModelRouter
+    from .verify import VerifyCache
+    cache = ResponseCache(db_path=cache_path) if cache_path else None
+    verify_cache = VerifyCache(verify_cache_path) if verify_cache_path else None
+    router = ModelRouter(models) if models else None
+    return VirtualVibeCoder(model_name=router.models[0] if router else model_name, cache=cache,
+                            verify_cache=verify_cache, router=router, **options)
+
+
+def _init_worker(factory: Callable[..., Any], model_name: str, options: Dict[str, Any], base_dir: str,
+                 tracing_enabled: bool, trace_path: Optional[str]):
+    global _coder, _workdir
+    # Spans go to the shared trace file; histograms go back to the parent
+    # with each result, so workers never overwrite each other's metrics file
+    tracing.configure(trace_path=trace_path, enabled=tracing_enabled)
+    _workdir = os.path.join(base_dir, f"worker-{os.getpid()}")
+    os.makedirs(_workdir, exist_ok=True)
+    os.chdir(_workdir)
+    _coder = factory(model_name, **options)
+
+
+def _process(offset: int, record: Dict[str, Any], submitted_at: float) -> Tuple[Dict[str, Any], Dict]:
+    started_at = time.time()
+    # Each request starts from a clean directory and no history
+    workdir = os.path.join(_workdir, f"request-{offset:06d}")
+    os.makedirs(workdir, exist_ok=True)
+    _coder.environment.terminal.execute_command(f"cd {shlex.quote(workdir)}")
+    _coder.conversation_history.clear()
+
+    result: Dict[str, Any] = {'offset': offset, 'request_id': record.get('request_id')}
+    start = time.perf_counter()
+    try:
+        response = _coder.process_request(request_text(record))
+        result['response'] = response
+        # process_request reports failures in its return value
+        result['error'] = response if response.startswith("Error processing request:") else None
+    except Exception as e:
+        result['response'] = None
+        result['error'] = str(e)
+    result.update({
+        'workdir': workdir,
+        'worker_pid': os.getpid(),
+        'queued_seconds': round(started_at - submitted_at, 6),
+        'duration_seconds': round(time.perf_counter() - start, 6),
+        'started_at': started_at,
+        'finished_at': time.time(),
+    })
+    return result, tracing.get_tracer().drain()
+
+
+def run_batch(input_path: str, output_path: str, model_name: str = "deepseek-r1:8b",
+              workers: int = 2, base_dir: Optional[str] = None, start_offset: int = 0,
+              resume: bool = True, factory: Callable[..., Any] = default_coder_factory,
+              on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+              coder_options: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """Process a JSONL file of requests on a pool of isolated coder processes.
+
+    Results are appended to output_path as each request finishes. With
+    resume, offsets already present in output_path are not run again, so
+    an interrupted sweep continues where it stopped; they are counted as
+    'resumed' rather than processed or failed. coder_options are
+    passed to the factory as keyword arguments. When tracing is
+    configured, the workers' histograms are merged into this process's
+    tracer, which writes the metrics file.
+    """
+    base_dir = os.path.abspath(base_dir or os.path.join(os.getcwd(), 'batch-work'))
+    skip = completed_offsets(output_path) if resume else set()
+    requests = read_requests(input_path, start_offset, skip)
+    counts = {'processed': 0, 'failed': 0, 'resumed': sum(1 for offset in skip if offset >= start_offset)}
+    tracer = tracing.get_tracer()
+
+    with open(output_path, 'a') as out, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(factory, model_name, coder_options or {}, base_dir,
+                      tracer.enabled, tracer.trace_path)) as pool:
+        running = set()
+        exhausted = False
+        while running or not exhausted:
+            # Keep a bounded number of requests in flight
+            while not exhausted and len(running) < workers * 2:
+                try:
+                    offset, record = next(requests)
+                except StopIteration:
+                    exhausted = True
+                    break
+                running.add(pool.submit(_process, offset, record, time.time()))
+            if not running:
+                break
+
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, histograms = future.result()
+                out.write(json.dumps(result) + '\n')
+                out.flush()
+                tracer.merge(histograms)
+                tracer.flush()
+                counts['processed'] += 1
+                if result['error'] is not None:
+                    counts['failed'] += 1
+                if on_result is not None:
+                    on_result(result)
+    return counts
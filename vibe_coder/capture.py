@@ -0,0 +1,123 @@
+import os
+import tempfile
+from typing import IO, NamedTuple, Optional, Tuple
+
+# Bytes of each stream kept in memory: the start and the most recent output
+DEFAULT_HEAD_BYTES = 16 * 1024
+DEFAULT_TAIL_BYTES = 48 * 1024
+
+
+def default_spill_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), 'vibe_coder-output')
+
+
+class OutputCapture:
+    """Bounded capture of one output stream.
+
+    The first head_bytes and the last tail_bytes are kept in memory. Once
+    a stream outgrows both, everything it has printed (including what was
+    already kept) is written to a spill file, so the full output stays
+    available on disk while memory stays constant.
+    """
+
+    def __init__(self, head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 spill_dir: Optional[str] = None, prefix: str = 'output-'):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill_dir = spill_dir
+        self.prefix = prefix
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.bytes = 0
+        self.newlines = 0
+        self.last_byte = b''
+        self.path: Optional[str] = None
+        self._spill: Optional[IO[bytes]] = None
+
+    def feed(self, data: bytes):
+        if not data:
+            return
+        self.bytes += len(data)
+        self.newlines += data.count(b'\n')
+        self.last_byte = data[-1:]
+
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            rest = data[room:]
+        else:
+            rest = data
+        if self._spill is not None:
+            self._spill.write(data)
+        self.tail += rest
+        if len(self.tail) > self.tail_bytes:
+            if self._spill is None:
+                # First byte about to be dropped: everything so far is still in memory
+                self._open_spill()
+                self._spill.write(self.head)
+                self._spill.write(self.tail)
+            del self.tail[:len(self.tail) - self.tail_bytes]
+
+    def _open_spill(self):
+        directory = self.spill_dir or default_spill_dir()
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=self.prefix, suffix='.log', dir=directory)
+        self._spill = os.fdopen(fd, 'wb')
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    @property
+    def lines(self) -> int:
+        """Line count, including an unterminated last line"""
+        return self.newlines + (1 if self.last_byte and self.last_byte != b'\n' else 0)
+
+    @property
+    def truncated(self) -> bool:
+        return self.bytes > len(self.head) + len(self.tail)
+
+    def text(self) -> str:
+        """The captured output, with a note where the middle was left out"""
+        if not self.truncated:
+            return (self.head + self.tail).decode('utf-8', errors='ignore')
+        head, tail = bytes(self.head), bytes(self.tail)
+        # Cut at line boundaries when there is one to cut at
+        if b'\n' in head:
+            head = head[:head.rindex(b'\n') + 1]
+        if b'\n' in tail[:-1]:
+            tail = tail[tail.index(b'\n') + 1:]
+        omitted = self.bytes - len(head) - len(tail)
+        where = f"; full output in {self.path}" if self.path else ""
+        note = f"[... {omitted} bytes omitted of {self.bytes} bytes, {self.lines} lines{where} ...]\n"
+        return head.decode('utf-8', errors='ignore') + note + tail.decode('utf-8', errors='ignore')
+
+
+class CommandResult(NamedTuple):
+    stdout: str
+    stderr: str
+    returncode: int
+    stdout_bytes: int = 0
+    stdout_lines: int = 0
+    stderr_bytes: int = 0
+    stderr_lines: int = 0
+    # Spill files holding the complete streams, when they did not fit in memory
+    stdout_path: Optional[str] = None
+    stderr_path: Optional[str] = None
+
+    @classmethod
+    def from_captures(cls, stdout: OutputCapture, stderr: OutputCapture, returncode: int) -> 'CommandResult':
+        stdout.close()
+        stderr.close()
+        return cls(stdout.text(), stderr.text(), returncode,
+                   stdout.bytes, stdout.lines, stderr.bytes, stderr.lines,
+                   stdout.path, stderr.path)
+
+    @classmethod
+    def failure(cls, message: str, returncode: int = -1) -> 'CommandResult':
+        """A command that did not run, or whose output is replaced by an error"""
+        return cls("", message, returncode, stderr_bytes=len(message.encode('utf-8')), stderr_lines=1)
+
+    def output(self) -> Tuple[str, str, int]:
+        return self.stdout, self.stderr, self.returncode
@@ -0,0 +1,104 @@
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+Message = Dict[str, str]
+
+# Entries kept per memo table before it is reset
+MEMO_LIMIT = 4096
+
+
+def approximate_tokens(text: str) -> int:
+    """Fast token estimate: about four characters per token for code and English"""
+    return (len(text) + 3) // 4
+
+
+class ContextBuilder:
+    """Fit conversation history into a token budget, newest messages first.
+
+    Oversized messages (usually an assistant turn carrying a long execution
+    log) are cut down to their head and tail. Token counts, truncated
+    contents and serialized messages are memoized, so each turn only pays
+    for messages that are new.
+
+    The first kept message only moves when the budget overflows, and then
+    far enough to leave refill_ratio of the budget free, so consecutive
+    prompts share a byte-identical prefix the server can reuse.
+    """
+
+    def __init__(self, budget_tokens: int = 8192, tokenizer: Optional[Callable[[str], int]] = None,
+                 max_message_tokens: int = 1024, refill_ratio: float = 0.75):
+        self.budget_tokens = budget_tokens
+        self.count_tokens = tokenizer or approximate_tokens
+        self.max_message_tokens = max_message_tokens
+        self.refill_ratio = refill_ratio
+        # Index of the first history message in the window
+        self._first = 0
+        self._tokens: Dict[str, int] = {}
+        self._fitted: Dict[str, str] = {}
+        self._fragments: Dict[Tuple[str, str], str] = {}
+
+    def _memo(self, table: Dict, key, compute):
+        value = table.get(key)
+        if value is None:
+            if len(table) >= MEMO_LIMIT:
+                table.clear()
+            value = table[key] = compute(key)
+        return value
+
+    def tokens(self, text: str) -> int:
+        return self._memo(self._tokens, text, self.count_tokens)
+
+    def fit_content(self, content: str) -> str:
+        """Truncate a message body to max_message_tokens, keeping head and tail"""
+        return self._memo(self._fitted, content, self._truncate)
+
+    def _truncate(self, content: str) -> str:
+        total = self.tokens(content)
+        if total <= self.max_message_tokens:
+            return content
+        # Scale the character budget by this text's own chars-per-token ratio
+        keep = len(content) * self.max_message_tokens // total
+        head, tail = content[:keep // 2], content[len(content) - keep // 2:]
+        omitted = content[len(head):len(content) - len(tail)]
+        return f"{head}\n[... {omitted.count(chr(10)) + 1} lines ({total - self.max_message_tokens} tokens) of output truncated ...]\n{tail}"
+
+    def build(self, system_prompt: str, history: List[Message], user_input: str) -> List[Message]:
+        """Assemble system prompt, as much recent history as fits, and the new input"""
+        system = {"role": "system", "content": system_prompt}
+        user = {"role": "user", "content": user_input}
+        remaining = self.budget_tokens - self.tokens(system_prompt) - self.tokens(user_input)
+
+        if self._first > len(history):
+            # History was cleared or replaced
+            self._first = 0
+        kept = self._fill(history[self._first:], remaining)
+        if len(kept) < len(history) - self._first:
+            # Overflow: re-anchor the window, leaving room for the next turns
+            kept = self._fill(history, int(remaining * self.refill_ratio))
+            self._first = len(history) - len(kept)
+
+        # Do not open the history with a reply whose question was dropped
+        if kept and kept[0]["role"] == "assistant":
+            kept = kept[1:]
+        return [system] + kept + [user]
+
+    def _fill(self, history: List[Message], remaining: int) -> List[Message]:
+        kept: List[Message] = []
+        for message in reversed(history):
+            content = self.fit_content(message["content"])
+            cost = self.tokens(content)
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept.append({"role": message["role"], "content": content})
+        kept.reverse()
+        return kept
+
+    def serialize(self, messages: List[Message]) -> str:
+        """Same output as json.dumps(messages), reusing fragments from earlier turns"""
+        fragments = [
+            self._memo(self._fragments, (message["role"], message["content"]),
+                       lambda key: json.dumps({"role": key[0], "content": key[1]}))
+            for message in messages
+        ]
+        return '[' + ', '.join(fragments) + ']'
@@ -1,112 +1,699 @@
-from langchain_community.llms import Ollama
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.prompts import ChatPromptTemplate
+import contextlib
+import os
+import re
+import threading
+import time
 from .arch_linux import ArchLinuxEnvironment
+from .capture import CommandResult
+from .context import ContextBuilder
+from .fair_queue import FairGate
+from .json_plan import PLAN_INSTRUCTIONS, PLAN_SCHEMA, PlanFormatError, parse_json_plan, render_plan
+from .llm_cache import ResponseCache, cache_key, is_deterministic
+from .ollama_chat import KeepAlive, OllamaChatBackend, warm_up as start_warm_up
+from .packages import InstallBatch, format_statuses, install_targets
+from .plan_parser import BLOCK, COMMAND, PlanStreamParser, Step, parse_plan
 from .prompts import VIBE_CODER_SYSTEM_PROMPT
-import json
-from typing import Dict, Any, List
+from .router import FAILED, NO_BLOCKS, ModelRouter
+from .scheduler import PlanStep, build_dag, run_dag
+from .sessions import SessionStore, new_session_id
+from .snapshot import Snapshot
+from . import streaming, tracing
+from .streaming import StreamEvent
+from .verify import TreeState, Verifier, VerifyCache, changed_files, format_results
+from .workspace import WorkspaceIndex, worth_indexing
+from typing import Callable, Dict, Any, Generator, Iterator, List, NamedTuple, Optional, Tuple
+
+
+# Script suffix and interpreter for each fence language that can be run
+INTERPRETERS = {
+    'python': ('.py', 'python3'),
+    'javascript': ('.js', 'node'),
+    'bash': ('.sh', 'bash'),
+}
+
+# What the next model tier is told about the answer that fell short
+ESCALATION_PROMPTS = {
+    NO_BLOCKS: "That answer has no commands or code blocks to run. Give the concrete commands and code.",
+    FAILED: "Some of those steps failed; their results are above. Give a corrected plan.",
+}
+
+EXIT_CODE = re.compile(r'(?:Result: )?Exit code: (-?\d+)')
+
+
+def runnable(kind: str, language: str) -> bool:
+    """Commands, untagged fences and fences in a language with an interpreter run;
+    json, yaml, diff and the like are examples for the reader"""
+    return kind == COMMAND or language == '' or language in INTERPRETERS
+
+
+def skipped_note(language: str) -> str:
+    return f"Skipped {language} block: not a language that can be run"
+
+
+def step_failed(entries: List[str]) -> bool:
+    """Whether a step's log entries (see _run_step) report a failure"""
+    match = EXIT_CODE.match(entries[-1]) if entries else None
+    return match is None or int(match.group(1)) != 0
+
+
+class PlanOutcome(NamedTuple):
+    response: str
+    log: str
+    steps: int
+    # A step or the verification of the plan failed
+    failed: bool
+
+
+def Ollama(**kwargs: Any):
+    """langchain's Ollama LLM, imported on first use: langchain dominates startup time"""
+    from langchain_community.llms import Ollama as LangchainOllama
+    return LangchainOllama(**kwargs)
+
 
 class VirtualVibeCoder:
-    def __init__(self, model_name: str = "deepseek-r1:8b"):
-        self.llm = Ollama(model=model_name)
-        self.environment = ArchLinuxEnvironment()
+    def __init__(self, model_name: str = "deepseek-r1:8b", lazy_tools: bool = False,
+                 max_parallel_steps: int = 4, cache: Optional[ResponseCache] = None,
+                 temperature: Optional[float] = None, seed: Optional[int] = None,
+                 context_budget: int = 8192, tokenizer: Optional[Callable[[str], int]] = None,
+                 backend: str = "completion", keep_alive: KeepAlive = None,
+                 ollama_host: Optional[str] = None, warm_up: bool = False,
+                 session_store: Optional[SessionStore] = None, session_id: Optional[str] = None,
+                 workspace_budget: int = 768, model_gate: Optional[FairGate] = None,
+                 workdir: Optional[str] = None, rollback_failed_plans: bool = False,
+                 verify_plans: bool = False, verify_cache: Optional[VerifyCache] = None,
+                 router: Optional[ModelRouter] = None, json_plans: bool = False,
+                 persistent_shell: bool = False):
+        self.model_name = model_name
+        # "chat" uses Ollama's chat endpoint so the KV cache is reused across turns
+        self.backend = backend
+        self.temperature = temperature
+        self.keep_alive = keep_alive
+        self.ollama_host = ollama_host
+        self.lazy_tools = lazy_tools
+        # The terminal starts here (default: the process cwd) and tracks cd itself
+        self.workdir = workdir
+        # Run commands in one long-lived bash, so exports and activated venvs persist
+        self.persistent_shell = persistent_shell
+        # Snapshot the current directory before each plan, and restore it if a step fails
+        self.rollback_failed_plans = rollback_failed_plans
+        # After each plan, run the tests and builds affected by the files it changed
+        self.verify_plans = verify_plans
+        self.verify_cache = verify_cache if verify_cache is not None else VerifyCache()
+        self._verifier: Optional[Verifier] = None
+        # The LLM client and the environment are built on first use (see preload)
+        self._llm = None
+        self._tier_llms: Dict[str, Any] = {}
+        # Tries each request on the cheapest of several models first, instead of model_name
+        self.router = router
+        # Ask for schema-constrained JSON plans instead of scraping markdown
+        self.json_plans = json_plans
+        self._environment = None
+        self._init_lock = threading.Lock()
+        self.seed = seed
+        # Responses are only reused when the model would repeat itself anyway
+        self.cache = cache if is_deterministic(temperature, seed) else None
+        self.context = ContextBuilder(context_budget, tokenizer)
+        # Independent plan steps run concurrently on up to this many workers
+        self.max_parallel_steps = max_parallel_steps
         self.conversation_history: List[Dict[str, str]] = []
+        # Tokens of snippets from the current directory added to each request (0 disables)
+        self.workspace_budget = workspace_budget
+        self._workspace: Optional[WorkspaceIndex] = None
+        # Turns and commands are appended to the store as they happen;
+        # passing an existing session_id resumes it
+        self.session_store = session_store
+        self.session_id = session_id or new_session_id()
+        self._session_open = False
+        if session_store is not None and session_id is not None:
+            self.resume(session_id)
+        # Shared with other coders when several sessions use one local model
+        self.model_gate = model_gate
+        self.warm_up_thread = None
+        if warm_up:
+            self.warm_up_thread = start_warm_up(model_name, VIBE_CODER_SYSTEM_PROMPT, ollama_host,
+                                                keep_alive or "30m")
+    
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._init_lock:
+                if self._llm is None:
+                    self._llm = self._create_llm()
+        return self._llm
+    
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+    
+    def _llm_for(self, model: str):
+        """The client for one of the router's models, built on first use"""
+        if model == self.model_name:
+            return self.llm
+        with self._init_lock:
+            if model not in self._tier_llms:
+                self._tier_llms[model] = self._create_llm(model)
+            return self._tier_llms[model]
+    
+    def _create_llm(self, model: Optional[str] = None):
+        model = model or self.model_name
+        if self.backend == "chat":
+            return OllamaChatBackend(model, host=self.ollama_host, keep_alive=self.keep_alive or "30m",
+                                     options={'temperature': self.temperature},
+                                     format=PLAN_SCHEMA if self.json_plans else None)
+        extra = {'base_url': self.ollama_host} if self.ollama_host else {}
+        if self.json_plans:
+            # The completion endpoint only constrains to JSON; the schema is in the prompt
+            extra['format'] = 'json'
+        return Ollama(model=model, temperature=self.temperature, keep_alive=self.keep_alive, **extra)
+    
+    @property
+    def environment(self) -> ArchLinuxEnvironment:
+        if self._environment is None:
+            with self._init_lock:
+                if self._environment is None:
+                    self._environment = ArchLinuxEnvironment(lazy_tools=self.lazy_tools, cwd=self.workdir,
+                                                             persistent_shell=self.persistent_shell)
+                    self._attach_terminal(self._environment)
+        return self._environment
+    
+    @environment.setter
+    def environment(self, environment: ArchLinuxEnvironment):
+        self._environment = environment
+        self._attach_terminal(environment)
+    
+    def _attach_terminal(self, environment: ArchLinuxEnvironment):
+        if self.session_store is not None:
+            environment.terminal.on_command = self._record_command
+    
+    def _open_session(self) -> str:
+        if not self._session_open:
+            self.session_store.open_session(self.session_id, self.model_name, self.workdir or os.getcwd())
+            self._session_open = True
+        return self.session_id
+    
+    def _record_turn(self, role: str, content: str, request: Optional[str] = None,
+                     duration: Optional[float] = None):
+        if self.session_store is not None:
+            self.session_store.append_turn(self._open_session(), role, content, request, duration)
+    
+    def _record_command(self, command: str, result: CommandResult, seconds: float):
+        self.session_store.append_command(self._open_session(), command, result.returncode, seconds,
+                                          self.environment.terminal.current_dir,
+                                          result.stdout_bytes, result.stderr_bytes)
+    
+    def resume(self, session_id: str) -> int:
+        """Continue a stored session, loading as much of its tail as the context holds"""
+        if not self.session_store.has_session(session_id):
+            raise KeyError(f"Unknown session {session_id}")
+        count = lambda text: self.context.tokens(self.context.fit_content(text))
+        self.conversation_history = self.session_store.tail(session_id, self.context.budget_tokens, count)
+        self.session_id = session_id
+        self._session_open = True
+        return len(self.conversation_history)
+    
+    def new_session(self) -> str:
+        """Start over with an empty history; earlier sessions stay in the store"""
+        self.conversation_history = []
+        self.session_id = new_session_id()
+        self._session_open = False
+        return self.session_id
+    
+    def close(self):
+        """Shut down this coder's terminal (shell, Python workers, spill files)"""
+        if self._environment is not None:
+            self._environment.terminal.close()
+    
+    def preload(self) -> threading.Thread:
+        """Build the LLM client and probe the environment in the background.
+        
+        The REPL calls this right after showing its prompt, so the work
+        overlaps with the user typing. Errors are left for the first real
+        use to report.
+        """
+        def run():
+            try:
+                self.llm
+                dict(self.environment.available_tools.items())
+                self.environment.terminal.python_pool
+                index = self.workspace_index()
+                if index is not None:
+                    index.refresh()
+            except Exception:
+                pass
+        
+        thread = threading.Thread(target=run, name="vibe-coder-preload", daemon=True)
+        thread.start()
+        return thread
         
+    def workspace_index(self) -> Optional[WorkspaceIndex]:
+        """The index of the terminal's current directory, rebuilt when it changes.
+        
+        None when snippets are disabled or the directory is / or the home
+        directory, which are too big to be worth indexing.
+        """
+        root = os.path.abspath(self.environment.terminal.get_current_directory())
+        if self.workspace_budget <= 0 or not worth_indexing(root):
+            return None
+        with self._init_lock:
+            if self._workspace is None or self._workspace.root != root:
+                self._workspace = WorkspaceIndex(root)
+            return self._workspace
+    
+    @tracing.traced('workspace_context')
+    def _workspace_context(self, user_input: str) -> str:
+        # Never waits for the index: it is built in the background
+        index = self.workspace_index()
+        if index is None:
+            return ''
+        return index.context(user_input, self.workspace_budget, count_tokens=self.context.tokens)
+    
+    @tracing.traced('format_messages')
     def _format_messages(self, user_input: str) -> List[Dict[str, str]]:
         """Format messages for the LLM"""
-        messages = [
-            {"role": "system", "content": VIBE_CODER_SYSTEM_PROMPT},
-        ]
+        # Add as much conversation history as fits the context budget
+        return self.context.build(VIBE_CODER_SYSTEM_PROMPT, self.conversation_history, user_input)
+    
+    def _build_messages(self, user_input: str) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+        """Build the messages for a user request, and the user turn to keep in the history.
+        
+        File snippets are only sent with the request they were found for:
+        the kept turn leaves them out, so stale file contents are neither
+        re-sent with later requests nor stored with the session.
+        """
+        # Get system context
+        tools_info = f"Available tools: {', '.join([k for k, v in self.environment.available_tools.items() if v])}"
+        current_dir = self.environment.terminal.get_current_directory()
+        context = f"Current directory: {current_dir}\n{tools_info}\n\nUser request: {user_input}"
+        
+        if self.json_plans:
+            full_input = f"{context}\n\n{PLAN_INSTRUCTIONS}"
+        else:
+            full_input = f"{context}\n\nPlease provide a step-by-step approach to solve this using vibe coding principles. Include specific commands to execute and reasoning for each step."
+        turn = {"role": "user", "content": full_input}
+        
+        # After the request, so the next prompt shares its prefix up to here
+        snippets = self._workspace_context(user_input)
+        if snippets:
+            full_input += f"\n\n{snippets}"
         
-        # Add conversation history
-        for msg in self.conversation_history[-6:]:  # Keep last 6 exchanges
-            messages.append(msg)
+        return self._format_messages(full_input), turn
+    
+    def _llm_options(self) -> Dict[str, Any]:
+        return {'seed': self.seed} if self.seed is not None else {}
+    
+    def _llm_payload(self, messages: List[Dict[str, str]], prompt: str) -> Any:
+        # The chat backend takes the messages themselves, the completion one a JSON prompt
+        return messages if self.backend == "chat" else prompt
+    
+    def _model_slot(self):
+        """Wait for this session's turn on the shared model; cache hits never wait"""
+        if self.model_gate is None:
+            return contextlib.nullcontext()
+        return self.model_gate.slot(self.session_id)
+    
+    def _cache_key(self, model: str, prompt: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return cache_key(model, VIBE_CODER_SYSTEM_PROMPT, prompt, self.temperature, self.seed, self.backend)
+    
+    def _invoke_llm(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> str:
+        """Get a complete response, from the cache when possible"""
+        model = model or self.model_name
+        with tracing.span('llm', model=model, backend=self.backend) as span:
+            prompt = self.context.serialize(messages)
+            key = self._cache_key(model, prompt)
+            if key is not None:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    span.set(cache='hit')
+                    return cached
             
-        messages.append({"role": "user", "content": user_input})
-        return messages
+            with self._model_slot():
+                response = self._llm_for(model).invoke(self._llm_payload(messages, prompt), **self._llm_options())
+            if key is not None:
+                self.cache.put(key, response)
+            return response
+    
+    def _stream_llm(self, messages: List[Dict[str, str]], model: Optional[str] = None) -> Iterator[str]:
+        """Stream response tokens; a cached response arrives as one token"""
+        model = model or self.model_name
+        prompt = self.context.serialize(messages)
+        key = self._cache_key(model, prompt)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        
+        tokens = []
+        with self._model_slot():
+            for token in self._llm_for(model).stream(self._llm_payload(messages, prompt), **self._llm_options()):
+                tokens.append(token)
+                yield token
+        if key is not None:
+            self.cache.put(key, ''.join(tokens))
     
     def process_request(self, user_input: str) -> str:
         """Process a user request using vibe coding principles"""
         try:
-            # Get system context
-            tools_info = f"Available tools: {', '.join([k for k, v in self.environment.available_tools.items() if v])}"
-            current_dir = self.environment.terminal.get_current_directory()
-            context = f"Current directory: {current_dir}\n{tools_info}\n\nUser request: {user_input}"
-            
-            full_input = f"{context}\n\nPlease provide a step-by-step approach to solve this using vibe coding principles. Include specific commands to execute and reasoning for each step."
-            
-            messages = self._format_messages(full_input)
-            
-            # Get LLM response
-            response = self.llm.invoke(json.dumps(messages))
+            with tracing.span('process_request'):
+                return self._process_request(user_input)
+        finally:
+            tracing.get_tracer().flush()
+    
+    def _process_request(self, user_input: str) -> str:
+        try:
+            messages, turn = self._build_messages(user_input)
+            started = time.monotonic()
+            self._record_turn("user", turn["content"], user_input)
             
-            # Parse and execute the plan
-            result = self._execute_plan(response, user_input)
+            # Get LLM responses and execute their plans, up the model tiers if need be
+            logs = []
+            tier = self.router.first_tier(user_input) if self.router is not None else 0
+            while True:
+                generation_start = time.monotonic()
+                response = self._invoke_llm(messages, self._tier_model(tier))
+                if self.router is not None:
+                    self.router.observe(tier, time.monotonic() - generation_start)
+                outcome = self._run_plan(response, user_input)
+                if outcome.log:
+                    logs.append(outcome.log)
+                reason = self._escalation(tier, outcome)
+                if reason is None:
+                    break
+                tier += 1
+                logs.append(f"Escalating to {self.router.models[tier]} ({reason})")
+                messages = self._escalated(messages, outcome, reason)
+            result = '\n'.join(logs)
             
             # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_input})
+            # Record the turn as sent, less file snippets, so the next prompt shares its prefix
+            self.conversation_history.append(turn)
             self.conversation_history.append({"role": "assistant", "content": response + "\n\n" + result})
+            self._record_turn("assistant", response + "\n\n" + result, duration=time.monotonic() - started)
             
-            return f"## Vibe Coder Response\n\n{response}\n\n## Execution Results\n\n{result}"
+            return f"## Vibe Coder Response\n\n{self._display(response)}\n\n## Execution Results\n\n{result}"
             
         except Exception as e:
             return f"Error processing request: {str(e)}"
     
+    def stream_request(self, user_input: str) -> Iterator[StreamEvent]:
+        """Process a request while the model is still generating.
+        
+        Yields token events as they arrive, and executes each code block or
+        command as soon as its closing line has been streamed, yielding a
+        block_ready event before and a block_result event after it runs.
+        An escalate event announces that the next model tier takes over.
+        The final event is either done (full formatted response) or error.
+        """
+        try:
+            messages, turn = self._build_messages(user_input)
+            started = time.monotonic()
+            self._record_turn("user", turn["content"], user_input)
+        except Exception as e:
+            yield StreamEvent(streaming.ERROR, f"Error processing request: {str(e)}")
+            return
+        
+        logs = []
+        tier = self.router.first_tier(user_input) if self.router is not None else 0
+        while True:
+            outcome = yield from self._stream_plan(messages, tier)
+            if outcome is None:
+                return
+            if outcome.log:
+                logs.append(outcome.log)
+            reason = self._escalation(tier, outcome)
+            if reason is None:
+                break
+            tier += 1
+            note = f"Escalating to {self.router.models[tier]} ({reason})"
+            logs.append(note)
+            yield StreamEvent(streaming.ESCALATE, note)
+            messages = self._escalated(messages, outcome, reason)
+        
+        response = outcome.response
+        result = '\n'.join(logs)
+        self.conversation_history.append(turn)
+        self.conversation_history.append({"role": "assistant", "content": response + "\n\n" + result})
+        self._record_turn("assistant", response + "\n\n" + result, duration=time.monotonic() - started)
+        
+        yield StreamEvent(streaming.DONE, f"## Vibe Coder Response\n\n{self._display(response)}\n\n## Execution Results\n\n{result}")
+    
+    def _stream_plan(self, messages: List[Dict[str, str]], tier: int) -> Generator[StreamEvent, None, Optional["PlanOutcome"]]:
+        """Stream one tier's response, running its steps as they complete; None after an error"""
+        if self.json_plans:
+            return (yield from self._stream_json_plan(messages, tier))
+        parser = PlanStreamParser()
+        tokens: List[str] = []
+        execution_log: List[str] = []
+        cwd = self.environment.terminal.get_current_directory()
+        plan_started = failed = False
+        steps = 0
+        executing = 0.0
+        snapshot: Optional[Snapshot] = None
+        verifier: Optional[Verifier] = None
+        before: TreeState = {}
+        start = time.monotonic()
+        
+        def run(ready: List[Step]):
+            nonlocal plan_started, failed, steps, executing, snapshot, verifier, before
+            for step in ready:
+                if not runnable(step.kind, step.language):
+                    execution_log.append(skipped_note(step.language))
+                    yield StreamEvent(streaming.BLOCK_RESULT, execution_log[-1], step.kind)
+                    continue
+                if not plan_started:
+                    # Once the first step is known, so plain answers cost nothing
+                    plan_started = True
+                    snapshot = self._take_snapshot(cwd)
+                    verifier, before = self._plan_state(cwd)
+                yield StreamEvent(streaming.BLOCK_READY, step.content, step.kind)
+                step_start = time.monotonic()
+                entries = self._run_step(step.kind, step.content, step.language)
+                executing += time.monotonic() - step_start
+                steps += 1
+                failed = failed or step_failed(entries)
+                execution_log.extend(entries)
+                yield StreamEvent(streaming.BLOCK_RESULT, '\n'.join(entries), step.kind)
+        
+        try:
+            for token in streaming.pump_stream(self._stream_llm(messages, self._tier_model(tier))):
+                if isinstance(token, Exception):
+                    failed = True
+                    yield StreamEvent(streaming.ERROR, f"Error processing request: {str(token)}")
+                    return None
+                tokens.append(token)
+                yield StreamEvent(streaming.TOKEN, token)
+                yield from run(parser.feed(token))
+            yield from run(parser.close())
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            note = self._settle_snapshot(snapshot, failed)
+        if self.router is not None:
+            # Generation only: steps ran while the model was still streaming
+            self.router.observe(tier, time.monotonic() - start - executing)
+        if note:
+            execution_log.append(note)
+        elif verifier is not None:
+            entries, ok = self._verify(verifier, before)
+            failed = failed or not ok
+            if entries:
+                execution_log.extend(entries)
+                yield StreamEvent(streaming.BLOCK_RESULT, '\n'.join(entries), 'verify')
+        return PlanOutcome(''.join(tokens), '\n'.join(execution_log), steps, failed)
+    
+    def _stream_json_plan(self, messages: List[Dict[str, str]], tier: int) -> Generator[StreamEvent, None, Optional["PlanOutcome"]]:
+        """Stream a JSON plan and run it once complete: a partial object has no steps to start"""
+        tokens: List[str] = []
+        start = time.monotonic()
+        for token in streaming.pump_stream(self._stream_llm(messages, self._tier_model(tier))):
+            if isinstance(token, Exception):
+                yield StreamEvent(streaming.ERROR, f"Error processing request: {str(token)}")
+                return None
+            tokens.append(token)
+            yield StreamEvent(streaming.TOKEN, token)
+        if self.router is not None:
+            self.router.observe(tier, time.monotonic() - start)
+        outcome = self._run_plan(''.join(tokens), '')
+        if outcome.log:
+            yield StreamEvent(streaming.BLOCK_RESULT, outcome.log, 'plan')
+        return outcome
+    
+    def _display(self, response: str) -> str:
+        """A response as shown to the user: JSON plans are rendered as markdown"""
+        if not self.json_plans:
+            return response
+        try:
+            return render_plan(*parse_json_plan(response))
+        except PlanFormatError:
+            return response
+    
+    def _tier_model(self, tier: int) -> str:
+        return self.router.models[tier] if self.router is not None else self.model_name
+    
+    def _escalation(self, tier: int, outcome: "PlanOutcome") -> Optional[str]:
+        if self.router is None:
+            return None
+        return self.router.escalation(tier, outcome.steps, outcome.failed)
+    
+    def _escalated(self, messages: List[Dict[str, str]], outcome: "PlanOutcome",
+                   reason: str) -> List[Dict[str, str]]:
+        """Messages for the next tier: the request, the answer that fell short, and why"""
+        return messages + [
+            {"role": "assistant", "content": outcome.response + "\n\n" + outcome.log},
+            {"role": "user", "content": ESCALATION_PROMPTS[reason]},
+        ]
+    
+    @tracing.traced('execute_plan')
     def _execute_plan(self, plan: str, original_request: str) -> str:
         """Execute the plan generated by the LLM"""
-        execution_log = []
-        
+        return self._run_plan(plan, original_request).log
+    
+    def _run_plan(self, plan: str, original_request: str) -> "PlanOutcome":
         # Parse the plan for executable commands
-        lines = plan.split('\n')
-        current_section = None
+        cwd = self.environment.terminal.get_current_directory()
+        steps, execution_log = self._plan_steps(plan)
         
-        for line in lines:
-            line = line.strip()
-            
-            if line.startswith('```') and current_section is None:
-                current_section = ""
-            elif line.startswith('```') and current_section is not None:
-                # End of code block - execute it
-                if current_section.strip():
-                    execution_log.append(f"Executing code block:\n{current_section}")
-                    result = self._execute_code_block(current_section)
-                    execution_log.append(f"Result: {result}")
-                current_section = None
-            elif current_section is not None:
-                current_section += line + '\n'
-            elif line.startswith('sudo ') or line.startswith('pacman ') or line.startswith('git '):
-                # Execute individual commands
-                execution_log.append(f"Executing command: {line}")
-                stdout, stderr, code = self.environment.terminal.execute_command(line)
-                execution_log.append(f"Exit code: {code}\nStdout: {stdout}\nStderr: {stderr}")
-        
-        return '\n'.join(execution_log)
-    
-    def _execute_code_block(self, code: str) -> str:
-        """Execute a code block by writing to a file and running it"""
-        # Determine file type and interpreter
+        # Every package the plan installs goes into one pacman transaction
+        targets = [install_targets(step.content) if step.kind == COMMAND else None for step in steps]
+        batch = InstallBatch(self.environment.packages,
+                             [name for names in targets if names for name in names])
+        
+        # Run independent steps in parallel; the log keeps document order
+        build_dag(steps, lambda step: self._block_interpreter(step.content, step.language)[1] == 'bash', cwd)
+        snapshot = self._take_snapshot(cwd) if steps else None
+        verifier, before = self._plan_state(cwd) if steps else (None, {})
+        failed = True
+        try:
+            results = run_dag(steps, lambda step: self._run_step(step.kind, step.content, step.language,
+                                                                 batch, step.cwd),
+                              self.max_parallel_steps)
+            failed = any(step_failed(entries) for entries in results)
+        finally:
+            note = self._settle_snapshot(snapshot, failed)
+        for entries in results:
+            execution_log.extend(entries)
+        if note:
+            execution_log.append(note)
+        elif verifier is not None:
+            entries, ok = self._verify(verifier, before)
+            execution_log.extend(entries)
+            failed = failed or not ok
+        
+        return PlanOutcome(plan, '\n'.join(execution_log), len(steps), failed)
+    
+    def _plan_steps(self, plan: str) -> Tuple[List[PlanStep], List[str]]:
+        """The steps to run, and notes on the blocks that will not run"""
+        if self.json_plans:
+            try:
+                _, json_steps = parse_json_plan(plan)
+            except PlanFormatError:
+                # Run what can be scraped instead of asking the model again
+                pass
+            else:
+                positions = {step.id: i for i, step in enumerate(json_steps)}
+                steps = []
+                for i, step in enumerate(json_steps):
+                    kind = COMMAND if step.language == 'bash' else BLOCK
+                    cwd = self.environment.terminal.resolve_path(step.cwd) if step.cwd != '.' else None
+                    steps.append(PlanStep(i, kind, step.command, step.language, cwd))
+                    steps[-1].deps = {positions[dependency] for dependency in step.depends_on}
+                return steps, []
+        parsed = parse_plan(plan)
+        notes = [skipped_note(step.language) for step in parsed if not runnable(step.kind, step.language)]
+        steps = [step for step in parsed if runnable(step.kind, step.language)]
+        return [PlanStep(i, step.kind, step.content, step.language) for i, step in enumerate(steps)], notes
+    
+    def _take_snapshot(self, cwd: str) -> Optional[Snapshot]:
+        if not self.rollback_failed_plans:
+            return None
+        with tracing.span('snapshot'):
+            try:
+                # None when the directory is too big to snapshot
+                return Snapshot.take(cwd)
+            except OSError:
+                return None
+    
+    def verifier(self, root: str) -> Optional[Verifier]:
+        """The verifier for a directory, kept while plans run there; None unless verify_plans"""
+        root = os.path.abspath(root)
+        if not self.verify_plans or not worth_indexing(root):
+            return None
+        run = self.environment.terminal.capture_command
+        with self._init_lock:
+            if self._verifier is None or self._verifier.root != root:
+                self._verifier = Verifier(root, run, self.verify_cache)
+            return self._verifier
+    
+    def _plan_state(self, cwd: str) -> Tuple[Optional[Verifier], TreeState]:
+        verifier = self.verifier(cwd)
+        if verifier is None:
+            return None, {}
+        with tracing.span('plan_state'):
+            return verifier, verifier.state()
+    
+    @tracing.traced('verify')
+    def _verify(self, verifier: Verifier, before: TreeState) -> Tuple[List[str], bool]:
+        """Run the tests and builds affected by what the plan changed; True if all passed"""
+        after = verifier.state()
+        changed = changed_files(before, after)
+        if not changed:
+            return [], True
+        results = verifier.verify(changed, after)
+        return [format_results(changed, results)], all(result.ok for result in results)
+    
+    def _settle_snapshot(self, snapshot: Optional[Snapshot], failed: bool) -> Optional[str]:
+        """Roll back after a failed plan, or drop the snapshot after a good one"""
+        if snapshot is None:
+            return None
+        if not failed:
+            snapshot.discard()
+            return None
+        with tracing.span('rollback'):
+            return f"A step failed, so {snapshot.root} was rolled back: {snapshot.rollback().describe()}"
+    
+    def _run_step(self, kind: str, content: str, language: str = '',
+                  batch: Optional[InstallBatch] = None, cwd: Optional[str] = None) -> List[str]:
+        """Execute a single parsed step (in cwd, if given) and return its log entries"""
+        if kind == BLOCK:
+            result = self._execute_code_block(content, language, cwd)
+            return [f"Executing code block:\n{content}", f"Result: {result}"]
+        
+        packages = install_targets(content)
+        if packages is not None:
+            # Skips installed packages and shares the plan's transaction
+            statuses = batch.install(packages) if batch else self.environment.packages.install(packages)
+            code = 0 if all(status.ok for status in statuses) else 1
+            return [f"Executing command: {content}", f"Exit code: {code}\nPackages:\n{format_statuses(statuses)}"]
+        
+        # Execute individual commands
+        stdout, stderr, code = self.environment.terminal.execute_command(content, cwd=cwd)
+        return [f"Executing command: {content}", f"Exit code: {code}\nStdout: {stdout}\nStderr: {stderr}"]
+    
+    def _block_interpreter(self, code: str, language: str = '') -> Tuple[str, str]:
+        """Determine the script suffix and interpreter for a code block"""
+        if language in INTERPRETERS:
+            return INTERPRETERS[language]
+        # Untagged fence (see runnable): guess from the code
         if 'def ' in code or 'import ' in code:
             # Python code
-            filename = 'temp_script.py'
-            interpreter = 'python3'
+            return INTERPRETERS['python']
         elif 'function ' in code or 'const ' in code or 'let ' in code:
             # JavaScript code
-            filename = 'temp_script.js'
-            interpreter = 'node'
-        else:
-            # Assume shell script
-            filename = 'temp_script.sh'
-            interpreter = 'bash'
-        
-        # Write and execute
-        success, message = self.environment.terminal.write_file(filename, code)
-        if not success:
-            return f"Failed to write file: {message}"
-        
-        stdout, stderr, code = self.environment.terminal.execute_command(f"{interpreter} {filename}")
+            return INTERPRETERS['javascript']
+        # Assume shell script
+        return INTERPRETERS['bash']
+    
+    @tracing.traced('execute_code_block')
+    def _execute_code_block(self, code: str, language: str = '', cwd: Optional[str] = None) -> str:
+        """Execute a code block by writing to a file and running it"""
+        # Determine file type and interpreter
+        suffix, interpreter = self._block_interpreter(code, language)
         
-        # Clean up
-        self.environment.terminal.execute_command(f"rm {filename}")
+        # Each block gets its own file, removed once it has run
+        stdout, stderr, code = self.environment.terminal.run_code(code, suffix, interpreter, cwd=cwd).output()
         
         return f"Exit code: {code}\nOutput: {stdout}\nErrors: {stderr}"
     
@@ -114,11 +701,12 @@ class VirtualVibeCoder:
         """Get information about the current environment"""
         tools = [tool for tool, available in self.environment.available_tools.items() if available]
         current_dir = self.environment.terminal.get_current_directory()
+        models = ' -> '.join(self.router.models) if self.router is not None else self.model_name
         
         return f"""
 ## Arch Linux Environment
 - Current directory: {current_dir}
 - Available tools: {', '.join(tools)}
 - Sudo privileges: Available
-- Model: deepseek-r1:8b (local)
+- Model: {models} (local)
         """
\ No newline at end of file
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, Set
+
+
+class QueueFull(Exception):
+    """Raised instead of queueing when too many callers already wait"""
+
+
+class FairGate:
+    """Bounded, fair access to a shared resource such as the local model.
+
+    At most `slots` callers hold the gate at once. Waiting callers are
+    served round-robin by key (one session's queued requests cannot starve
+    the others) and in arrival order within a key. Once max_waiting
+    callers wait, further ones get QueueFull right away, so overload turns
+    into an error the client can retry instead of an ever-growing queue.
+    """
+
+    def __init__(self, slots: int = 1, max_waiting: int = 32):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queues: Dict[str, Deque[object]] = {}
+        # Keys with waiters, in the order they are next served
+        self._rotation: Deque[str] = deque()
+        self._granted: Set[object] = set()
+        self._waiting = 0
+        self.granted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+
+    @contextmanager
+    def slot(self, key: str) -> Iterator[None]:
+        start = time.monotonic()
+        with self._cond:
+            if self._active < self.slots and not self._waiting:
+                self._active += 1
+            else:
+                if self._waiting >= self.max_waiting:
+                    self.rejected_total += 1
+                    raise QueueFull(f"{self._waiting} requests are already waiting for the model")
+                ticket = object()
+                if key not in self._queues:
+                    self._queues[key] = deque()
+                    self._rotation.append(key)
+                self._queues[key].append(ticket)
+                self._waiting += 1
+                self._cond.wait_for(lambda: ticket in self._granted)
+                self._granted.remove(ticket)
+            self.granted_total += 1
+            self.wait_seconds_total += time.monotonic() - start
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._active -= 1
+                self._grant()
+
+    def _grant(self):
+        while self._active < self.slots and self._rotation:
+            key = self._rotation.popleft()
+            waiters = self._queues[key]
+            self._granted.add(waiters.popleft())
+            if waiters:
+                self._rotation.append(key)
+            else:
+                del self._queues[key]
+            self._waiting -= 1
+            self._active += 1
+        self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'active': self._active,
+                'waiting': self._waiting,
+                'granted_total': self.granted_total,
+                'rejected_total': self.rejected_total,
+                'wait_seconds_total': self.wait_seconds_total,
+            }
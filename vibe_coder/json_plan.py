@@ -0,0 +1,110 @@
+import json
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from .plan_parser import normalize_language
+
+# Languages a step can run in; a bash step is a command line or script
+LANGUAGES = ('bash', 'python', 'javascript')
+
+# Passed to Ollama's format option, which constrains generation to match it
+PLAN_SCHEMA: Dict[str, Any] = {
+    'type': 'object',
+    'properties': {
+        'reasoning': {'type': 'string'},
+        'steps': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'id': {'type': 'integer'},
+                    'description': {'type': 'string'},
+                    'language': {'type': 'string', 'enum': list(LANGUAGES)},
+                    'command': {'type': 'string'},
+                    'cwd': {'type': 'string'},
+                    'depends_on': {'type': 'array', 'items': {'type': 'integer'}},
+                },
+                'required': ['id', 'language', 'command'],
+            },
+        },
+    },
+    'required': ['reasoning', 'steps'],
+}
+
+PLAN_INSTRUCTIONS = (
+    "Respond with only a JSON object matching this schema: " + json.dumps(PLAN_SCHEMA, separators=(',', ':')) + ". "
+    "Each step runs one bash command (or script), or a python or javascript program, in cwd (relative to "
+    "the current directory; default '.'), after the steps whose ids are listed in depends_on. "
+    "Steps without a dependency between them may run at the same time."
+)
+
+
+class PlanFormatError(ValueError):
+    """The response is not a plan matching PLAN_SCHEMA"""
+
+
+class JsonStep(NamedTuple):
+    id: int
+    language: str
+    command: str
+    cwd: str = '.'
+    depends_on: Tuple[int, ...] = ()
+    description: str = ''
+
+
+def parse_json_plan(text: str) -> Tuple[str, List[JsonStep]]:
+    """The reasoning and steps of a JSON plan; raises PlanFormatError.
+
+    Checks only what the executor relies on, by hand instead of with a
+    general schema validator: with constrained generation the response is
+    nearly always well-formed already. Unknown keys are ignored, and a
+    plan wrapped in a ```json fence is accepted.
+    """
+    text = text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[-1].rsplit('```', 1)[0]
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise PlanFormatError(f"Not JSON: {e}") from None
+    if not isinstance(data, dict) or not isinstance(data.get('steps'), list):
+        raise PlanFormatError("Expected an object with a steps array")
+    reasoning = data.get('reasoning')
+    steps: List[JsonStep] = []
+    seen = set()
+    for position, item in enumerate(data['steps'], 1):
+        if not isinstance(item, dict):
+            raise PlanFormatError(f"Step {position} is not an object")
+        step_id = item.get('id', position)
+        command = item.get('command')
+        language = normalize_language(item.get('language') or 'bash')
+        cwd = item.get('cwd') or '.'
+        depends_on = item.get('depends_on') or []
+        if not isinstance(step_id, int) or step_id in seen:
+            raise PlanFormatError(f"Step {position} has a missing or duplicate id")
+        if not isinstance(command, str) or not command.strip():
+            raise PlanFormatError(f"Step {step_id} has no command")
+        if language not in LANGUAGES:
+            raise PlanFormatError(f"Step {step_id} has unsupported language {language!r}")
+        if not isinstance(cwd, str) or not isinstance(depends_on, list):
+            raise PlanFormatError(f"Step {step_id} has a malformed cwd or depends_on")
+        for dependency in depends_on:
+            if not isinstance(dependency, int):
+                raise PlanFormatError(f"Step {step_id} has a dependency that is not a step id: {dependency!r}")
+            # Only earlier steps, so the dependencies cannot form a cycle
+            if dependency not in seen:
+                raise PlanFormatError(f"Step {step_id} depends on {dependency!r}, which is not an earlier step")
+        seen.add(step_id)
+        steps.append(JsonStep(step_id, language, command, cwd, tuple(depends_on), str(item.get('description') or '')))
+    return reasoning if isinstance(reasoning, str) else '', steps
+
+
+def render_plan(reasoning: str, steps: List[JsonStep]) -> str:
+    """A JSON plan as markdown, for people to read"""
+    parts = [reasoning] if reasoning else []
+    for step in steps:
+        where = f" (in {step.cwd})" if step.cwd != '.' else ''
+        after = f", after {', '.join(map(str, step.depends_on))}" if step.depends_on else ''
+        about = f": {step.description}" if step.description else ''
+        parts.append(f"**Step {step.id}**{where}{after}{about}\n\n"
+                     f"```{step.language}\n{step.command.rstrip()}\n```")
+    return '\n\n'.join(parts)
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import string
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+# Below this many files, a thread pool costs more than it saves
+PARALLEL_THRESHOLD = 16
+
+
+class Template(str):
+    """File content with $name placeholders, filled in when materialized.
+
+    Plain strings are written verbatim, so shell scripts and code that use
+    $ themselves are never touched.
+    """
+
+
+class MaterializeResult(NamedTuple):
+    root: str
+    created_dirs: int
+    written: int
+    unchanged: int
+
+
+def flatten(structure: Mapping[str, Any], variables: Optional[Mapping[str, str]] = None,
+            prefix: str = '') -> Tuple[Set[str], Dict[str, bytes]]:
+    """Turn a nested structure into relative directory paths and file contents.
+
+    Keys may contain slashes. A key ending in '/' or mapping to a dict is a
+    directory (a dict's items are created inside it); anything else is a
+    file whose value is str, bytes, Template or None (empty).
+    """
+    dirs: Set[str] = set()
+    files: Dict[str, bytes] = {}
+    for key, value in structure.items():
+        path = _relative_path(prefix + key)
+        if key.endswith('/') or isinstance(value, Mapping):
+            if path:
+                dirs.add(path)
+            if isinstance(value, Mapping):
+                sub_dirs, sub_files = flatten(value, variables, path + '/' if path else '')
+                dirs |= sub_dirs
+                files.update(sub_files)
+            elif value:
+                raise ValueError(f"Directory {key!r} cannot have file content")
+            continue
+        if not path:
+            raise ValueError(f"Invalid file name {key!r}")
+        if path in files:
+            raise ValueError(f"Duplicate file {path!r}")
+        files[path] = _render(value, variables)
+        parent = os.path.dirname(path)
+        if parent:
+            dirs.add(parent)
+
+    # Parents of every directory, so creation order is simple
+    for path in list(dirs):
+        while '/' in path:
+            path = path.rsplit('/', 1)[0]
+            dirs.add(path)
+    collisions = dirs & set(files)
+    if collisions:
+        raise ValueError(f"Paths used as both file and directory: {', '.join(sorted(collisions))}")
+    return dirs, files
+
+
+def _relative_path(key: str) -> str:
+    path = os.path.normpath(key.strip('/')) if key.strip('/') else ''
+    if path == '.':
+        return ''
+    if os.path.isabs(key) or path == '..' or path.startswith('../'):
+        raise ValueError(f"Path {key!r} escapes the project directory")
+    return path
+
+
+def _render(value: Any, variables: Optional[Mapping[str, str]]) -> bytes:
+    if value is None:
+        return b''
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, Template):
+        value = string.Template(value).safe_substitute(variables or {})
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    raise ValueError(f"Unsupported file content of type {type(value).__name__}")
+
+
+def _unchanged(path: str, data: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest()
+    except OSError:
+        return False
+
+
+def _write(path: str, data: bytes, exclusive: bool = False):
+    with open(path, 'xb' if exclusive else 'wb') as f:
+        f.write(data)
+    if data.startswith(b'#!'):
+        # Scripts with a shebang are meant to be run directly
+        os.chmod(path, os.stat(path).st_mode | 0o111)
+
+
+def _write_all(items: List[Tuple[str, bytes]], max_workers: int, exclusive: bool = False):
+    if len(items) < PARALLEL_THRESHOLD or max_workers <= 1:
+        for path, data in items:
+            _write(path, data, exclusive)
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # list() re-raises the first failure
+        list(executor.map(lambda item: _write(item[0], item[1], exclusive), items))
+
+
+def materialize(root: str, structure: Mapping[str, Any], variables: Optional[Mapping[str, str]] = None,
+                max_workers: int = 8) -> MaterializeResult:
+    """Create a whole project tree under root, or nothing at all.
+
+    A new project is built in a hidden sibling directory and renamed into
+    place in one step. For an existing directory, only new or changed files
+    are written: each to a temporary file beside its target, and the
+    temporaries are renamed over their targets only after every write has
+    succeeded. Either way a failure leaves the file system as it was.
+    """
+    root = os.path.abspath(root)
+    dirs, files = flatten(structure, variables)
+    if not os.path.exists(root):
+        return _materialize_new(root, dirs, files, max_workers)
+    if not os.path.isdir(root):
+        raise ValueError(f"{root} exists and is not a directory")
+    return _materialize_existing(root, dirs, files, max_workers)
+
+
+def _materialize_new(root: str, dirs: Set[str], files: Dict[str, bytes], max_workers: int) -> MaterializeResult:
+    parent = os.path.dirname(root)
+    os.makedirs(parent, exist_ok=True)
+    staging = os.path.join(parent, f".{os.path.basename(root)}.staging-{uuid.uuid4().hex[:8]}")
+    os.mkdir(staging)
+    try:
+        for path in sorted(dirs):
+            os.mkdir(os.path.join(staging, path))
+        _write_all([(os.path.join(staging, path), data) for path, data in files.items()], max_workers)
+        os.rename(staging, root)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return MaterializeResult(root, len(dirs) + 1, len(files), 0)
+
+
+def _materialize_existing(root: str, dirs: Set[str], files: Dict[str, bytes], max_workers: int) -> MaterializeResult:
+    created: List[str] = []
+    temporaries: List[Tuple[str, str]] = []
+    try:
+        for path in sorted(dirs):
+            target = os.path.join(root, path)
+            if not os.path.isdir(target):
+                os.mkdir(target)
+                created.append(target)
+
+        changed = [(path, data) for path, data in files.items() if not _unchanged(os.path.join(root, path), data)]
+        for path, _ in changed:
+            if os.path.isdir(os.path.join(root, path)):
+                raise IsADirectoryError(f"{path} is a directory")
+        suffix = f".staging-{uuid.uuid4().hex[:8]}"
+        temporaries = [(os.path.join(root, path) + suffix, os.path.join(root, path)) for path, _ in changed]
+        _write_all([(tmp, data) for (tmp, _), (_, data) in zip(temporaries, changed)], max_workers, exclusive=True)
+        for tmp, target in temporaries:
+            if os.path.exists(target):
+                # Replacing a file keeps its permissions
+                shutil.copymode(target, tmp)
+    except BaseException:
+        for tmp, _ in temporaries:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        for target in reversed(created):
+            shutil.rmtree(target, ignore_errors=True)
+        raise
+
+    for tmp, target in temporaries:
+        os.replace(tmp, target)
+    return MaterializeResult(root, len(created), len(changed), len(files) - len(changed))
@@ -0,0 +1,95 @@
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from . import tracing
+
+KeepAlive = Union[str, float, None]
+
+
+class OllamaChatBackend:
+    """Talk to Ollama's native chat endpoint.
+
+    Unlike the flattened completion prompt, a chat request lets the server
+    match the message prefix against the KV cache of the previous turn, so
+    only the new messages need prompt evaluation. keep_alive keeps the
+    model resident between requests.
+    """
+
+    def __init__(self, model: str, host: Optional[str] = None, keep_alive: KeepAlive = "30m",
+                 options: Optional[Dict[str, Any]] = None, format: Union[str, Dict[str, Any], None] = None):
+        self.model = model
+        self.keep_alive = keep_alive
+        # 'json', or a JSON schema the server constrains generation to
+        self.format = format
+        self.options = {k: v for k, v in (options or {}).items() if v is not None}
+        self.client = _client(host)
+
+    def _options(self, overrides: Dict[str, Any]) -> Dict[str, Any]:
+        return {**self.options, **overrides}
+
+    def _format(self) -> Dict[str, Any]:
+        return {'format': self.format} if self.format else {}
+
+    def invoke(self, messages: List[Dict[str, str]], **options: Any) -> str:
+        response = self.client.chat(
+            model=self.model,
+            messages=messages,
+            options=self._options(options),
+            keep_alive=self.keep_alive,
+            **self._format()
+        )
+        record_timings(response)
+        return response['message']['content']
+
+    def stream(self, messages: List[Dict[str, str]], **options: Any) -> Iterator[str]:
+        for chunk in self.client.chat(
+            model=self.model,
+            messages=messages,
+            options=self._options(options),
+            keep_alive=self.keep_alive,
+            stream=True,
+            **self._format()
+        ):
+            content = chunk['message']['content']
+            if content:
+                yield content
+            if chunk.get('done'):
+                record_timings(chunk)
+
+
+def _client(host: Optional[str]):
+    # Importing ollama pulls in httpx and pydantic; only pay for it when a model is used
+    import ollama
+    return ollama.Client(host=host)
+
+
+def record_timings(response: Any):
+    """Split model time into prompt evaluation and generation, as reported by the server"""
+    for field, phase in (('prompt_eval_duration', 'llm_prompt_eval'), ('eval_duration', 'llm_generation')):
+        nanoseconds = response.get(field)
+        if nanoseconds:
+            tracing.observe(phase, nanoseconds / 1e9)
+
+
+def warm_up(model: str, system_prompt: str, host: Optional[str] = None,
+            keep_alive: KeepAlive = "30m") -> threading.Thread:
+    """Load the model and evaluate the system prompt in the background.
+
+    The first real request then finds the model resident and the shared
+    prefix already in the KV cache. Failures (e.g. server not up yet) are
+    ignored; the request path reports them properly.
+    """
+    def run():
+        try:
+            _client(host).chat(
+                model=model,
+                messages=[{"role": "system", "content": system_prompt}],
+                options={'num_predict': 1},
+                keep_alive=keep_alive
+            )
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=run, name="ollama-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,308 @@
+import asyncio
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .context import approximate_tokens
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompt.json')
+
+# "coder → request[qa_engineer]: Test scenario creation"
+STEP_PATTERN = re.compile(r'^\s*(\w+)\s*(?:→|->)\s*(\w+)(?:\[(\w+)\])?\s*:\s*(.*)$')
+
+# complete(system_prompt, user_prompt) -> model output
+Completer = Callable[[str, str], str]
+
+
+def load_agent_system(path: str = DEFAULT_SPEC_PATH) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return json.load(f)['agent_system']
+
+
+def timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class WorkflowStep:
+    def __init__(self, index: int, agent: str, type: str, target: Optional[str], description: str):
+        self.index = index
+        self.agent = agent
+        self.type = type
+        self.target = target
+        self.description = description
+        self.deps: List[int] = []
+
+    def reaches(self, agent: str) -> bool:
+        if self.type == 'broadcast':
+            return agent != self.agent
+        return self.target == agent
+
+
+def parse_workflow(steps: List[str]) -> List[WorkflowStep]:
+    """Parse workflow steps and work out which earlier steps each one needs.
+
+    A step waits for its agent's previous step and for every earlier message
+    that reaches its agent, except for the other broadcasts in the same run
+    of consecutive broadcasts by different agents: those are independent
+    contributions (e.g. a security review and the docs) and run in parallel.
+    """
+    parsed = []
+    for index, text in enumerate(steps):
+        match = STEP_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Cannot parse workflow step: {text!r}")
+        agent, type, target, description = match.groups()
+        parsed.append(WorkflowStep(index, agent, type, target, description))
+
+    run_start = 0
+    for step in parsed:
+        previous = parsed[step.index - 1] if step.index else None
+        continues_run = (step.type == 'broadcast' and previous is not None and previous.type == 'broadcast'
+                         and step.agent not in {s.agent for s in parsed[run_start:step.index]})
+        if not continues_run:
+            run_start = step.index
+        for earlier in parsed[:step.index]:
+            if earlier.agent == step.agent or (earlier.reaches(step.agent) and earlier.index < run_start):
+                step.deps.append(earlier.index)
+    return parsed
+
+
+class AgentMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.latency = 0.0
+        self.model_time = 0.0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'latency_seconds': round(self.latency, 6),
+            'model_seconds': round(self.model_time, 6),
+            'tokens_in': self.tokens_in,
+            'tokens_out': self.tokens_out,
+        }
+
+
+class MessageBus:
+    """In-process bus with a bounded inbox per agent.
+
+    A full inbox makes send() wait, which pushes back on whoever is
+    producing faster than the recipient drains. An agent with nothing
+    left to do leaves the bus, so nobody waits on it.
+    """
+
+    def __init__(self, agent_ids: List[str], inbox_size: int = 32):
+        self.inboxes: Dict[str, "asyncio.Queue[Dict[str, Any]]"] = {
+            agent_id: asyncio.Queue(maxsize=inbox_size) for agent_id in agent_ids
+        }
+        # Every message, in send order; what a human monitoring the conversation sees
+        self.transcript: List[Dict[str, Any]] = []
+
+    async def send(self, message: Dict[str, Any]):
+        self.transcript.append(message)
+        if message['type'] == 'broadcast':
+            recipients = [agent_id for agent_id in self.inboxes if agent_id != message['from']]
+        else:
+            recipients = [message['to']] if message.get('to') in self.inboxes else []
+        for agent_id in recipients:
+            inbox = self.inboxes.get(agent_id)
+            if inbox is not None:
+                await inbox.put(message)
+
+    def leave(self, agent_id: str):
+        inbox = self.inboxes.pop(agent_id, None)
+        while inbox is not None and not inbox.empty():
+            # Lets senders already waiting on the inbox finish
+            inbox.get_nowait()
+
+
+class LLMBatcher:
+    """Collect pending model calls from all agents and dispatch them in batches.
+
+    Calls arriving within batch_window of each other (up to max_batch) go
+    to the model together, so a local server with parallel slots evaluates
+    them side by side. At most max_pending calls may wait; further agents
+    block in submit() until a batch drains.
+    """
+
+    def __init__(self, complete: Completer, max_batch: int = 4, batch_window: float = 0.02,
+                 max_pending: int = 16):
+        self.complete = complete
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.pending: "asyncio.Queue[Tuple[str, str, asyncio.Future]]" = asyncio.Queue(maxsize=max_pending)
+        self.batch_sizes: List[int] = []
+        self._executor = ThreadPoolExecutor(max_workers=max_batch)
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def submit(self, system: str, prompt: str) -> Tuple[str, float]:
+        """Queue a call and wait for (output, seconds spent in the model)"""
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        await self.pending.put((system, prompt, future))
+        return await future
+
+    def _timed_complete(self, system: str, prompt: str) -> Tuple[str, float]:
+        start = time.perf_counter()
+        output = self.complete(system, prompt)
+        return output, time.perf_counter() - start
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.pending.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.pending.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batch_sizes.append(len(batch))
+            calls = [loop.run_in_executor(self._executor, self._timed_complete, system, prompt)
+                     for system, prompt, _ in batch]
+            for (_, _, future), result in zip(batch, await asyncio.gather(*calls, return_exceptions=True)):
+                if future.done():
+                    continue
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+
+class Orchestrator:
+    """Run the agents from prompt.json as concurrent tasks on a message bus"""
+
+    def __init__(self, complete: Completer, spec: Optional[Dict[str, Any]] = None,
+                 max_batch: int = 4, inbox_size: int = 32, max_pending: int = 16):
+        self.spec = spec if spec is not None else load_agent_system()
+        self.agents = {agent['id']: agent for agent in self.spec['agents']}
+        self.complete = complete
+        self.max_batch = max_batch
+        self.inbox_size = inbox_size
+        self.max_pending = max_pending
+        self.metrics: Dict[str, AgentMetrics] = {agent_id: AgentMetrics() for agent_id in self.agents}
+        self.batch_sizes: List[int] = []
+
+    def scenarios(self) -> List[str]:
+        return [example['scenario'] for example in self.spec['collaboration_protocol']['workflow_examples']]
+
+    def workflow(self, scenario: str) -> List[WorkflowStep]:
+        for example in self.spec['collaboration_protocol']['workflow_examples']:
+            if example['scenario'] == scenario:
+                return parse_workflow(example['steps'])
+        raise KeyError(f"Unknown scenario: {scenario}")
+
+    def _prompt(self, step: WorkflowStep, requirement: str, received: List[Dict[str, Any]]) -> str:
+        agent = self.agents[step.agent]
+        addressed = f" to {step.target}" if step.target else ""
+        return (
+            f"Requirement: {requirement}\n\n"
+            f"Messages you have received:\n{json.dumps(received, indent=1)}\n\n"
+            f"Your task: send a {step.type} message{addressed}: {step.description}.\n"
+            f"Respond with a JSON object matching this format: {json.dumps(agent['output_format'])}"
+        )
+
+    def _message(self, step: WorkflowStep, output: str) -> Dict[str, Any]:
+        try:
+            content = json.loads(output)
+        except ValueError:
+            content = {'text': output}
+        message: Dict[str, Any] = {'from': step.agent, 'type': step.type, 'content': content}
+        if step.target:
+            message['to'] = step.target
+        if step.type == 'request':
+            message['action'] = step.description
+            message['parameters'] = {}
+        if step.type == 'response':
+            message['request_id'] = f"step-{step.index}"
+        message['timestamp'] = timestamp()
+        return message
+
+    async def run(self, scenario: str, requirement: str) -> List[Dict[str, Any]]:
+        """Play a workflow scenario and return the message transcript"""
+        steps = self.workflow(scenario)
+        acting = [agent_id for agent_id in self.agents if any(step.agent == agent_id for step in steps)]
+        bus = MessageBus(acting, self.inbox_size)
+        batcher = LLMBatcher(self.complete, self.max_batch, max_pending=self.max_pending)
+        finished = {step.index: asyncio.Event() for step in steps}
+
+        async def act(agent_id: str):
+            inbox = bus.inboxes[agent_id]
+            received: List[Dict[str, Any]] = []
+            for step in [s for s in steps if s.agent == agent_id]:
+                # Messages are only taken while the agent is idle: while it waits for
+                # the model its inbox fills up and holds its senders back. Waiting for
+                # a dependency it keeps draining, so the sender it waits on cannot stall.
+                dependencies = asyncio.ensure_future(asyncio.gather(*(finished[dep].wait() for dep in step.deps)))
+                while not dependencies.done():
+                    message = asyncio.ensure_future(inbox.get())
+                    await asyncio.wait({dependencies, message}, return_when=asyncio.FIRST_COMPLETED)
+                    if message.done():
+                        received.append(message.result())
+                    else:
+                        message.cancel()
+                # A step is marked finished only once send() has put its message in
+                # every recipient's inbox, so each dependency's messages are in
+                # received or still queued here. Take the queued ones, and whatever
+                # else has arrived; senders not depended on may still be held back.
+                while not inbox.empty():
+                    received.append(inbox.get_nowait())
+
+                system = self.agents[agent_id]['prompt']
+                prompt = self._prompt(step, requirement, received)
+                start = time.perf_counter()
+                output, model_time = await batcher.submit(system, prompt)
+
+                metrics = self.metrics[agent_id]
+                metrics.calls += 1
+                metrics.latency += time.perf_counter() - start
+                metrics.model_time += model_time
+                metrics.tokens_in += approximate_tokens(system) + approximate_tokens(prompt)
+                metrics.tokens_out += approximate_tokens(output)
+
+                # Delivered to every inbox before the dependents are let go
+                await bus.send(self._message(step, output))
+                finished[step.index].set()
+            bus.leave(agent_id)
+
+        try:
+            await asyncio.gather(*[act(agent_id) for agent_id in acting])
+        finally:
+            await batcher.close()
+            self.batch_sizes.extend(batcher.batch_sizes)
+        return bus.transcript
+
+    def report(self) -> Dict[str, Any]:
+        return {agent_id: metrics.as_dict() for agent_id, metrics in self.metrics.items() if metrics.calls}
+
+
+def chat_completer(model: str, host: Optional[str] = None, keep_alive: str = "30m") -> Completer:
+    """Completer backed by the local Ollama chat endpoint"""
+    from .ollama_chat import OllamaChatBackend
+
+    backend = OllamaChatBackend(model, host=host, keep_alive=keep_alive)
+
+    def complete(system: str, prompt: str) -> str:
+        return backend.invoke([{"role": "system", "content": system}, {"role": "user", "content": prompt}])
+
+    return complete
@@ -0,0 +1,177 @@
+import os
+import re
+import shlex
+import subprocess
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+# pacman's local database; its mtime changes whenever a package is added or removed
+PACMAN_DB = '/var/lib/pacman/local'
+
+# Statuses reported per requested package
+INSTALLED = 'installed'
+ALREADY_INSTALLED = 'already installed'
+NOT_FOUND = 'not found'
+FAILED = 'failed'
+INVALID = 'invalid name'
+
+PACKAGE_NAME = re.compile(r'^[a-z0-9@_+][a-z0-9@._+-]*$')
+NOT_FOUND_LINE = re.compile(r'target not found: (\S+)')
+
+# Flags that keep a `pacman -S` a plain install that can be merged with others
+SYNC_FLAGS = {'-S', '--sync', '--noconfirm', '--needed'}
+
+
+class PackageStatus(NamedTuple):
+    name: str
+    status: str
+    message: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return self.status in (INSTALLED, ALREADY_INSTALLED)
+
+
+def install_targets(command: str) -> Optional[List[str]]:
+    """The packages of a plain `[sudo] pacman -S ... pkgs` command, else None.
+
+    Upgrades, refreshes (-Sy/-Syu) and anything combined with other shell
+    syntax are left to run as written.
+    """
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if argv[:1] == ['sudo']:
+        argv = argv[1:]
+    if len(argv) < 3 or argv[0] != 'pacman' or argv[1] not in ('-S', '--sync'):
+        return None
+    flags = [arg for arg in argv[1:] if arg.startswith('-')]
+    targets = [arg for arg in argv[1:] if not arg.startswith('-')]
+    if not targets or any(flag not in SYNC_FLAGS for flag in flags):
+        return None
+    if any(not PACKAGE_NAME.match(target) for target in targets):
+        return None
+    return targets
+
+
+class PackageIndex:
+    """Names of installed packages, re-read only when the local DB changes"""
+
+    def __init__(self, pacman: str = 'pacman', db_path: str = PACMAN_DB):
+        self.pacman = pacman
+        self.db_path = db_path
+        self._stamp: Optional[int] = None
+        self._installed: Optional[Set[str]] = None
+        self._lock = threading.Lock()
+
+    def _db_stamp(self) -> Optional[int]:
+        try:
+            return os.stat(self.db_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def installed(self) -> Set[str]:
+        with self._lock:
+            stamp = self._db_stamp()
+            # Without a database to watch, every lookup asks pacman
+            if self._installed is None or stamp is None or stamp != self._stamp:
+                self._installed = self._query()
+                self._stamp = stamp
+            return self._installed
+
+    def _query(self) -> Set[str]:
+        try:
+            result = subprocess.run([self.pacman, '-Qq'], capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired):
+            return set()
+        return set(result.stdout.split())
+
+    def invalidate(self):
+        with self._lock:
+            self._installed = None
+
+
+class PackageManager:
+    """Installs pacman packages, skipping ones that are already present.
+
+    All packages requested in one call go into a single pacman transaction
+    (with --needed, so provides and groups are resolved by pacman itself).
+    If pacman rejects unknown targets, the rest are retried once without
+    them, so one misspelled name does not fail the whole set.
+    """
+
+    def __init__(self, terminal, pacman: str = 'pacman', db_path: str = PACMAN_DB,
+                 use_sudo: Optional[bool] = None):
+        self.terminal = terminal
+        self.pacman = pacman
+        self.index = PackageIndex(pacman, db_path)
+        self.use_sudo = os.geteuid() != 0 if use_sudo is None else use_sudo
+        self._lock = threading.Lock()
+
+    def install(self, packages: Iterable[str]) -> List[PackageStatus]:
+        """Install packages in one transaction; one status per distinct name, in order"""
+        names = list(dict.fromkeys(packages))
+        statuses: Dict[str, PackageStatus] = {}
+        with self._lock:
+            installed = self.index.installed()
+            pending = []
+            for name in names:
+                if not PACKAGE_NAME.match(name):
+                    statuses[name] = PackageStatus(name, INVALID)
+                elif name in installed:
+                    statuses[name] = PackageStatus(name, ALREADY_INSTALLED)
+                else:
+                    pending.append(name)
+
+            while pending:
+                result = self.terminal.capture_command(self._command(pending), timeout=600)
+                self.index.invalidate()
+                output = result.stdout + result.stderr
+                if result.returncode == 0:
+                    for name in pending:
+                        statuses[name] = PackageStatus(name, INSTALLED)
+                    break
+                missing = set(NOT_FOUND_LINE.findall(output)) & set(pending)
+                for name in missing:
+                    statuses[name] = PackageStatus(name, NOT_FOUND)
+                retry = [name for name in pending if name not in missing]
+                if not missing or not retry:
+                    for name in retry:
+                        statuses[name] = PackageStatus(name, FAILED, output.strip())
+                    break
+                pending = retry
+        return [statuses[name] for name in names]
+
+    def _command(self, packages: List[str]) -> str:
+        argv = [self.pacman, '-S', '--needed', '--noconfirm'] + packages
+        return ('sudo ' if self.use_sudo else '') + ' '.join(shlex.quote(arg) for arg in argv)
+
+
+class InstallBatch:
+    """The installs of one plan, run as a single transaction.
+
+    The first install step to run installs every package the plan asks for;
+    later install steps only report the statuses of their own packages.
+    """
+
+    def __init__(self, manager: PackageManager, packages: Iterable[str]):
+        self.manager = manager
+        self.packages = list(dict.fromkeys(packages))
+        self._statuses: Optional[Dict[str, PackageStatus]] = None
+        self._lock = threading.Lock()
+
+    def install(self, packages: List[str]) -> List[PackageStatus]:
+        with self._lock:
+            if self._statuses is None:
+                self._statuses = {status.name: status for status in self.manager.install(self.packages)}
+        missing = [name for name in packages if name not in self._statuses]
+        extra = {status.name: status for status in self.manager.install(missing)} if missing else {}
+        return [self._statuses.get(name) or extra[name] for name in dict.fromkeys(packages)]
+
+
+def format_statuses(statuses: List[PackageStatus]) -> str:
+    """One line per package, followed by each distinct pacman error once"""
+    lines = [f"{status.name}: {status.status}" for status in statuses]
+    messages = dict.fromkeys(status.message for status in statuses if status.message)
+    return '\n'.join(lines + list(messages))
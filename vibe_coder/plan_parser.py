@@ -0,0 +1,123 @@
+import re
+from typing import List, NamedTuple, Optional
+
+# Step kinds produced by the parser
+BLOCK = 'block'
+COMMAND = 'command'
+
+COMMAND_PREFIXES = ('sudo ', 'pacman ', 'git ')
+
+# Fence tags that name the same language
+LANGUAGE_ALIASES = {
+    'py': 'python', 'python3': 'python',
+    'js': 'javascript', 'node': 'javascript', 'nodejs': 'javascript', 'mjs': 'javascript',
+    'sh': 'bash', 'shell': 'bash', 'zsh': 'bash', 'console': 'bash', 'shell-session': 'bash',
+}
+
+# An opening fence: indentation, three or more backticks or tildes, info string
+FENCE = re.compile(r'^( *)(`{3,}|~{3,})(.*)$')
+
+
+class Step(NamedTuple):
+    kind: str
+    content: str
+    # Normalized fence tag of a block, '' when untagged (and for commands)
+    language: str = ''
+
+
+def normalize_language(info: str) -> str:
+    """The language named by a fence info string, e.g. '{.python3 title=x}' -> 'python'"""
+    words = info.split()
+    if not words:
+        return ''
+    tag = words[0].strip('{}.').lower()
+    return LANGUAGE_ALIASES.get(tag, tag)
+
+
+def _inline_command(line: str) -> Optional[str]:
+    """A command line outside blocks: plain, `in backticks` or after a $ prompt"""
+    text = line.strip()
+    if len(text) > 2 and text[0] == '`' and text[-1] == '`' and '`' not in text[1:-1]:
+        text = text[1:-1].strip()
+    if text.startswith('$ '):
+        text = text[2:].lstrip()
+    return text if text.startswith(COMMAND_PREFIXES) else None
+
+
+class PlanStreamParser:
+    """Incrementally split an LLM response into executable steps.
+
+    Text can be fed in arbitrary chunks (e.g. tokens from a streaming model);
+    a step is emitted as soon as the line that completes it has arrived.
+    Fences follow CommonMark: ``` or ~~~ of any length, closed only by a
+    bare fence of the same character that is at least as long, so longer
+    fences can contain shorter ones. Block lines keep their indentation,
+    less that of the opening fence. Every character is looked at a bounded
+    number of times, so parsing is linear in the response size.
+    """
+
+    def __init__(self):
+        self._pending: List[str] = []
+        self._section: Optional[List[str]] = None
+        self._fence = ''
+        self._indent = 0
+        self._language = ''
+
+    def feed(self, chunk: str) -> List[Step]:
+        """Consume a chunk of text and return the steps it completed"""
+        if '\n' not in chunk:
+            if chunk:
+                self._pending.append(chunk)
+            return []
+        self._pending.append(chunk)
+        *lines, rest = ''.join(self._pending).split('\n')
+        self._pending = [rest] if rest else []
+        steps = []
+        for line in lines:
+            step = self._parse_line(line)
+            if step is not None:
+                steps.append(step)
+        return steps
+
+    def close(self) -> List[Step]:
+        """Flush the trailing partial line once the stream has ended"""
+        line = ''.join(self._pending)
+        self._pending = []
+        step = self._parse_line(line) if line else None
+        # An unterminated code block is never executed
+        self._section = None
+        return [step] if step is not None else []
+
+    def _parse_line(self, line: str) -> Optional[Step]:
+        if line.endswith('\r'):
+            line = line[:-1]
+
+        if self._section is None:
+            match = FENCE.match(line)
+            # A backtick fence's info string cannot itself contain backticks
+            if match and not (match.group(2)[0] == '`' and '`' in match.group(3)):
+                self._section = []
+                self._indent = len(match.group(1))
+                self._fence = match.group(2)
+                self._language = normalize_language(match.group(3))
+                return None
+            command = _inline_command(line)
+            return Step(COMMAND, command) if command is not None else None
+
+        stripped = line.strip()
+        if stripped.startswith(self._fence) and stripped == self._fence[0] * len(stripped):
+            # End of code block
+            code = ''.join(self._section)
+            self._section = None
+            return Step(BLOCK, code, self._language) if code.strip() else None
+
+        # Remove at most the opening fence's indentation
+        indent = len(line) - len(line.lstrip(' '))
+        self._section.append(line[min(indent, self._indent):] + '\n')
+        return None
+
+
+def parse_plan(plan: str) -> List[Step]:
+    """Parse a complete response into typed steps"""
+    parser = PlanStreamParser()
+    return parser.feed(plan) + parser.close()
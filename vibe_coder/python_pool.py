@@ -0,0 +1,174 @@
+import json
+import math
+import os
+import queue
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, NamedTuple, Optional
+
+from .capture import CommandResult, OutputCapture
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_worker.py')
+
+# Time allowed for a worker to report the exit of a killed block
+KILL_GRACE = 2.0
+
+
+def scratch_dir() -> str:
+    """Private directory for block scripts, on tmpfs when there is one"""
+    base = '/dev/shm' if os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+    path = os.path.join(base, f"vibe_coder-{os.getuid()}")
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def write_script(code: str, suffix: str, directory: Optional[str] = None, prefix: str = 'block-') -> str:
+    """Write a code block to a new uniquely named file and return its path"""
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=directory or scratch_dir())
+    with os.fdopen(fd, 'w') as f:
+        f.write(code)
+    return path
+
+
+class ResourceLimits(NamedTuple):
+    # Defaults to the block's timeout
+    cpu_seconds: Optional[int] = None
+    memory_bytes: Optional[int] = 4 * 1024 ** 3
+    file_bytes: Optional[int] = None
+
+
+class _Worker:
+    def __init__(self, interpreter: str):
+        self.sock, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.proc = subprocess.Popen(
+            [interpreter, WORKER_SCRIPT, str(theirs.fileno())],
+            pass_fds=(theirs.fileno(),),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        theirs.close()
+
+    def receive(self, timeout: float) -> dict:
+        self.sock.settimeout(max(timeout, 0.001))
+        message = self.sock.recv(65536)
+        if not message:
+            raise ConnectionError("Python worker exited")
+        return json.loads(message)
+
+    def close(self):
+        self.sock.close()
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class PythonPool:
+    """Warm Python processes that run code blocks without interpreter start-up.
+
+    Each worker forks a fresh child per block (see python_worker), so blocks
+    are isolated from each other and from the worker, and a timeout kills
+    the block's whole session. The pool size bounds how many blocks run at
+    once; a worker that dies is replaced.
+    """
+
+    def __init__(self, size: int = 2, interpreter: Optional[str] = None,
+                 limits: ResourceLimits = ResourceLimits()):
+        self.interpreter = interpreter or shutil.which('python3') or sys.executable
+        self.limits = limits
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(_Worker(self.interpreter))
+
+    def run(self, path: str, cwd: str, timeout: float, stdout: OutputCapture,
+            stderr: OutputCapture) -> CommandResult:
+        """Run a script as __main__ in cwd, streaming its output into the captures"""
+        worker = self._idle.get()
+        try:
+            return self._run(worker, path, cwd, timeout, stdout, stderr)
+        except (OSError, ValueError) as e:
+            # Includes socket timeouts and a worker that died: start a new one
+            worker.close()
+            worker = _Worker(self.interpreter)
+            stdout.close()
+            stderr.close()
+            return CommandResult.failure(f"Error executing command: {str(e)}")
+        finally:
+            self._idle.put(worker)
+
+    def _run(self, worker: _Worker, path: str, cwd: str, timeout: float,
+             stdout: OutputCapture, stderr: OutputCapture) -> CommandResult:
+        limits = self.limits._asdict()
+        if limits['cpu_seconds'] is None:
+            limits['cpu_seconds'] = max(1, math.ceil(timeout))
+        request = json.dumps({'path': path, 'cwd': cwd, 'limits': limits}).encode()
+
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        try:
+            try:
+                socket.send_fds(worker.sock, [request], [stdout_w, stderr_w])
+            finally:
+                os.close(stdout_w)
+                os.close(stderr_w)
+            deadline = time.monotonic() + timeout
+            pid = worker.receive(timeout)['pid']
+
+            timed_out = not _drain({stdout_r: stdout, stderr_r: stderr}, deadline)
+            if not timed_out:
+                try:
+                    returncode = worker.receive(deadline - time.monotonic())['returncode']
+                except socket.timeout:
+                    # Closed its output but kept running
+                    timed_out = True
+            if timed_out:
+                _kill_session(pid)
+                worker.receive(KILL_GRACE)
+                stdout.close()
+                stderr.close()
+                return CommandResult.failure(f"Command timed out after {timeout} seconds")
+        finally:
+            os.close(stdout_r)
+            os.close(stderr_r)
+        return CommandResult.from_captures(stdout, stderr, returncode)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _drain(captures: Dict[int, OutputCapture], deadline: float) -> bool:
+    """Read pipes into captures until they close; False if the deadline passed first"""
+    with selectors.DefaultSelector() as selector:
+        for fd in captures:
+            selector.register(fd, selectors.EVENT_READ)
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, 65536)
+                if chunk:
+                    captures[key.fd].feed(chunk)
+                else:
+                    selector.unregister(key.fd)
+    return True
+
+
+def _kill_session(pid: int):
+    # The block leads its own session; also kill the pid in case setsid has not run yet
+    for kill, target in ((os.killpg, pid), (os.kill, pid)):
+        try:
+            kill(target, signal.SIGKILL)
+        except OSError:
+            pass
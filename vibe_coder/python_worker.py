@@ -0,0 +1,129 @@
+"""
+Warm Python worker, started as a script by vibe_coder.python_pool.
+
+The worker imports the commonly used standard library once, then waits on
+a SOCK_SEQPACKET socket for blocks to run. Each block runs in a child
+forked from the warm worker, so it starts in about a millisecond instead of
+paying interpreter start-up. The child gets a fresh __main__ namespace, its
+own session (so the pool can kill everything it starts), the requested
+working directory and resource limits, and the output pipes sent along with
+the request.
+
+Only the standard library may be imported here: the worker may run under a
+different interpreter than the parent.
+"""
+
+import atexit
+import json
+import os
+import resource
+import signal
+import socket
+import sys
+import traceback
+
+# Imported once in the worker, inherited by every block
+PRELOAD = (
+    'collections', 'dataclasses', 'datetime', 'functools', 'io', 'itertools', 'math',
+    'pathlib', 're', 'random', 'runpy', 'shutil', 'string', 'subprocess', 'textwrap',
+    'time', 'typing',
+)
+
+LIMITS = {
+    'cpu_seconds': resource.RLIMIT_CPU,
+    'memory_bytes': resource.RLIMIT_AS,
+    'file_bytes': resource.RLIMIT_FSIZE,
+}
+
+
+def _run_block(request, stdout_fd, stderr_fd):
+    """In the forked child: set up the process and run the script as __main__"""
+    os.setsid()
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    for fd in (devnull, stdout_fd, stderr_fd):
+        os.close(fd)
+    # Handlers the worker registered are not the block's to run
+    atexit._clear()
+    code = 0
+    try:
+        for name, value in request.get('limits', {}).items():
+            if value is not None:
+                resource.setrlimit(LIMITS[name], (value, value))
+        os.chdir(request['cwd'])
+        # As if run as `python3 script` from cwd: local modules are importable
+        sys.argv = [request['path']]
+        sys.path[0] = request['cwd']
+        import runpy
+        runpy.run_path(request['path'], run_name='__main__')
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    code = _finalize(code)
+    os._exit(code & 0xff)
+
+
+def _finalize(code):
+    """Shut down as the interpreter would after `python3 script`, before os._exit"""
+    try:
+        threading = sys.modules.get('threading')
+        if threading is not None:
+            # Waits for the block's non-daemon threads
+            threading._shutdown()
+    except BaseException:
+        traceback.print_exc()
+        code = code or 1
+    atexit._run_exitfuncs()
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except Exception:
+        code = code or 120
+    return code
+
+
+def serve(sock):
+    while True:
+        try:
+            message, fds, _, _ = socket.recv_fds(sock, 65536, 2)
+        except OSError:
+            return
+        if not message:
+            # The pool closed its end
+            return
+        request = json.loads(message)
+        stdout_fd, stderr_fd = fds
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            _run_block(request, stdout_fd, stderr_fd)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+        sock.send(json.dumps({'pid': pid}).encode())
+        _, status = os.waitpid(pid, 0)
+        sock.send(json.dumps({'returncode': os.waitstatus_to_exitcode(status)}).encode())
+
+
+def main():
+    for name in PRELOAD:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    serve(socket.socket(fileno=int(sys.argv[1])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import re
+import threading
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .tracing import DEFAULT_BUCKETS, Histogram
+
+# Why a request moved on to the next tier
+NO_BLOCKS = 'no_blocks'
+FAILED = 'failed'
+CLASSIFIER = 'classifier'
+
+# Requests a small model is unlikely to get right on its own
+HARD_REQUEST = re.compile(
+    r'\b(?:refactor\w*|architect\w*|design|migrat\w+|optimi[sz]\w*|concurren\w+|race condition|deadlock'
+    r'|security|vulnerab\w+|profil\w+|debug\w*|traceback|segfault|why)\b', re.IGNORECASE)
+
+
+def classify_request(request: str) -> int:
+    """Tiers to skip for a request: 1 for long or hard-sounding ones, else 0"""
+    return 1 if len(request) > 800 or HARD_REQUEST.search(request) else 0
+
+
+class ModelRouter:
+    """Sends each request to the cheapest model first and escalates on doubt.
+
+    models go from cheapest to most capable. A request starts on the
+    tier the classifier picks (the first one by default) and moves to the
+    next when the response has no executable steps or one of them fails,
+    until the last tier answers. Latency per tier and escalations per
+    reason are counted for prometheus_text().
+    """
+
+    def __init__(self, models: Sequence[str], classifier: Optional[Callable[[str], int]] = classify_request,
+                 escalate_on_no_blocks: bool = True, escalate_on_failure: bool = True):
+        if not models:
+            raise ValueError("A router needs at least one model")
+        self.models = list(models)
+        self.classifier = classifier
+        self.escalate_on_no_blocks = escalate_on_no_blocks
+        self.escalate_on_failure = escalate_on_failure
+        self._lock = threading.Lock()
+        self.latency = [Histogram(DEFAULT_BUCKETS) for _ in self.models]
+        self.requests = [0] * len(self.models)
+        self.escalations: Counter = Counter()
+
+    def first_tier(self, request: str) -> int:
+        tier = min(max(self.classifier(request), 0), len(self.models) - 1) if self.classifier else 0
+        if tier:
+            with self._lock:
+                self.escalations[(0, CLASSIFIER)] += 1
+        return tier
+
+    def escalation(self, tier: int, steps: int, failed: bool) -> Optional[str]:
+        """Why an answer from this tier should go to the next one, or None to keep it"""
+        if tier + 1 >= len(self.models):
+            return None
+        if steps == 0 and self.escalate_on_no_blocks:
+            reason = NO_BLOCKS
+        elif failed and self.escalate_on_failure:
+            reason = FAILED
+        else:
+            return None
+        with self._lock:
+            self.escalations[(tier, reason)] += 1
+        return reason
+
+    def observe(self, tier: int, seconds: float):
+        """Record one generation on a tier"""
+        with self._lock:
+            self.requests[tier] += 1
+            self.latency[tier].observe(seconds)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stats = {}
+            for tier, model in enumerate(self.models):
+                escalated = sum(count for (source, _), count in self.escalations.items() if source == tier)
+                stats[model] = {
+                    'requests': self.requests[tier],
+                    'escalations': escalated,
+                    'escalation_rate': escalated / self.requests[tier] if self.requests[tier] else 0.0,
+                    'seconds_total': self.latency[tier].sum,
+                }
+            return stats
+
+    def prometheus_text(self) -> str:
+        lines: List[str] = [
+            "# HELP vibe_coder_tier_generation_seconds Time to generate a response, per model tier.",
+            "# TYPE vibe_coder_tier_generation_seconds histogram",
+        ]
+        with self._lock:
+            for tier, model in enumerate(self.models):
+                labels = f'tier="{tier}",model="{model}"'
+                histogram = self.latency[tier]
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'vibe_coder_tier_generation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'vibe_coder_tier_generation_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'vibe_coder_tier_generation_seconds_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'vibe_coder_tier_generation_seconds_count{{{labels}}} {histogram.count}')
+            lines += [
+                "# HELP vibe_coder_tier_escalations_total Requests passed on to the next tier, by reason.",
+                "# TYPE vibe_coder_tier_escalations_total counter",
+            ]
+            for (tier, reason), count in sorted(self.escalations.items()):
+                lines.append(f'vibe_coder_tier_escalations_total{{tier="{tier}",model="{self.models[tier]}",'
+                             f'reason="{reason}"}} {count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,314 @@
+import contextvars
+import os
+import re
+import shlex
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Set
+
+from .plan_parser import COMMAND
+
+# Matches every resource; used for steps whose effects cannot be inferred
+ANY = '*'
+
+# Words before a command that do not change which program runs
+COMMAND_WRAPPERS = {'sudo', 'env', 'nohup', 'time'}
+
+# Commands that change the state of the shell running the plan
+STATE_COMMANDS = {'cd', 'pushd', 'popd', 'export', 'unset', 'source', '.', 'alias', 'unalias', 'set', 'umask', 'ulimit'}
+
+# Shell syntax we do not try to follow
+CONTROL_WORDS = {'if', 'then', 'else', 'elif', 'fi', 'for', 'while', 'until', 'do', 'done', 'case', 'esac', 'function', '{', '}', '(', ')'}
+
+# Tools that only read the paths they are given (or the cwd without arguments)
+READ_ONLY = {'cat', 'ls', 'grep', 'head', 'tail', 'wc', 'stat', 'file', 'diff', 'find', 'tree', 'du',
+             'ruff', 'flake8', 'pylint', 'mypy', 'pyflakes', 'pycodestyle', 'eslint', 'shellcheck', 'hadolint'}
+
+# Tools that read nothing from the filesystem
+NO_FILES = {'echo', 'printf', 'true', 'false', 'pwd', 'date', 'whoami', 'uname', 'which', 'type', 'sleep', 'id'}
+
+# Tools that modify the paths they are given
+WRITES_ARGS = {'touch', 'mkdir', 'rm', 'rmdir', 'chmod', 'chown', 'tee', 'truncate'}
+
+READ_ONLY_GIT = {'status', 'diff', 'log', 'show', 'branch', 'remote', 'rev-parse', 'ls-files'}
+
+# Package manager -> subcommands that install or remove packages
+INSTALLERS = {
+    'pacman': None,
+    'yay': None,
+    'pip': {'install', 'uninstall'},
+    'pip3': {'install', 'uninstall'},
+    'npm': {'install', 'i', 'add', 'uninstall'},
+    'cargo': {'install', 'add'},
+}
+
+GLOB_CHARS = re.compile(r'[$*?\[`]')
+
+# Commands that move the shell to another directory
+DIRECTORY_COMMANDS = {'cd', 'pushd', 'popd'}
+
+
+class PlanStep:
+    """A parsed plan step with the resources it reads and writes"""
+
+    def __init__(self, index: int, kind: str, content: str, language: str = '',
+                 cwd: Optional[str] = None):
+        self.index = index
+        self.kind = kind
+        self.content = content
+        self.language = language
+        # Absolute directory the step runs in, when it is not the plan's
+        self.cwd = cwd
+        self.reads: Set[str] = set()
+        self.writes: Set[str] = set()
+        # A barrier runs alone: after everything before it, before everything after it
+        self.barrier = False
+        self.deps: Set[int] = set()
+
+    def read_path(self, path: str, cwd: str):
+        self.reads.add(_path_resource(path, cwd))
+
+    def write_path(self, path: str, cwd: str):
+        self.writes.add(_path_resource(path, cwd))
+
+    def __repr__(self):
+        return f"PlanStep({self.index}, {self.kind!r}, barrier={self.barrier}, deps={sorted(self.deps)})"
+
+
+def _path_resource(path: str, cwd: str) -> str:
+    if GLOB_CHARS.search(path):
+        # Expansions could name anything
+        return ANY
+    return 'path:' + os.path.normpath(os.path.join(cwd, os.path.expanduser(path)))
+
+
+def _conflict(a: str, b: str) -> bool:
+    if a == ANY or b == ANY or a == b:
+        return True
+    if a.startswith('path:') and b.startswith('path:'):
+        # A directory conflicts with everything below it
+        a, b = a[5:], b[5:]
+        return b.startswith(a.rstrip('/') + '/') or a.startswith(b.rstrip('/') + '/')
+    return False
+
+
+def _any_conflict(first: Set[str], second: Set[str]) -> bool:
+    return any(_conflict(a, b) for a in first for b in second)
+
+
+def _split_commands(script: str) -> Optional[List[List[str]]]:
+    """Split a shell script into simple commands, or None if it is too complex"""
+    commands: List[List[str]] = []
+    heredoc_end = None
+    for line in script.split('\n'):
+        if heredoc_end is not None:
+            if line.strip() == heredoc_end:
+                heredoc_end = None
+            continue
+        try:
+            lexer = shlex.shlex(line, posix=True, punctuation_chars=True)
+            lexer.whitespace_split = True
+            lexer.commenters = '#'
+            tokens = list(lexer)
+        except ValueError:
+            return None
+
+        current: List[str] = []
+        for i, token in enumerate(tokens):
+            if token in (';', '&&', '||', '|', '&', ';;'):
+                if current:
+                    commands.append(current)
+                current = []
+            elif token in ('<<', '<<-'):
+                if i + 1 >= len(tokens):
+                    return None
+                heredoc_end = tokens[i + 1].strip('\'"')
+                current.append(token)
+            else:
+                current.append(token)
+        if current:
+            commands.append(current)
+    return commands
+
+
+def strip_wrappers(words: List[str]) -> List[str]:
+    """A command's words from the program on: wrappers and NAME=value assignments dropped"""
+    while words and (words[0] in COMMAND_WRAPPERS or '=' in words[0]):
+        words = words[1:]
+    return words
+
+
+def _analyze_command(step: PlanStep, argv: List[str], cwd: str, installed: Set[str]):
+    # Redirections first; what is left is the command and its arguments
+    args: List[str] = []
+    i = 0
+    while i < len(argv):
+        token = argv[i]
+        if token in ('>', '>>', '&>', '>|') and i + 1 < len(argv):
+            step.write_path(argv[i + 1], cwd)
+            i += 2
+        elif token == '<' and i + 1 < len(argv):
+            step.read_path(argv[i + 1], cwd)
+            i += 2
+        elif token in ('<<', '<<-', '>&', '<&') and i + 1 < len(argv):
+            i += 2
+        else:
+            args.append(token)
+            i += 1
+
+    args = strip_wrappers(args)
+    if not args:
+        return
+
+    name = os.path.basename(args[0])
+    paths = [arg for arg in args[1:] if not arg.startswith('-')]
+
+    if name in CONTROL_WORDS or name.endswith('()') or name in STATE_COMMANDS:
+        step.barrier = True
+        return
+
+    # Anything that uses a package installed earlier in the plan waits for it
+    for token in [name] + paths:
+        if token in installed:
+            step.reads.add('package:' + token)
+
+    if name in INSTALLERS:
+        subcommands = INSTALLERS[name]
+        if subcommands is None or (paths and paths[0] in subcommands):
+            packages = paths if subcommands is None else paths[1:]
+            step.writes.add('packages:' + name)
+            for package in packages:
+                step.writes.add('package:' + package)
+                installed.add(package)
+            return
+    if name == 'git':
+        step.reads.add('git')
+        if not paths or paths[0] not in READ_ONLY_GIT:
+            step.writes.add('git')
+        return
+    if name in NO_FILES:
+        return
+    if name in READ_ONLY:
+        for path in paths or ['.']:
+            step.read_path(path, cwd)
+        return
+    if name in WRITES_ARGS:
+        for path in paths:
+            step.write_path(path, cwd)
+        return
+    if name in ('cp', 'ln', 'mv') and len(paths) >= 2:
+        for path in paths[:-1]:
+            (step.write_path if name == 'mv' else step.read_path)(path, cwd)
+        step.write_path(paths[-1], cwd)
+        return
+    if name == 'sed' and '-i' in args:
+        for path in paths[1:]:
+            step.write_path(path, cwd)
+        return
+
+    # Unknown tools (builds, test runners, scripts) may touch anything
+    step.reads.add(ANY)
+    step.writes.add(ANY)
+
+
+def analyze_step(step: PlanStep, shell: bool, cwd: str, installed: Set[str]) -> PlanStep:
+    """Infer what a step reads and writes; shell is False for non-shell code blocks"""
+    if not shell:
+        step.barrier = True
+        return step
+    commands = _split_commands(step.content)
+    if commands is None:
+        step.barrier = True
+        return step
+    for argv in commands:
+        _analyze_command(step, argv, cwd, installed)
+        if step.barrier:
+            break
+    return step
+
+
+def directory_after(step: PlanStep, cwd: Optional[str]) -> Optional[str]:
+    """The plan's directory once a step has run; None when it cannot be known"""
+    if step.kind != COMMAND or step.cwd is not None:
+        # Code blocks run in a process of their own, steps with a cwd in a subshell
+        return cwd
+    commands = _split_commands(step.content)
+    if commands is None:
+        return None if re.search(r'\b(?:cd|pushd|popd)\b', step.content) else cwd
+    if len(commands) == 1 and commands[0][0] == 'cd' and len(commands[0]) <= 2:
+        # A plain `cd DIR`, which the terminal follows
+        target = os.path.expanduser(commands[0][1] if len(commands[0]) == 2 else '~')
+        if GLOB_CHARS.search(target) or (cwd is None and not os.path.isabs(target)):
+            return None
+        return os.path.normpath(os.path.join(cwd or '/', target))
+    if any(argv[0] in DIRECTORY_COMMANDS for argv in commands):
+        # e.g. `cd build && make`, which moves a persistent shell
+        return None
+    return cwd
+
+
+def build_dag(steps: List[PlanStep], is_shell: Callable[[PlanStep], bool], cwd: str) -> List[PlanStep]:
+    """Analyze steps and link each one to the earlier steps it must wait for.
+
+    Dependencies already in a step's deps (declared by a JSON plan) are kept.
+    Paths are resolved against the directory a `cd` barrier moved the plan
+    to; once that cannot be worked out, later steps may touch anything.
+    """
+    installed: Set[str] = set()
+    last_barrier: Optional[int] = None
+    current: Optional[str] = cwd
+    for position, step in enumerate(steps):
+        analyze_step(step, step.kind == COMMAND or is_shell(step), step.cwd or current or cwd, installed)
+        if step.cwd is None and current is None:
+            step.reads.add(ANY)
+            step.writes.add(ANY)
+        earlier = steps[:position]
+        if step.barrier:
+            step.deps = {other.index for other in earlier}
+            last_barrier = step.index
+            current = directory_after(step, current)
+            continue
+        if last_barrier is not None:
+            step.deps.add(last_barrier)
+        for other in earlier:
+            if (_any_conflict(other.writes, step.reads) or _any_conflict(other.writes, step.writes)
+                    or _any_conflict(other.reads, step.writes)):
+                step.deps.add(other.index)
+    return steps
+
+
+def run_dag(steps: List[PlanStep], run: Callable[[PlanStep], List[str]], max_workers: int = 4) -> List[List[str]]:
+    """Run steps on a bounded pool as their dependencies finish.
+
+    Results are returned in step order regardless of completion order.
+    Steps whose dependencies cannot be met run in step order.
+    """
+    results: Dict[int, List[str]] = {}
+    if max_workers <= 1:
+        for step in steps:
+            results[step.index] = run(step)
+        return [results[step.index] for step in steps]
+
+    pending = {step.index: step for step in steps}
+    finished: Set[int] = set()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        running = {}
+        while pending or running:
+            for index, step in list(pending.items()):
+                if step.deps <= finished:
+                    # Each step in its own copy of the caller's context, so its spans nest under the plan's
+                    running[pool.submit(contextvars.copy_context().run, run, step)] = index
+                    del pending[index]
+            if not running:
+                # Dependencies that can never finish (a cycle, or a step not in the
+                # plan): run the earliest waiting step rather than wait forever
+                index = min(pending)
+                running[pool.submit(contextvars.copy_context().run, run, pending.pop(index))] = index
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = [f"Error executing step: {str(e)}"]
+                finished.add(index)
+    return [results[step.index] for step in steps]
@@ -0,0 +1,415 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from . import streaming, tracing
+from .fair_queue import FairGate
+from .streaming import StreamEvent
+
+if TYPE_CHECKING:
+    from .core import VirtualVibeCoder
+    from .llm_cache import ResponseCache
+    from .ollama_chat import KeepAlive
+    from .router import ModelRouter
+    from .sessions import SessionStore
+    from .verify import VerifyCache
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# Events buffered per request before a slow client holds up its session
+EVENT_BUFFER = 256
+
+REASONS = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    409: 'Conflict', 413: 'Payload Too Large', 503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class Session:
+    def __init__(self, coder: "VirtualVibeCoder"):
+        self.coder = coder
+        self.id = coder.session_id
+        self.busy = False
+        # Set when the session is closed mid-request; the coder is closed once it finishes
+        self.closing = False
+        self.last_used = time.monotonic()
+
+
+def sse(event: StreamEvent) -> bytes:
+    """A stream event as one server-sent event"""
+    data = json.dumps({'text': event.text, 'step': event.step})
+    return f"event: {event.kind}\ndata: {data}\n\n".encode('utf-8')
+
+
+class VibeServer:
+    """HTTP front end that serves many developers from one process.
+
+    Endpoints:
+      GET    /health                  liveness, sessions and model queue state
+      GET    /metrics                 Prometheus text
+      GET    /sessions                open sessions
+      POST   /sessions                new session; {"resume": id} continues a stored one
+      DELETE /sessions/<id>           close a session
+      POST   /sessions/<id>/requests  run {"request": "..."}, answered with
+                                      server-sent events, one per StreamEvent
+
+    Every session has its own VirtualVibeCoder and terminal and runs one
+    request at a time on a worker thread. All sessions share the local
+    model through the FairGate: generation is served round-robin across
+    sessions, and a full queue turns new requests away with 503 and
+    Retry-After rather than letting latency grow without bound.
+    """
+
+    def __init__(self, coder_factory: Callable[[Optional[str]], "VirtualVibeCoder"], gate: FairGate,
+                 max_sessions: int = 32, idle_timeout: float = 3600.0):
+        self.coder_factory = coder_factory
+        self.gate = gate
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: Dict[str, Session] = {}
+        # Sessions being created count against max_sessions already;
+        # the ids of those being resumed cannot be opened twice
+        self._pending = 0
+        self._resuming: Set[str] = set()
+        self.requests_total: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_sessions + 1, thread_name_prefix='vibe-session')
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def start(self, host: str = '0.0.0.0', port: int = 8000):
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_HEADER_BYTES)
+        self._reaper = asyncio.create_task(self._reap_idle())
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in list(self.sessions.values()):
+            self._close_session(session)
+        self._executor.shutdown(wait=False)
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout))
+            cutoff = time.monotonic() - self.idle_timeout
+            for session in list(self.sessions.values()):
+                if not session.busy and session.last_used < cutoff:
+                    self._close_session(session)
+
+    def _close_session(self, session: Session):
+        self.sessions.pop(session.id, None)
+        if session.busy:
+            # Its plan is still using the terminal
+            session.closing = True
+            return
+        try:
+            session.coder.close()
+        except Exception:
+            pass
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            await self._route(method, path, body, writer)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {'error': e.message}, e.headers)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body is limited to {MAX_BODY_BYTES} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), urlsplit(target).path, body
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['health']:
+            self._allow(method, 'GET')
+            await self._send_json(writer, 200, self.health())
+        elif parts == ['metrics']:
+            self._allow(method, 'GET')
+            await self._send(writer, 200, self.metrics_text().encode('utf-8'), 'text/plain; version=0.0.4')
+        elif parts == ['sessions']:
+            self._allow(method, 'GET', 'POST')
+            if method == 'GET':
+                await self._send_json(writer, 200, {'sessions': [self._describe(s) for s in self.sessions.values()]})
+            else:
+                await self._create_session(self._json(body), writer)
+        elif len(parts) == 2 and parts[0] == 'sessions':
+            self._allow(method, 'GET', 'DELETE')
+            session = self._session(parts[1])
+            if method == 'DELETE':
+                self._close_session(session)
+            await self._send_json(writer, 200, self._describe(session))
+        elif len(parts) == 3 and parts[0] == 'sessions' and parts[2] == 'requests':
+            self._allow(method, 'POST')
+            await self._run_request(self._session(parts[1]), self._json(body), writer)
+        else:
+            raise HTTPError(404, f"No such endpoint: {path}")
+
+    @staticmethod
+    def _allow(method: str, *allowed: str):
+        if method not in allowed:
+            raise HTTPError(405, f"Use {' or '.join(allowed)}", {'Allow': ', '.join(allowed)})
+
+    @staticmethod
+    def _json(body: bytes) -> Dict[str, Any]:
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    def _session(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(404, f"Unknown session {session_id}")
+        return session
+
+    @staticmethod
+    def _describe(session: Session) -> Dict[str, Any]:
+        return {'session': session.id, 'busy': session.busy,
+                'messages': len(session.coder.conversation_history)}
+
+    async def _create_session(self, data: Dict[str, Any], writer: asyncio.StreamWriter):
+        if len(self.sessions) + self._pending >= self.max_sessions:
+            raise HTTPError(503, "Too many open sessions", {'Retry-After': '30'})
+        resume = data.get('resume')
+        if resume is not None and (resume in self.sessions or resume in self._resuming):
+            raise HTTPError(409, f"Session {resume} is already open")
+        # Reserve the slot (and the resumed id) before waiting for the coder
+        self._pending += 1
+        if resume is not None:
+            self._resuming.add(resume)
+        loop = asyncio.get_running_loop()
+        try:
+            coder = await loop.run_in_executor(self._executor, self.coder_factory, resume)
+        except KeyError as e:
+            raise HTTPError(404, str(e.args[0]) if e.args else "Unknown session")
+        finally:
+            self._pending -= 1
+            self._resuming.discard(resume)
+        session = Session(coder)
+        self.sessions[session.id] = session
+        await self._send_json(writer, 201, self._describe(session))
+
+    async def _run_request(self, session: Session, data: Dict[str, Any], writer: asyncio.StreamWriter):
+        text = data.get('request')
+        if not isinstance(text, str) or not text.strip():
+            raise HTTPError(400, 'Body must have a non-empty "request" string')
+        if session.busy:
+            raise HTTPError(409, "The session is still running a request")
+        if self.gate.stats()['waiting'] >= self.gate.max_waiting:
+            self._count('rejected')
+            raise HTTPError(503, "The model queue is full", {'Retry-After': '5'})
+
+        session.busy = True
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                         b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            self._count(await self._stream(session, text, writer))
+        finally:
+            session.busy = False
+            session.last_used = time.monotonic()
+            if session.closing:
+                self._close_session(session)
+
+    async def _stream(self, session: Session, text: str, writer: asyncio.StreamWriter) -> str:
+        """Run a request on a worker thread, forwarding its events; returns the outcome"""
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[Optional[StreamEvent]]" = asyncio.Queue(EVENT_BUFFER)
+        disconnected = threading.Event()
+
+        def put(event: Optional[StreamEvent]):
+            asyncio.run_coroutine_threadsafe(events.put(event), loop).result()
+
+        def produce():
+            stream = session.coder.stream_request(text)
+            try:
+                for event in stream:
+                    put(event)
+                    if disconnected.is_set():
+                        break
+            except Exception as e:
+                put(StreamEvent(streaming.ERROR, f"Error processing request: {str(e)}"))
+            finally:
+                stream.close()
+                put(None)
+
+        producer = loop.run_in_executor(self._executor, produce)
+        outcome = 'error'
+        # Keep draining after a disconnect so the producer never blocks on a full queue
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            if event.kind == streaming.DONE:
+                outcome = 'ok'
+            if disconnected.is_set():
+                continue
+            try:
+                writer.write(sse(event))
+                await writer.drain()
+            except ConnectionError:
+                disconnected.set()
+        await producer
+        return 'disconnected' if disconnected.is_set() else outcome
+
+    def _count(self, outcome: str):
+        self.requests_total[outcome] = self.requests_total.get(outcome, 0) + 1
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            'status': 'ok',
+            'sessions': len(self.sessions),
+            'busy_sessions': sum(session.busy for session in self.sessions.values()),
+            'model_queue': self.gate.stats(),
+        }
+
+    def metrics_text(self) -> str:
+        queue = self.gate.stats()
+        lines: List[str] = [
+            "# HELP vibe_coder_server_sessions Open sessions.",
+            "# TYPE vibe_coder_server_sessions gauge",
+            f"vibe_coder_server_sessions {len(self.sessions)}",
+            "# HELP vibe_coder_server_requests_total Finished requests by outcome.",
+            "# TYPE vibe_coder_server_requests_total counter",
+        ]
+        lines += [f'vibe_coder_server_requests_total{{outcome="{outcome}"}} {count}'
+                  for outcome, count in sorted(self.requests_total.items())]
+        for name, kind, help_text in (
+            ('active', 'gauge', "Generations holding the model."),
+            ('waiting', 'gauge', "Generations waiting for the model."),
+            ('rejected_total', 'counter', "Generations turned away by a full queue."),
+            ('wait_seconds_total', 'counter', "Time spent waiting for the model."),
+        ):
+            lines += [f"# HELP vibe_coder_model_queue_{name} {help_text}",
+                      f"# TYPE vibe_coder_model_queue_{name} {kind}",
+                      f"vibe_coder_model_queue_{name} {queue[name]}"]
+        text = '\n'.join(lines) + '\n'
+        tracer = tracing.get_tracer()
+        if tracer.enabled:
+            text += tracer.prometheus_text()
+        return text
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: Any,
+                         headers: Optional[Dict[str, str]] = None):
+        await self._send(writer, status, json.dumps(data).encode('utf-8'), 'application/json', headers)
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str,
+                    headers: Optional[Dict[str, str]] = None):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+
+def default_workspace_root() -> str:
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_home, 'vibe_coder', 'sessions')
+
+
+def run_server(host: str = '0.0.0.0', port: int = 8000, model_name: str = "deepseek-r1:8b",
+               model_slots: int = 1, max_waiting: int = 32, max_sessions: int = 32,
+               session_store: Optional["SessionStore"] = None, workspace_root: Optional[str] = None,
+               rollback_failed_plans: bool = False, verify_plans: bool = False,
+               verify_cache: Optional["VerifyCache"] = None, router: Optional["ModelRouter"] = None,
+               json_plans: bool = False, persistent_shell: bool = False,
+               temperature: Optional[float] = None, seed: Optional[int] = None,
+               cache: Optional["ResponseCache"] = None, backend: str = "completion",
+               keep_alive: "KeepAlive" = None, warm_up: bool = False,
+               on_ready: Optional[Callable[[VibeServer], None]] = None):
+    """Serve until interrupted; all sessions share one gate in front of the model.
+    
+    Every session works in its own subdirectory of workspace_root
+    (default: $XDG_DATA_HOME/vibe_coder/sessions), named after it, which
+    a resumed session gets back. A router and a
+    response cache are shared by all sessions, so the router's metrics
+    cover the whole server. With warm_up, the model is loaded once at
+    start-up rather than by every new session.
+    """
+    from .core import VirtualVibeCoder
+    gate = FairGate(model_slots, max_waiting)
+    if warm_up:
+        from .ollama_chat import warm_up as start_warm_up
+        from .prompts import VIBE_CODER_SYSTEM_PROMPT
+        start_warm_up(model_name, VIBE_CODER_SYSTEM_PROMPT, keep_alive=keep_alive or "30m")
+
+    def new_coder(resume: Optional[str]) -> VirtualVibeCoder:
+        if resume is not None and session_store is None:
+            raise KeyError("Session history is disabled on this server")
+        coder = VirtualVibeCoder(model_name=model_name, model_gate=gate, session_store=session_store,
+                                 session_id=resume, rollback_failed_plans=rollback_failed_plans,
+                                 verify_plans=verify_plans, verify_cache=verify_cache, router=router,
+                                 json_plans=json_plans, persistent_shell=persistent_shell,
+                                 temperature=temperature, seed=seed, cache=cache, backend=backend,
+                                 keep_alive=keep_alive)
+        # The terminal is created on first use, so it starts there
+        coder.workdir = os.path.join(os.path.abspath(workspace_root or default_workspace_root()), coder.session_id)
+        os.makedirs(coder.workdir, exist_ok=True)
+        return coder
+
+    server = VibeServer(new_coder, gate, max_sessions)
+
+    async def serve():
+        await server.start(host, port)
+        if on_ready is not None:
+            on_ready(server)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
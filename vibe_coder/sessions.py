@@ -0,0 +1,223 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from .context import Message, approximate_tokens
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "id TEXT PRIMARY KEY, created REAL NOT NULL, model TEXT, cwd TEXT)",
+    "CREATE TABLE IF NOT EXISTS turns ("
+    "id INTEGER PRIMARY KEY, session TEXT NOT NULL, role TEXT NOT NULL, "
+    "content TEXT NOT NULL, request TEXT, created REAL NOT NULL, duration REAL)",
+    "CREATE INDEX IF NOT EXISTS turns_session ON turns (session, id)",
+    "CREATE TABLE IF NOT EXISTS commands ("
+    "id INTEGER PRIMARY KEY, session TEXT NOT NULL, command TEXT NOT NULL, "
+    "exit_code INTEGER NOT NULL, duration REAL NOT NULL, cwd TEXT, "
+    "stdout_bytes INTEGER NOT NULL, stderr_bytes INTEGER NOT NULL, created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS commands_session ON commands (session, id)",
+)
+
+# Full-text indexes over turns and commands, kept current by triggers
+FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(content, content='turns', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS turns_fts_insert AFTER INSERT ON turns BEGIN "
+    "INSERT INTO turns_fts (rowid, content) VALUES (new.id, new.content); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS commands_fts USING fts5(command, content='commands', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS commands_fts_insert AFTER INSERT ON commands BEGIN "
+    "INSERT INTO commands_fts (rowid, command) VALUES (new.id, new.command); END",
+)
+
+
+def default_db_path() -> str:
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_home, 'vibe_coder', 'sessions.db')
+
+
+def new_session_id() -> str:
+    """Sortable by start time, unique across concurrent processes"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class SessionInfo(NamedTuple):
+    id: str
+    created: float
+    model: Optional[str]
+    cwd: Optional[str]
+    turns: int
+    title: str
+
+
+class SearchHit(NamedTuple):
+    session: str
+    kind: str  # 'user', 'assistant' or 'command'
+    text: str
+    created: float
+
+
+class SessionStore:
+    """Append-only record of conversation turns and executed commands.
+
+    Every append is committed on its own, so a crash loses at most the step
+    that was running. The database is in WAL mode: an append writes one
+    record to the end of the log, and readers never block the writer.
+    Resuming reads a session newest first and stops once the context
+    budget is full, so it costs the same however long the session grew.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or default_db_path()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit: each statement is its own transaction
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Committed appends survive a crash of the process; only a power
+        # failure can lose the last few
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        try:
+            for statement in FTS_SCHEMA:
+                self._db.execute(statement)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE scans
+            self.full_text = False
+
+    def open_session(self, session_id: str, model: Optional[str] = None, cwd: Optional[str] = None):
+        with self._lock:
+            self._db.execute("INSERT OR IGNORE INTO sessions (id, created, model, cwd) VALUES (?, ?, ?, ?)",
+                             (session_id, time.time(), model, cwd))
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def latest_session(self) -> Optional[str]:
+        """The session with the most recent turn"""
+        with self._lock:
+            row = self._db.execute("SELECT session FROM turns ORDER BY id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def append_turn(self, session_id: str, role: str, content: str, request: Optional[str] = None,
+                    duration: Optional[float] = None):
+        """Record one message; request is the user's own words when content wraps them"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO turns (session, role, content, request, created, duration) VALUES (?, ?, ?, ?, ?, ?)",
+                (session_id, role, content, request, time.time(), duration)
+            )
+
+    def append_command(self, session_id: str, command: str, exit_code: int, duration: float,
+                       cwd: Optional[str] = None, stdout_bytes: int = 0, stderr_bytes: int = 0):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO commands (session, command, exit_code, duration, cwd, stdout_bytes, stderr_bytes, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, command, exit_code, duration, cwd, stdout_bytes, stderr_bytes, time.time())
+            )
+
+    def tail(self, session_id: str, budget_tokens: int,
+             count_tokens: Callable[[str], int] = approximate_tokens) -> List[Message]:
+        """The most recent answered exchanges of a session that fit the budget, oldest first.
+
+        A request without a reply (the process died while handling it) is
+        left out, as it would have been from the in-memory history.
+        """
+        kept: List[Message] = []
+        reply: Optional[Message] = None
+        with self._lock:
+            rows = self._db.execute("SELECT role, content FROM turns WHERE session = ? ORDER BY id DESC",
+                                    (session_id,))
+            for role, content in rows:
+                if role == 'assistant':
+                    reply = {"role": role, "content": content}
+                    continue
+                if reply is None:
+                    continue
+                cost = count_tokens(content) + count_tokens(reply["content"])
+                if cost > budget_tokens:
+                    break
+                budget_tokens -= cost
+                kept += [reply, {"role": role, "content": content}]
+                reply = None
+            rows.close()
+        kept.reverse()
+        return kept
+
+    def interrupted_request(self, session_id: str) -> Optional[str]:
+        """The last request of a session if it never got a reply"""
+        with self._lock:
+            row = self._db.execute("SELECT role, COALESCE(request, content) FROM turns WHERE session = ? "
+                                   "ORDER BY id DESC LIMIT 1", (session_id,)).fetchone()
+        return row[1] if row and row[0] == 'user' else None
+
+    def commands(self, session_id: str, limit: int = 50) -> List[Dict]:
+        """The most recent commands of a session, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT command, exit_code, duration, cwd, stdout_bytes, stderr_bytes, created FROM commands "
+                "WHERE session = ? ORDER BY id DESC LIMIT ?", (session_id, limit)
+            ).fetchall()
+        keys = ('command', 'exit_code', 'duration', 'cwd', 'stdout_bytes', 'stderr_bytes', 'created')
+        return [dict(zip(keys, row)) for row in reversed(rows)]
+
+    def sessions(self, limit: int = 20) -> List[SessionInfo]:
+        """Sessions with at least one turn, most recently started first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT s.id, s.created, s.model, s.cwd, "
+                "(SELECT COUNT(*) FROM turns t WHERE t.session = s.id), "
+                "(SELECT COALESCE(request, content) FROM turns t WHERE t.session = s.id AND role = 'user' "
+                "ORDER BY id LIMIT 1) "
+                "FROM sessions s ORDER BY s.created DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [SessionInfo(id, created, model, cwd, turns, (title or '').strip().split('\n')[0][:80])
+                for id, created, model, cwd, turns, title in rows if turns]
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """Turns and commands matching all words of the query, newest first"""
+        words = query.split()
+        if not words:
+            return []
+        with self._lock:
+            if self.full_text:
+                # Each word quoted, so user input is never parsed as FTS syntax
+                match = ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+                turns = self._db.execute(
+                    "SELECT t.session, t.role, snippet(turns_fts, 0, '[', ']', '...', 12), t.created "
+                    "FROM turns_fts JOIN turns t ON t.id = turns_fts.rowid WHERE turns_fts MATCH ? "
+                    "ORDER BY rank LIMIT ?", (match, limit)
+                ).fetchall()
+                commands = self._db.execute(
+                    "SELECT c.session, 'command', c.command, c.created "
+                    "FROM commands_fts JOIN commands c ON c.id = commands_fts.rowid WHERE commands_fts MATCH ? "
+                    "ORDER BY rank LIMIT ?", (match, limit)
+                ).fetchall()
+            else:
+                like = ' AND '.join(['{0} LIKE ?'] * len(words))
+                patterns = [f"%{word}%" for word in words]
+                turns = self._db.execute(
+                    f"SELECT session, role, substr(content, 1, 200), created FROM turns "
+                    f"WHERE {like.format('content')} ORDER BY id DESC LIMIT ?", patterns + [limit]
+                ).fetchall()
+                commands = self._db.execute(
+                    f"SELECT session, 'command', command, created FROM commands "
+                    f"WHERE {like.format('command')} ORDER BY id DESC LIMIT ?", patterns + [limit]
+                ).fetchall()
+        hits = [SearchHit(*row) for row in turns + commands]
+        hits.sort(key=lambda hit: hit.created, reverse=True)
+        return hits[:limit]
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
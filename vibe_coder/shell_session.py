@@ -0,0 +1,219 @@
+import os
+import selectors
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from .capture import CommandResult, OutputCapture
+
+
+def ansi_c_quote(text: str) -> str:
+    """Quote text as a bash $'...' string that survives any content"""
+    out = []
+    for ch in text:
+        if ch == '\\':
+            out.append('\\\\')
+        elif ch == "'":
+            out.append("\\'")
+        elif ch == '\n':
+            out.append('\\n')
+        elif ch == '\t':
+            out.append('\\t')
+        elif ord(ch) < 0x20 or ord(ch) == 0x7f:
+            out.append('\\x%02x' % ord(ch))
+        else:
+            out.append(ch)
+    return "$'" + ''.join(out) + "'"
+
+
+def _descendants(pid: int) -> List[int]:
+    """All descendant pids of a process, children first"""
+    found = []
+    pending = [pid]
+    while pending:
+        parent = pending.pop()
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except (OSError, ValueError):
+            children = []
+        found.extend(children)
+        pending.extend(children)
+    return found
+
+
+class _SentinelReader:
+    """Feeds a pipe into a capture until the end-of-command sentinel.
+
+    Only the few bytes that could be the start of a sentinel split across
+    reads are held back; the rest goes straight to the capture. On stdout
+    the sentinel is followed by a trailer line (exit code and cwd).
+    """
+
+    def __init__(self, capture: OutputCapture, sentinel: bytes, has_trailer: bool):
+        self.capture = capture
+        self.sentinel = sentinel
+        self.has_trailer = has_trailer
+        self.pending = bytearray()
+        self.trailer: Optional[bytes] = None
+        self.done = False
+
+    def feed(self, chunk: bytes):
+        self.pending += chunk
+        if self.trailer is None:
+            index = self.pending.find(self.sentinel)
+            if index < 0:
+                keep = len(self.sentinel) - 1
+                if len(self.pending) > keep:
+                    self.capture.feed(bytes(self.pending[:len(self.pending) - keep]))
+                    del self.pending[:len(self.pending) - keep]
+                return
+            self.capture.feed(bytes(self.pending[:index]))
+            del self.pending[:index + len(self.sentinel)]
+            self.trailer = b''
+        self.trailer += bytes(self.pending)
+        self.pending.clear()
+        self.done = self.trailer.endswith(b'\n') or not self.has_trailer
+
+    def finish(self):
+        """The pipe closed before the sentinel arrived"""
+        if self.trailer is None:
+            self.capture.feed(bytes(self.pending))
+            self.pending.clear()
+        self.done = True
+
+
+class ShellSession:
+    """A long-lived bash process that runs one command at a time.
+
+    Each command is eval'ed in the same shell, so cd, exported variables,
+    venv activation and aliases persist. Output is framed by a per-command
+    sentinel on both stdout and stderr, which carries the exit code and
+    the shell's working directory.
+    """
+
+    # Time allowed for the shell to report back after a timed out command is killed
+    KILL_GRACE = 2.0
+
+    def __init__(self, cwd: Optional[str] = None, shell: str = '/bin/bash'):
+        self.cwd = cwd or os.getcwd()
+        self.shell = shell
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._proc = subprocess.Popen(
+            [self.shell, '--noprofile', '--norc'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True
+        )
+
+    def is_alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def close(self):
+        """Terminate the shell and anything it started"""
+        if self._proc is None:
+            return
+        if self._proc.poll() is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        self._proc.wait()
+        for pipe in (self._proc.stdin, self._proc.stdout, self._proc.stderr):
+            pipe.close()
+        self._proc = None
+
+    def run(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
+        """Run a command in the session and return (stdout, stderr, exit code)"""
+        return self.run_captured(command, timeout, OutputCapture(), OutputCapture()).output()
+
+    def run_captured(self, command: str, timeout: int, stdout: OutputCapture,
+                     stderr: OutputCapture) -> CommandResult:
+        """Run a command in the session, streaming its output into bounded captures"""
+        with self._lock:
+            if not self.is_alive():
+                self.close()
+                self._start()
+            return self._run(command, timeout, stdout, stderr)
+
+    def _run(self, command: str, timeout: int, stdout: OutputCapture, stderr: OutputCapture) -> CommandResult:
+        marker = f"__VIBE_{uuid.uuid4().hex}__".encode()
+        script = (
+            f"eval {ansi_c_quote(command)} < /dev/null\n"
+            "__vibe_rc=$?\n"
+            f"printf '\\n%s %d %s\\n' '{marker.decode()}' \"$__vibe_rc\" \"$PWD\"\n"
+            f"printf '\\n%s\\n' '{marker.decode()}' >&2\n"
+        )
+        try:
+            self._proc.stdin.write(script.encode('utf-8'))
+            self._proc.stdin.flush()
+        except OSError as e:
+            self.close()
+            return CommandResult.failure(f"Error executing command: {str(e)}")
+
+        stdout_end = b'\n' + marker + b' '
+        stderr_end = b'\n' + marker + b'\n'
+        streams = {
+            self._proc.stdout: _SentinelReader(stdout, stdout_end, has_trailer=True),
+            self._proc.stderr: _SentinelReader(stderr, stderr_end, has_trailer=False),
+        }
+
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        with selectors.DefaultSelector() as selector:
+            for pipe in streams:
+                selector.register(pipe, selectors.EVENT_READ)
+
+            while not all(reader.done for reader in streams.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    if timed_out:
+                        # The shell itself is stuck (e.g. a builtin loop), start over
+                        self.close()
+                        return CommandResult.failure(f"Command timed out after {timeout} seconds")
+                    timed_out = True
+                    self._kill_children()
+                    deadline = time.monotonic() + self.KILL_GRACE
+                    continue
+
+                for key, _ in selector.select(remaining):
+                    pipe = key.fileobj
+                    chunk = os.read(pipe.fileno(), 65536)
+                    if not chunk:
+                        # The shell exited (e.g. the command ran `exit`)
+                        selector.unregister(pipe)
+                        streams[pipe].finish()
+                        continue
+                    streams[pipe].feed(chunk)
+
+        trailer = streams[self._proc.stdout].trailer
+        if trailer is None:
+            # The session is gone; report what the command printed
+            code = self._proc.wait()
+            self.close()
+            return CommandResult.from_captures(stdout, stderr, code)
+
+        code_text, _, cwd = trailer.decode('utf-8', errors='ignore').rstrip('\n').partition(' ')
+        self.cwd = cwd or self.cwd
+
+        if timed_out:
+            stdout.close()
+            stderr.close()
+            return CommandResult.failure(f"Command timed out after {timeout} seconds")
+        return CommandResult.from_captures(stdout, stderr, int(code_text))
+
+    def _kill_children(self):
+        """Kill whatever the shell is running, but not the shell itself"""
+        for pid in reversed(_descendants(self._proc.pid)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
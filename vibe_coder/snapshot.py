@@ -0,0 +1,223 @@
+import errno
+import fcntl
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from .workspace import SNAPSHOT_PREFIX, TreeWalker, worth_indexing
+
+# ioctl that makes a file share another's blocks copy-on-write (btrfs, xfs, bcachefs)
+FICLONE = 0x40049409
+
+# Errors meaning the filesystem cannot reflink, as opposed to a failing file
+NO_REFLINK = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EXDEV, errno.EBADF, errno.ENOSYS}
+
+
+class RollbackResult(NamedTuple):
+    restored: int
+    removed: int
+    # Files rewritten in place while their snapshot copy was a hard link
+    lost: List[str]
+
+    def describe(self) -> str:
+        text = f"restored {self.restored} files, removed {self.removed} new files"
+        if self.lost:
+            text += f"; could not restore {', '.join(self.lost)}"
+        return text
+
+
+class _Entry(NamedTuple):
+    # The live file when the snapshot was taken
+    ino: int
+    size: int
+    mtime_ns: int
+    # The snapshot's copy of it; equal to the above for hard links
+    copy_size: int
+    copy_mtime_ns: int
+
+
+class Snapshot:
+    """A cheap copy of a directory tree to roll a failed plan back to.
+
+    Files are reflinked where the filesystem supports it, which shares
+    blocks copy-on-write. Elsewhere small files are copied, up to
+    copy_bytes in total, and the rest hard-linked: replacing a file (as
+    write_file, the materializer and most editors do) leaves the link
+    intact, but rewriting a hard-linked file in place changes the
+    snapshot too, and rollback reports it as lost instead of restoring it.
+
+    Only files the workspace index would see are covered: .gitignore'd
+    paths, .git and dependency directories are neither saved nor touched.
+    The copies are kept next to root, where plan steps such as
+    `git add -A` or `tar czf x.tgz .` do not see them, unless the parent
+    is not writable or on another filesystem (links need the same one).
+    Then they go in a hidden directory inside root, excluded from git.
+    Rolling back stats the tree once and then does work in proportion to
+    the files that changed, were added or were removed.
+    """
+
+    def __init__(self, root: str, store: str, entries: Dict[str, _Entry], dirs: Set[str], max_files: int):
+        self.root = root
+        self.store = store
+        self.entries = entries
+        self.dirs = dirs
+        self.max_files = max_files
+
+    @classmethod
+    def take(cls, root: str, max_files: int = 20000, copy_bytes: int = 32 * 1024 * 1024,
+             copy_file_bytes: int = 256 * 1024) -> Optional["Snapshot"]:
+        """Snapshot root, or None when it is too big (or / or the home directory)"""
+        root = os.path.abspath(root)
+        if not worth_indexing(root):
+            return None
+        walker = TreeWalker(root, max_files + 1)
+        listing = list(walker.walk())
+        if sum(len(files) for _, _, files in listing) > max_files:
+            return None
+        store = tempfile.mkdtemp(prefix=f"{SNAPSHOT_PREFIX}{os.path.basename(root)}-", dir=_store_parent(root))
+        snapshot = cls(root, store, {}, set(), max_files)
+        reflink = True
+        try:
+            for directory, _, files in listing:
+                snapshot.dirs.add(directory)
+                os.makedirs(os.path.join(store, directory), exist_ok=True)
+                for name in files:
+                    path = os.path.join(directory, name) if directory else name
+                    source, target = os.path.join(root, path), os.path.join(store, path)
+                    try:
+                        st = os.lstat(source)
+                    except OSError:
+                        continue
+                    if reflink:
+                        reflink = _reflink(source, target)
+                    if not reflink:
+                        if st.st_size <= copy_file_bytes and copy_bytes >= st.st_size:
+                            shutil.copy2(source, target)
+                            copy_bytes -= st.st_size
+                        else:
+                            _link(source, target)
+                    copy = os.lstat(target)
+                    snapshot.entries[path] = _Entry(st.st_ino, st.st_size, st.st_mtime_ns,
+                                                    copy.st_size, copy.st_mtime_ns)
+        except BaseException:
+            snapshot.discard()
+            raise
+        return snapshot
+
+    def rollback(self) -> RollbackResult:
+        """Put the tree back as it was; the snapshot is discarded afterwards"""
+        restored = removed = 0
+        lost: List[str] = []
+        current: Dict[str, os.stat_result] = {}
+        current_dirs: List[str] = []
+        # A plan may have added many files; look at a few more than were saved
+        for directory, _, files in TreeWalker(self.root, self.max_files * 2).walk():
+            current_dirs.append(directory)
+            for name in files:
+                path = os.path.join(directory, name) if directory else name
+                try:
+                    current[path] = os.lstat(os.path.join(self.root, path))
+                except OSError:
+                    pass
+
+        for path, st in current.items():
+            if path not in self.entries:
+                try:
+                    os.unlink(os.path.join(self.root, path))
+                    removed += 1
+                except OSError:
+                    pass
+        for directory in sorted(set(current_dirs) - self.dirs, reverse=True):
+            try:
+                os.rmdir(os.path.join(self.root, directory))
+            except OSError:
+                # Still holds ignored files
+                pass
+
+        for path, entry in self.entries.items():
+            st = current.get(path)
+            if st is not None and (st.st_ino, st.st_size, st.st_mtime_ns) == (entry.ino, entry.size, entry.mtime_ns):
+                continue
+            copy = os.path.join(self.store, path)
+            try:
+                copy_st = os.lstat(copy)
+            except OSError:
+                lost.append(path)
+                continue
+            if (copy_st.st_size, copy_st.st_mtime_ns) != (entry.copy_size, entry.copy_mtime_ns):
+                lost.append(path)
+                continue
+            target = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.rollback-{uuid.uuid4().hex[:8]}"
+            _link(copy, tmp)
+            os.replace(tmp, target)
+            restored += 1
+
+        self.discard()
+        return RollbackResult(restored, removed, sorted(lost))
+
+    def discard(self):
+        shutil.rmtree(self.store, ignore_errors=True)
+
+
+def _store_parent(root: str) -> str:
+    parent = os.path.dirname(root)
+    try:
+        if (parent != root and os.access(parent, os.W_OK | os.X_OK)
+                and os.stat(parent).st_dev == os.stat(root).st_dev):
+            return parent
+    except OSError:
+        pass
+    _exclude_from_git(root)
+    return root
+
+
+def _exclude_from_git(root: str):
+    """Keep snapshots inside root out of `git add -A` and `git status`"""
+    info = os.path.join(root, '.git', 'info')
+    if not os.path.isdir(os.path.dirname(info)):
+        return
+    pattern = f"/{SNAPSHOT_PREFIX}*"
+    path = os.path.join(info, 'exclude')
+    try:
+        os.makedirs(info, exist_ok=True)
+        try:
+            with open(path) as f:
+                if pattern in f.read().split('\n'):
+                    return
+        except FileNotFoundError:
+            pass
+        with open(path, 'a') as f:
+            f.write(pattern + '\n')
+    except OSError:
+        pass
+
+
+def _reflink(source: str, target: str) -> bool:
+    """Clone source to target copy-on-write; False if the filesystem cannot"""
+    with open(source, 'rb') as src:
+        fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            fcntl.ioctl(fd, FICLONE, src.fileno())
+        except OSError as e:
+            os.close(fd)
+            os.unlink(target)
+            if e.errno in NO_REFLINK:
+                return False
+            raise
+        os.close(fd)
+    shutil.copystat(source, target)
+    return True
+
+
+def _link(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        # Another filesystem is mounted inside the tree
+        shutil.copy2(source, target)
@@ -0,0 +1,53 @@
+import queue
+import threading
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
+
+# Event kinds yielded by VirtualVibeCoder.stream_request
+TOKEN = 'token'
+BLOCK_READY = 'block_ready'
+BLOCK_RESULT = 'block_result'
+ESCALATE = 'escalate'
+ERROR = 'error'
+DONE = 'done'
+
+
+class StreamEvent(NamedTuple):
+    kind: str
+    text: str
+    # Step kind ('block', 'command', 'verify' or 'plan') for block events, None otherwise
+    step: Optional[str] = None
+
+
+_END = object()
+
+
+def pump_stream(source: Iterable[str]) -> Iterator[Any]:
+    """Read a token stream on a background thread.
+
+    Generation keeps going while the consumer is busy executing a step;
+    tokens pile up in the queue and are picked up on the next iteration.
+    Exceptions raised by the source are yielded as values.
+    """
+    tokens: "queue.Queue[Any]" = queue.Queue()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for token in source:
+                if stop.is_set():
+                    break
+                tokens.put(token)
+        except Exception as e:
+            tokens.put(e)
+        finally:
+            tokens.put(_END)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = tokens.get()
+            if item is _END:
+                return
+            yield item
+    finally:
+        stop.set()
@@ -1,71 +1,431 @@
+import codecs
+import selectors
+import signal
 import subprocess
 import shlex
-from typing import Tuple, List, Optional
-import pexpect
+import shutil
+import threading
+import time
+import weakref
+from collections import deque
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Tuple, List, Optional
 import os
+from .capture import DEFAULT_HEAD_BYTES, DEFAULT_TAIL_BYTES, CommandResult, OutputCapture
+from .python_pool import PythonPool, write_script
+from .scheduler import strip_wrappers
+from .shell_session import ShellSession
+from . import tracing
+
+if TYPE_CHECKING:
+    import asyncio
+
+# Code blocks are written next to the project under this hidden name, which
+# the workspace index skips (workspace.PRIVATE_PREFIX)
+SCRIPT_PREFIX = '.vibe_coder-block-'
+
+
+def command_name(command: str) -> str:
+    """The program a command line runs, for grouping metrics"""
+    words = strip_wrappers(command.split())
+    return os.path.basename(words[0]) if words else ''
+
+
+def cd_target(command: str) -> Optional[str]:
+    """The directory a plain `cd DIR` changes to, or None for any other command"""
+    try:
+        words = shlex.split(command)
+    except ValueError:
+        return None
+    if not words or words[0] != 'cd' or len(words) > 2:
+        return None
+    return words[1] if len(words) == 2 else '~'
 
 class SudoTerminal:
-    def __init__(self):
-        self.current_dir = os.getcwd()
+    def __init__(self, persistent_shell: bool = False, max_concurrency: int = 4,
+                 head_bytes: int = DEFAULT_HEAD_BYTES, tail_bytes: int = DEFAULT_TAIL_BYTES,
+                 spill_dir: Optional[str] = None, max_spill_files: int = 32, python_workers: int = 2,
+                 cwd: Optional[str] = None):
+        # Tracked per terminal and passed to everything it runs; the
+        # process cwd is never changed, so terminals cannot disturb each other
+        self.current_dir = os.path.abspath(cwd or os.getcwd())
         self.history: List[str] = []
+        # One long-lived bash per terminal instead of a fork per command
+        self.session: Optional[ShellSession] = ShellSession(self.current_dir) if persistent_shell else None
+        # Limit on concurrently running async commands, per event loop
+        self.max_concurrency = max_concurrency
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        # Per stream, only head_bytes + tail_bytes of output are kept in memory;
+        # longer output spills to files, of which the newest max_spill_files are kept
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_files = max_spill_files
+        self._spill_files: "deque[str]" = deque()
+        # Warm interpreters for Python blocks, started on first use
+        self.python_workers = python_workers
+        self._python_pool: Optional[PythonPool] = None
+        self._pool_lock = threading.Lock()
+        # Called with (command, result, seconds) after each command, e.g. to
+        # record it in a session store
+        self.on_command: Optional[Callable[[str, CommandResult, float], None]] = None
     
-    def execute_command(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
+    @property
+    def python_pool(self) -> PythonPool:
+        if self._python_pool is None:
+            with self._pool_lock:
+                if self._python_pool is None:
+                    self._python_pool = PythonPool(self.python_workers)
+        return self._python_pool
+    
+    def execute_command(self, command: str, timeout: int = 30, cwd: Optional[str] = None) -> Tuple[str, str, int]:
         """Execute a command with sudo privileges and return output"""
+        return self.capture_command(command, timeout, cwd).output()
+    
+    def capture_command(self, command: str, timeout: int = 30, cwd: Optional[str] = None) -> CommandResult:
+        """Execute a command, keeping only the head and tail of its output in memory.
+        
+        Output beyond the in-memory limit is spilled to a file named in the
+        result, together with byte and line counts of each stream. A cwd
+        (relative to the current directory) runs the command there without
+        changing the current directory.
+        """
+        start = time.monotonic()
+        result = self._capture_command(command, timeout, cwd)
+        self._notify(command, result, time.monotonic() - start)
+        return result
+    
+    def _capture_command(self, command: str, timeout: int, cwd: Optional[str] = None) -> CommandResult:
+        with tracing.span('execute_command', command=command_name(command)) as span:
+            result = self._execute_command(command, timeout, cwd)
+            span.set(exit_code=result.returncode, stdout_bytes=result.stdout_bytes)
+            self._retain_spill_files(result)
+            return result
+    
+    def _notify(self, command: str, result: CommandResult, seconds: float):
+        if self.on_command is None:
+            return
+        try:
+            self.on_command(command, result, seconds)
+        except Exception:
+            # A failing listener never fails the command itself
+            pass
+    
+    def _captures(self) -> Tuple[OutputCapture, OutputCapture]:
+        return (OutputCapture(self.head_bytes, self.tail_bytes, self.spill_dir, prefix='stdout-'),
+                OutputCapture(self.head_bytes, self.tail_bytes, self.spill_dir, prefix='stderr-'))
+    
+    def _retain_spill_files(self, result: CommandResult):
+        """Keep the spill files of the most recent commands only"""
+        for path in (result.stdout_path, result.stderr_path):
+            if path is None:
+                continue
+            self._spill_files.append(path)
+            while len(self._spill_files) > self.max_spill_files:
+                try:
+                    os.unlink(self._spill_files.popleft())
+                except OSError:
+                    pass
+    
+    def _execute_command(self, command: str, timeout: int, cwd: Optional[str] = None) -> CommandResult:
         self.history.append(command)
         
         try:
-            if command.startswith('cd '):
-                # Handle directory changes
-                new_dir = command[3:].strip()
-                if new_dir == "~":
-                    new_dir = os.path.expanduser("~")
-                os.chdir(new_dir)
-                self.current_dir = os.getcwd()
-                return f"Changed directory to {self.current_dir}", "", 0
+            if cwd is not None:
+                cwd = self.resolve_path(cwd)
+                if not os.path.isdir(cwd):
+                    return CommandResult.failure(f"Error executing command: no such directory: {cwd}")
+                if self.session is not None:
+                    # A subshell, so the session's own directory is left alone
+                    return self._execute_in_session(f"(cd {shlex.quote(cwd)} && {command}\n)", timeout)
+                if command.startswith('sudo '):
+                    return self._execute_sudo(command, timeout, cwd)
+                return self._execute_subprocess(command, timeout, cwd)
+            
+            if self.session is not None:
+                return self._execute_in_session(command, timeout)
+            
+            target = cd_target(command)
+            if target is not None:
+                # Handle directory changes; `cd x && make` and the like run in bash
+                new_dir = self.resolve_path(target)
+                if not os.path.isdir(new_dir):
+                    return CommandResult.failure(f"Error executing command: no such directory: {new_dir}")
+                self.current_dir = new_dir
+                message = f"Changed directory to {self.current_dir}"
+                return CommandResult(message, "", 0, stdout_bytes=len(message.encode('utf-8')), stdout_lines=1)
             
             # Use pexpect for sudo commands that might need password
             if command.startswith('sudo '):
-                child = pexpect.spawn('/bin/bash', ['-c', command], timeout=timeout)
-                # For demo purposes, we'll assume passwordless sudo
-                # In production, you'd handle password prompts here
-                child.expect(pexpect.EOF)
-                output = child.before.decode('utf-8', errors='ignore')
-                return output, "", child.exitstatus
+                return self._execute_sudo(command, timeout)
             
             # Regular commands
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=timeout,
-                cwd=self.current_dir
-            )
-            
-            return result.stdout, result.stderr, result.returncode
+            return self._execute_subprocess(command, timeout)
             
-        except subprocess.TimeoutExpired:
-            return "", f"Command timed out after {timeout} seconds", -1
         except Exception as e:
-            return "", f"Error executing command: {str(e)}", -1
+            return CommandResult.failure(f"Error executing command: {str(e)}")
+    
+    def _execute_sudo(self, command: str, timeout: int, cwd: Optional[str] = None) -> CommandResult:
+        import pexpect
+        stdout, stderr = self._captures()
+        child = pexpect.spawn('/bin/bash', ['-c', command], timeout=timeout, cwd=cwd or self.current_dir)
+        # For demo purposes, we'll assume passwordless sudo
+        # In production, you'd handle password prompts here
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    stdout.feed(child.read_nonblocking(65536, timeout=max(deadline - time.monotonic(), 0)))
+                except pexpect.EOF:
+                    break
+        except pexpect.TIMEOUT:
+            stdout.close()
+            return CommandResult.failure(f"Command timed out after {timeout} seconds")
+        finally:
+            child.close(force=True)
+        return CommandResult.from_captures(stdout, stderr, child.exitstatus)
+    
+    def _execute_subprocess(self, command: str, timeout: int, cwd: Optional[str] = None) -> CommandResult:
+        stdout, stderr = self._captures()
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd or self.current_dir,
+            start_new_session=True
+        )
+        captures = {proc.stdout: stdout, proc.stderr: stderr}
+        deadline = time.monotonic() + timeout
+        try:
+            with selectors.DefaultSelector() as selector:
+                for pipe in captures:
+                    selector.register(pipe, selectors.EVENT_READ)
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._kill_group(proc)
+                        proc.wait()
+                        stdout.close()
+                        stderr.close()
+                        return CommandResult.failure(f"Command timed out after {timeout} seconds")
+                    for key, _ in selector.select(remaining):
+                        chunk = os.read(key.fileobj.fileno(), 65536)
+                        if chunk:
+                            captures[key.fileobj].feed(chunk)
+                        else:
+                            selector.unregister(key.fileobj)
+            returncode = proc.wait(max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            # Output closed but the shell has not exited yet
+            self._kill_group(proc)
+            proc.wait()
+            stdout.close()
+            stderr.close()
+            return CommandResult.failure(f"Command timed out after {timeout} seconds")
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
+        return CommandResult.from_captures(stdout, stderr, returncode)
+    
+    def _execute_in_session(self, command: str, timeout: int) -> CommandResult:
+        """Run a command in the persistent shell, which handles cd itself"""
+        result = self.session.run_captured(command, timeout, *self._captures())
+        # Keep relative file operations in sync with the shell
+        self.current_dir = self.session.cwd
+        return result
+    
+    def _semaphore(self) -> "asyncio.Semaphore":
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+    
+    async def stream_command(self, command: str, timeout: int = 30) -> AsyncIterator[Tuple[str, str]]:
+        """Execute a command asynchronously, yielding output as it arrives.
+        
+        Yields ('stdout', text) and ('stderr', text) chunks, then a final
+        ('exit', code). Cancelling the consumer, closing the generator or a
+        timeout kills the command's whole process group.
+        """
+        # Imported here: asyncio is a large share of startup for sync-only callers
+        import asyncio
+        
+        if cd_target(command) is not None:
+            # Directory changes are handled in-process
+            stdout, stderr, code = self.execute_command(command, timeout)
+            if stdout:
+                yield 'stdout', stdout
+            if stderr:
+                yield 'stderr', stderr
+            yield 'exit', str(code)
+            return
+        
+        self.history.append(command)
+        async with self._semaphore():
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    '/bin/bash', '-c', command,
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=self.current_dir,
+                    start_new_session=True
+                )
+            except Exception as e:
+                yield 'stderr', f"Error executing command: {str(e)}"
+                yield 'exit', '-1'
+                return
+            
+            chunks: "asyncio.Queue[Tuple[str, Optional[str]]]" = asyncio.Queue()
+            
+            async def pump(name: str, stream: asyncio.StreamReader):
+                decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+                while True:
+                    data = await stream.read(65536)
+                    text = decoder.decode(data, final=not data)
+                    if text:
+                        await chunks.put((name, text))
+                    if not data:
+                        break
+                await chunks.put((name, None))
+            
+            readers = [
+                asyncio.ensure_future(pump('stdout', proc.stdout)),
+                asyncio.ensure_future(pump('stderr', proc.stderr)),
+            ]
+            deadline = asyncio.get_running_loop().time() + timeout
+            try:
+                open_streams = 2
+                while open_streams:
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    try:
+                        name, text = await asyncio.wait_for(chunks.get(), max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        self._kill_group(proc)
+                        yield 'stderr', f"Command timed out after {timeout} seconds"
+                        yield 'exit', '-1'
+                        return
+                    if text is None:
+                        open_streams -= 1
+                    else:
+                        yield name, text
+                yield 'exit', str(await proc.wait())
+            finally:
+                if proc.returncode is None:
+                    self._kill_group(proc)
+                    await proc.wait()
+                for reader in readers:
+                    reader.cancel()
+    
+    async def execute_command_async(self, command: str, timeout: int = 30) -> Tuple[str, str, int]:
+        """Async counterpart of execute_command"""
+        stdout, stderr = self._captures()
+        code = -1
+        async for name, text in self.stream_command(command, timeout):
+            if name == 'stdout':
+                stdout.feed(text.encode('utf-8'))
+            elif name == 'stderr':
+                stderr.feed(text.encode('utf-8'))
+            else:
+                code = int(text)
+        result = CommandResult.from_captures(stdout, stderr, code)
+        self._retain_spill_files(result)
+        return result.output()
+    
+    @staticmethod
+    def _kill_group(proc: "asyncio.subprocess.Process"):
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+    
+    def close(self):
+        """Shut down the persistent shell and Python workers, and remove spill files"""
+        if self.session is not None:
+            self.session.close()
+        if self._python_pool is not None:
+            self._python_pool.close()
+            self._python_pool = None
+        while self._spill_files:
+            try:
+                os.unlink(self._spill_files.popleft())
+            except OSError:
+                pass
     
     def execute_script(self, script_path: str, interpreter: str = "python") -> Tuple[str, str, int]:
         """Execute a script file"""
         return self.execute_command(f"{interpreter} {script_path}")
     
+    def run_code(self, code: str, suffix: str, interpreter: str, timeout: int = 30,
+                 cwd: Optional[str] = None) -> CommandResult:
+        """Run source code from a hidden, uniquely named file in the directory it runs in.
+        
+        The file sits next to the project (in cwd, or the current directory),
+        so relative requires, node_modules, `dirname "$0"` and __file__ work
+        as they would for a script saved there; it is deleted afterwards, and
+        concurrent calls never share one. A read-only directory falls back to
+        a private scratch directory.
+        
+        Python runs on the warm worker pool, except with a persistent shell,
+        whose activated virtualenv and exported variables the pool would
+        miss; other interpreters always run as a command.
+        """
+        try:
+            try:
+                path = write_script(code, suffix, self.resolve_path(cwd or '.'), SCRIPT_PREFIX)
+            except OSError:
+                path = write_script(code, suffix)
+        except OSError as e:
+            return CommandResult.failure(f"Error writing file: {str(e)}")
+        start = time.monotonic()
+        try:
+            if interpreter != 'python3' or self.session is not None:
+                result = self._capture_command(f"{interpreter} {shlex.quote(path)}", timeout, cwd)
+            else:
+                with tracing.span('execute_command', command='python3') as span:
+                    self.history.append(f"python3 {path}")
+                    result = self.python_pool.run(path, self.resolve_path(cwd or '.'), timeout, *self._captures())
+                    span.set(exit_code=result.returncode, stdout_bytes=result.stdout_bytes)
+                    self._retain_spill_files(result)
+            # The script file is gone afterwards, so listeners get the code itself
+            self._notify(code, result, time.monotonic() - start)
+            return result
+        finally:
+            os.unlink(path)
+    
+    def resolve_path(self, path: str) -> str:
+        """An absolute path for one relative to the terminal's current directory"""
+        return os.path.normpath(os.path.join(self.current_dir, os.path.expanduser(path)))
+    
     def write_file(self, filepath: str, content: str) -> Tuple[bool, str]:
-        """Write content to a file"""
+        """Write content to a file, relative to the current directory.
+        
+        The file is replaced rather than rewritten in place, so readers
+        never see half of it and workspace snapshots keep the old version.
+        """
+        path = self.resolve_path(filepath)
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
         try:
-            with open(filepath, 'w') as f:
+            with open(tmp, 'w') as f:
                 f.write(content)
+            if os.path.exists(path):
+                # Replacing a file keeps its permissions
+                shutil.copymode(path, tmp)
+            os.replace(tmp, path)
             return True, f"File {filepath} written successfully"
         except Exception as e:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
             return False, f"Error writing file: {str(e)}"
     
     def read_file(self, filepath: str) -> Tuple[bool, str]:
-        """Read content from a file"""
+        """Read content from a file, relative to the current directory"""
         try:
-            with open(filepath, 'r') as f:
+            with open(self.resolve_path(filepath), 'r') as f:
                 content = f.read()
             return True, content
         except Exception as e:
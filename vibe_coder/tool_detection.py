@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# (tool, probe command) pairs, in the order they are reported
+TOOL_PROBES: List[Tuple[str, str]] = [
+    # Programming languages
+    ('python', 'python3 --version'),
+    ('node', 'node --version'),
+    ('gcc', 'gcc --version'),
+    ('rust', 'rustc --version'),
+    ('go', 'go version'),
+    ('java', 'java -version'),
+    # Build tools
+    ('make', 'make --version'),
+    ('cmake', 'cmake --version'),
+    ('cargo', 'cargo --version'),
+    ('npm', 'npm --version'),
+    ('pip', 'pip3 --version'),
+    # System tools
+    ('git', 'git --version'),
+    ('docker', 'docker --version'),
+    ('vim', 'vim --version'),
+    ('nano', 'nano --version'),
+]
+
+
+def default_cache_path() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'vibe_coder', 'tools.json')
+
+
+def tool_fingerprint(command: str) -> str:
+    """Identify the binary a probe would run: $PATH, resolved path and mtime"""
+    binary = shutil.which(shlex.split(command)[0])
+    mtime = 0
+    if binary is not None:
+        try:
+            mtime = os.stat(binary).st_mtime_ns
+        except OSError:
+            pass
+    key = f"{os.environ.get('PATH', '')}\0{binary}\0{mtime}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def probe_tool(command: str, timeout: int = 10) -> bool:
+    """Run a version probe directly, without a shell"""
+    argv = shlex.split(command)
+    if shutil.which(argv[0]) is None:
+        # Not on $PATH, no need to spawn anything
+        return False
+    try:
+        result = subprocess.run(
+            argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout
+        )
+        return result.returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+class ToolCache:
+    """On-disk cache of probe results, invalidated per tool by its fingerprint"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_cache_path()
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    entries = json.load(f)
+                self._entries = entries if isinstance(entries, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, tool: str, fingerprint: str) -> Optional[bool]:
+        with self._lock:
+            entry = self._load().get(tool)
+        if isinstance(entry, dict) and entry.get('fingerprint') == fingerprint:
+            return bool(entry.get('available'))
+        return None
+
+    def update(self, results: Dict[str, Tuple[str, bool]]) -> None:
+        """Store {tool: (fingerprint, available)} and persist atomically"""
+        with self._lock:
+            entries = self._load()
+            for tool, (fingerprint, available) in results.items():
+                entries[tool] = {'fingerprint': fingerprint, 'available': available}
+            try:
+                directory = os.path.dirname(self.path)
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                # The cache is an optimization only
+                pass
+
+
+def detect_tools(probes: List[Tuple[str, str]] = TOOL_PROBES,
+                 cache: Optional[ToolCache] = None,
+                 max_workers: int = 8) -> Dict[str, bool]:
+    """Detect tools concurrently, reusing cached results whose binary is unchanged"""
+    tools: Dict[str, bool] = {}
+    misses: Dict[str, Tuple[str, str]] = {}
+
+    for tool, command in probes:
+        fingerprint = tool_fingerprint(command)
+        cached = cache.get(tool, fingerprint) if cache is not None else None
+        if cached is None:
+            misses[tool] = (command, fingerprint)
+        else:
+            tools[tool] = cached
+
+    if misses:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as pool:
+            found = dict(zip(misses, pool.map(probe_tool, [cmd for cmd, _ in misses.values()])))
+        tools.update(found)
+        if cache is not None:
+            cache.update({tool: (misses[tool][1], found[tool]) for tool in found})
+
+    # Keep the probe order
+    return {tool: tools[tool] for tool, _ in probes}
+
+
+class LazyTools(Mapping):
+    """Tool availability map that probes each tool on first lookup"""
+
+    def __init__(self, probes: List[Tuple[str, str]] = TOOL_PROBES,
+                 cache: Optional[ToolCache] = None):
+        self._commands = dict(probes)
+        self._cache = cache
+        self._results: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+
+    def _probe(self, tools: List[str]) -> None:
+        missing = [(tool, self._commands[tool]) for tool in tools if tool not in self._results]
+        if missing:
+            found = detect_tools(missing, self._cache)
+            with self._lock:
+                self._results.update(found)
+
+    def __getitem__(self, tool: str) -> bool:
+        if tool not in self._results:
+            self._probe([tool])
+        return self._results[tool]
+
+    def items(self):
+        # Full iteration probes whatever is left concurrently
+        self._probe(list(self._commands))
+        return super().items()
+
+    def values(self):
+        self._probe(list(self._commands))
+        return super().values()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._commands)
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def probed(self) -> Dict[str, bool]:
+        """Results of the tools looked up so far"""
+        return dict(self._results)
@@ -0,0 +1,244 @@
+import bisect
+import contextvars
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+METRIC_NAME = 'vibe_coder_phase_duration_seconds'
+
+# The innermost open span. A context variable rather than a thread-local, so
+# work handed to a pool with contextvars.copy_context() nests under its caller
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar('vibe_coder_span', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: 'Histogram'):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    def __init__(self, tracer: 'Tracer', name: str, attrs: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self._token = _current_span.set(self)
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.tracer._finish(self, duration)
+        return False
+
+
+class Tracer:
+    """Span recorder with per-phase latency histograms.
+
+    Disabled tracers hand out a shared no-op span, so instrumented code
+    costs one attribute check when tracing is off. Finished spans are
+    appended to trace_path as JSON lines; histograms are written in
+    Prometheus text format to metrics_path by flush(), suitable for the
+    node exporter textfile collector.
+    """
+
+    def __init__(self, enabled: bool = False, trace_path: Optional[str] = None,
+                 metrics_path: Optional[str] = None, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.buckets = buckets
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        # Other sources of Prometheus text written along with the histograms
+        self.collectors: List[Callable[[], str]] = []
+        self._lock = threading.Lock()
+        # A forked child inherits this tracer; only the creating process writes metrics_path
+        self._pid = os.getpid()
+        self._trace_file = open(trace_path, 'a') if enabled and trace_path else None
+
+    def span(self, name: str, **attrs: Any):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attrs)
+
+    def observe(self, name: str, seconds: float, command: str = ''):
+        """Record a duration measured elsewhere (e.g. reported by the model server)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histogram(name, command).observe(seconds)
+
+    def drain(self) -> Dict[Tuple[str, str], Histogram]:
+        """Take the histograms recorded so far, e.g. to send them to a parent process"""
+        with self._lock:
+            histograms, self.histograms = self.histograms, {}
+        return histograms
+
+    def merge(self, histograms: Dict[Tuple[str, str], Histogram]):
+        """Add histograms drained from another tracer"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for (name, command), histogram in histograms.items():
+                self._histogram(name, command).merge(histogram)
+
+    def _histogram(self, name: str, command: str) -> Histogram:
+        key = (name, command)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram(self.buckets)
+        return self.histograms[key]
+
+    def _finish(self, span: Span, duration: float):
+        command = str(span.attrs.get('command', ''))
+        record = {
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'start': span.start_time,
+            'duration': duration,
+            'thread': threading.current_thread().name,
+            'attrs': span.attrs,
+        }
+        with self._lock:
+            self._histogram(span.name, command).observe(duration)
+            if self._trace_file is not None:
+                self._trace_file.write(json.dumps(record, default=str) + '\n')
+
+    def prometheus_text(self) -> str:
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent per request phase and per command.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for (name, command), histogram in sorted(self.histograms.items()):
+                labels = f'phase="{name}"'
+                if command:
+                    labels += ',command="{}"'.format(command.replace('\\', '\\\\').replace('"', '\\"'))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{METRIC_NAME}_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'{METRIC_NAME}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n' + ''.join(collect() for collect in self.collectors)
+
+    def add_collector(self, collect: Callable[[], str]):
+        """Include another source's metrics, e.g. the model router's, in prometheus_text"""
+        self.collectors.append(collect)
+
+    def flush(self):
+        """Flush the trace file and rewrite the metrics file atomically"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.flush()
+        if self.metrics_path and os.getpid() == self._pid:
+            directory = os.path.dirname(os.path.abspath(self.metrics_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.prometheus_text())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.metrics_path)
+
+    def close(self):
+        self.flush()
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def configure(trace_path: Optional[str] = None, metrics_path: Optional[str] = None,
+              enabled: Optional[bool] = None) -> Tracer:
+    """Enable tracing process-wide; with no paths, tracing is turned off unless enabled
+    (histograms are then only kept in memory, e.g. for a /metrics endpoint)"""
+    global _tracer
+    _tracer.close()
+    if enabled is None:
+        enabled = bool(trace_path or metrics_path)
+    _tracer = Tracer(enabled=enabled, trace_path=trace_path, metrics_path=metrics_path)
+    return _tracer
+
+
+def span(name: str, **attrs: Any):
+    tracer = _tracer
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return tracer.span(name, **attrs)
+
+
+def observe(name: str, seconds: float, command: str = ''):
+    _tracer.observe(name, seconds, command)
+
+
+def traced(name: str) -> Callable:
+    """Decorator wrapping every call of a function in a span"""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,502 @@
+import ast
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import shlex
+import sqlite3
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from .capture import CommandResult
+from .workspace import TreeWalker
+
+MAKEFILES = ('GNUmakefile', 'makefile', 'Makefile')
+CARGO_FILES = ('Cargo.toml', 'Cargo.lock', 'build.rs')
+JS_SUFFIXES = ('.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.vue', '.svelte', '.json')
+# What `npm init` puts in scripts.test
+NPM_PLACEHOLDER = 'no test specified'
+
+MAKE_ASSIGNMENT = re.compile(r'^\s*(?:export\s+|override\s+)?[A-Za-z0-9_.-]+\s*(?:::?=|\?=|\+=|!=|=)')
+
+# Relative path -> (mtime_ns, size)
+TreeState = Dict[str, Tuple[int, int]]
+
+
+def default_cache_path() -> str:
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_home, 'vibe_coder', 'verify.db')
+
+
+class Target(NamedTuple):
+    kind: str
+    command: str
+    # Relative paths whose contents decide whether a cached pass still holds
+    inputs: Tuple[str, ...]
+
+
+class TargetResult(NamedTuple):
+    target: Target
+    returncode: int
+    cached: bool
+    seconds: float
+    output: str
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+def changed_files(before: TreeState, after: TreeState) -> List[str]:
+    """Files added, removed or modified between two states"""
+    changed = {path for path, stat in after.items() if before.get(path) != stat}
+    changed.update(path for path in before if path not in after)
+    return sorted(changed)
+
+
+def module_name(path: str) -> str:
+    """Dotted name of a Python file from its path: pkg/sub/__init__.py -> pkg.sub"""
+    parts = path[:-len('.py')].split('/')
+    if parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def is_test_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return name.endswith('.py') and (name.startswith('test_') or name.endswith('_test.py'))
+
+
+def python_imports(source: str, module: str, is_package: bool) -> Set[str]:
+    """Absolute names a module imports, with every parent package it implicitly imports too"""
+    names: Set[str] = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                package = module.split('.') if is_package else module.split('.')[:-1]
+                package = package[:len(package) - node.level + 1]
+                base = '.'.join(package + ([base] if base else []))
+            if base:
+                names.add(base)
+            # from pkg import name may import the submodule pkg.name
+            names.update(f"{base}.{alias.name}" if base else alias.name
+                         for alias in node.names if alias.name != '*')
+    for name in list(names):
+        parts = name.split('.')
+        names.update('.'.join(parts[:i]) for i in range(1, len(parts)))
+    names.discard('')
+    return names
+
+
+def _resolves_to(module: str, name: str) -> bool:
+    # Suffix match: src/pkg/mod.py is imported as pkg.mod when src is on the path
+    return module == name or module.endswith('.' + name)
+
+
+def _last(name: str) -> str:
+    return name.rsplit('.', 1)[-1]
+
+
+def parse_makefile(text: str) -> Tuple[Dict[str, List[str]], Optional[str]]:
+    """Explicit rules (target -> prerequisites) and the default goal.
+
+    Recipes, assignments and anything using variables are skipped; this
+    only has to find which targets a source file feeds.
+    """
+    rules: Dict[str, List[str]] = defaultdict(list)
+    default = None
+    for line in text.replace('\\\n', ' ').splitlines():
+        if line.startswith('\t') or MAKE_ASSIGNMENT.match(line):
+            continue
+        line = line.split('#', 1)[0]
+        targets, colon, rest = line.partition(':')
+        if not colon or '$' in targets:
+            continue
+        rest = rest.lstrip(':').split(';', 1)[0]
+        prerequisites = [os.path.normpath(word) for word in rest.replace('|', ' ').split() if '$' not in word]
+        for target in targets.split():
+            target = os.path.normpath(target)
+            rules[target].extend(prerequisites)
+            if default is None and not target.startswith('.') and '%' not in target:
+                default = target
+    return dict(rules), default
+
+
+def make_goals(rules: Dict[str, List[str]], default: Optional[str], changed: Iterable[str]) -> List[str]:
+    """Outermost targets that (transitively) depend on any changed file"""
+    affected: Set[str] = set()
+    frontier = set(changed)
+    while frontier:
+        newly = set()
+        for target, prerequisites in rules.items():
+            if target in affected:
+                continue
+            for prerequisite in prerequisites:
+                if prerequisite in frontier or any('%' in item and fnmatch.fnmatch(prerequisite, item.replace('%', '*'))
+                                                   for item in frontier):
+                    newly.add(target)
+                    break
+                if '%' in prerequisite and any(fnmatch.fnmatch(item, prerequisite.replace('%', '*')) for item in frontier):
+                    newly.add(target)
+                    break
+        affected |= newly
+        frontier = newly
+    goals = [target for target in affected
+             if not target.startswith('.') and '%' not in target
+             and not any(target in rules[other] for other in affected if other != target)]
+    if not goals and any('%' in target for target in affected) and default is not None:
+        # Only pattern rules matched; the default goal is what uses them
+        goals = [default]
+    return sorted(goals)
+
+
+class VerifyCache:
+    """Targets that passed, keyed on a hash of their command and inputs.
+
+    Failures are never cached. Kept in memory, and in an SQLite file when
+    db_path is given so passes survive restarts.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._passed: Set[str] = set()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS passed ("
+                "key TEXT PRIMARY KEY, command TEXT NOT NULL, seconds REAL NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def passed(self, key: str) -> bool:
+        with self._lock:
+            if key in self._passed:
+                return True
+            if self._db is not None and self._db.execute("SELECT 1 FROM passed WHERE key = ?", (key,)).fetchone():
+                self._passed.add(key)
+                return True
+            return False
+
+    def record(self, key: str, command: str, seconds: float):
+        with self._lock:
+            self._passed.add(key)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO passed VALUES (?, ?, ?, ?)",
+                                 (key, command, seconds, time.time()))
+                self._db.commit()
+
+
+class Verifier:
+    """Re-runs only the tests and builds affected by a set of changed files.
+
+    Python test files are found through the import graph; Makefile
+    targets through their prerequisites; Cargo crates and npm packages by
+    the manifest nearest to a changed file, plus the crates and packages
+    that depend on it by path. A target whose command and input contents
+    already passed is reported from the cache instead of being run.
+    """
+
+    def __init__(self, root: str, run: Callable[[str, int], CommandResult],
+                 cache: Optional[VerifyCache] = None, max_files: int = 20000, timeout: int = 600):
+        self.root = os.path.abspath(root)
+        self.run = run
+        self.cache = cache if cache is not None else VerifyCache()
+        self.timeout = timeout
+        self._walker = TreeWalker(self.root, max_files)
+        # Per file, kept while its (mtime_ns, size) is unchanged
+        self._imports: Dict[str, Tuple[Tuple[int, int], Set[str]]] = {}
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+    def state(self) -> TreeState:
+        state: TreeState = {}
+        for path in self._walker.files():
+            try:
+                st = os.stat(os.path.join(self.root, path))
+            except OSError:
+                continue
+            state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def targets(self, changed: Iterable[str], state: TreeState) -> List[Target]:
+        changed = list(changed)
+        return (self._python_targets(changed, state) + self._make_targets(changed, state)
+                + self._cargo_targets(changed, state) + self._npm_targets(changed, state))
+
+    def verify(self, changed: Iterable[str], state: Optional[TreeState] = None) -> List[TargetResult]:
+        state = state if state is not None else self.state()
+        results: List[TargetResult] = []
+        tests: List[Tuple[Target, str]] = []
+        for target in self.targets(changed, state):
+            key = self._key(target, state)
+            if self.cache.passed(key):
+                results.append(TargetResult(target, 0, True, 0.0, ''))
+            elif target.kind == 'pytest':
+                tests.append((target, key))
+            else:
+                results.append(self._run([(target, key)], target.command))
+        if tests:
+            # One interpreter start for every affected test file
+            files = ' '.join(shlex.quote(target.inputs[0]) for target, _ in tests)
+            results.insert(0, self._run(tests, f"python3 -m pytest -q {files}"))
+        return results
+
+    def _run(self, targets: List[Tuple[Target, str]], command: str) -> TargetResult:
+        start = time.monotonic()
+        # A subshell, so a persistent shell's own directory is left alone
+        stdout, stderr, code = self.run(f"(cd {shlex.quote(self.root)} && {command})", self.timeout).output()
+        seconds = time.monotonic() - start
+        if code == 0:
+            for target, key in targets:
+                self.cache.record(key, target.command, seconds)
+        target = targets[0][0] if len(targets) == 1 else Target(targets[0][0].kind, command, ())
+        return TargetResult(target, code, False, seconds, (stdout + stderr)[-2000:])
+
+    def _key(self, target: Target, state: TreeState) -> str:
+        digest = hashlib.sha256(f"{target.kind}\0{target.command}\0".encode('utf-8'))
+        for path in sorted(target.inputs):
+            digest.update(f"{path}\0{self._hash(path, state.get(path))}\0".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _hash(self, path: str, stat: Optional[Tuple[int, int]]) -> str:
+        if stat is None:
+            return ''
+        cached = self._hashes.get(path)
+        if cached is None or cached[0] != stat:
+            digest = hashlib.sha256()
+            try:
+                with open(os.path.join(self.root, path), 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            except OSError:
+                pass
+            cached = (stat, digest.hexdigest())
+            self._hashes[path] = cached
+        return cached[1]
+
+    def _read(self, path: str) -> str:
+        try:
+            with open(os.path.join(self.root, path), encoding='utf-8', errors='replace') as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def _files_under(self, directory: str, state: TreeState) -> Tuple[str, ...]:
+        if not directory:
+            return tuple(state)
+        prefix = directory + '/'
+        return tuple(path for path in state if path.startswith(prefix))
+
+    @staticmethod
+    def _nearest(path: str, directories: Iterable[str]) -> Optional[str]:
+        """The closest directory containing path, of the given ones"""
+        directories = set(directories)
+        directory = os.path.dirname(path)
+        while True:
+            if directory in directories:
+                return directory
+            if not directory:
+                return None
+            directory = os.path.dirname(directory)
+
+    # Python
+
+    def _python_imports(self, path: str, stat: Tuple[int, int]) -> Set[str]:
+        cached = self._imports.get(path)
+        if cached is None or cached[0] != stat:
+            try:
+                names = python_imports(self._read(path), module_name(path), path.endswith('__init__.py'))
+            except (SyntaxError, ValueError):
+                names = set()
+            cached = (stat, names)
+            self._imports[path] = cached
+        return cached[1]
+
+    def _python_targets(self, changed: List[str], state: TreeState) -> List[Target]:
+        sources = [path for path in state if path.endswith('.py')]
+        if not sources or not any(path.endswith('.py') for path in changed):
+            return []
+        imports = {path: self._python_imports(path, state[path]) for path in sources}
+        importers: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        modules: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for path, names in imports.items():
+            modules[_last(module_name(path))].append((module_name(path), path))
+            for name in names:
+                importers[_last(name)].append((name, path))
+
+        # Everything that imports a changed module, directly or not
+        affected = {path for path in changed if path.endswith('.py')}
+        queue = deque(affected)
+        while queue:
+            module = module_name(queue.popleft())
+            if not module:
+                continue
+            for name, importer in importers.get(_last(module), ()):
+                if importer not in affected and _resolves_to(module, name):
+                    affected.add(importer)
+                    queue.append(importer)
+        tests = {path for path in affected if is_test_file(path) and path in state}
+        for path in changed:
+            if os.path.basename(path) == 'conftest.py':
+                prefix = os.path.dirname(path)
+                tests.update(test for test in sources
+                             if is_test_file(test) and (not prefix or test.startswith(prefix + '/')))
+
+        targets = []
+        for test in sorted(tests):
+            # The test file first: it is what gets passed to pytest
+            inputs = [test] + sorted(self._python_closure(test, imports, modules) - {test})
+            targets.append(Target('pytest', f"python3 -m pytest -q {shlex.quote(test)}", tuple(inputs)))
+        return targets
+
+    def _python_closure(self, test: str, imports: Dict[str, Set[str]],
+                        modules: Dict[str, List[Tuple[str, str]]]) -> Set[str]:
+        """The test file, the project files it imports (transitively) and its conftest.py files"""
+        closure = {test}
+        directory = os.path.dirname(test)
+        while True:
+            conftest = os.path.join(directory, 'conftest.py') if directory else 'conftest.py'
+            if conftest in imports:
+                closure.add(conftest)
+            if not directory:
+                break
+            directory = os.path.dirname(directory)
+        queue = deque(closure)
+        while queue:
+            for name in imports.get(queue.popleft(), ()):
+                for module, path in modules.get(_last(name), ()):
+                    if path not in closure and _resolves_to(module, name):
+                        closure.add(path)
+                        queue.append(path)
+        return closure
+
+    # Makefiles
+
+    def _make_targets(self, changed: List[str], state: TreeState) -> List[Target]:
+        targets = []
+        for makefile in sorted(path for path in state if os.path.basename(path) in MAKEFILES):
+            directory = os.path.dirname(makefile)
+            prefix = directory + '/' if directory else ''
+            relative = [path[len(prefix):] for path in changed if path.startswith(prefix)]
+            if not relative:
+                continue
+            rules, default = parse_makefile(self._read(makefile))
+            if makefile in changed:
+                goals = [default] if default else []
+            else:
+                goals = make_goals(rules, default, relative)
+            if goals:
+                command = f"make -C {shlex.quote(directory or '.')} {' '.join(shlex.quote(goal) for goal in goals)}"
+                targets.append(Target('make', command, self._files_under(directory, state)))
+        return targets
+
+    # Cargo and npm: packages, their path dependencies and who depends on them
+
+    def _package_targets(self, kind: str, manifest_name: str, changed: List[str], state: TreeState,
+                         relevant: Callable[[str], bool], dependencies: Callable[[str], Iterable[str]],
+                         command: Callable[[str, str], Optional[str]]) -> List[Target]:
+        packages = {os.path.dirname(path) for path in state if os.path.basename(path) == manifest_name}
+        touched = {self._nearest(path, packages) for path in changed if relevant(path)}
+        touched.discard(None)
+        if not touched:
+            return []
+        depends_on: Dict[str, Set[str]] = {}
+        dependents: Dict[str, Set[str]] = defaultdict(set)
+        for package in packages:
+            manifest = os.path.join(package, manifest_name) if package else manifest_name
+            depends_on[package] = set()
+            for relative in dependencies(manifest):
+                dependency = os.path.normpath(os.path.join(package, relative))
+                if dependency in packages:
+                    depends_on[package].add(dependency)
+                    dependents[dependency].add(package)
+        affected = set(touched)
+        queue = deque(affected)
+        while queue:
+            for dependent in dependents[queue.popleft()]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    queue.append(dependent)
+
+        targets = []
+        for package in sorted(affected):
+            manifest = os.path.join(package, manifest_name) if package else manifest_name
+            line = command(package, manifest)
+            if line is None:
+                continue
+            inputs = set(self._files_under(package, state))
+            seen, queue = {package}, deque([package])
+            while queue:
+                for dependency in depends_on[queue.popleft()]:
+                    if dependency not in seen:
+                        seen.add(dependency)
+                        queue.append(dependency)
+                        inputs.update(self._files_under(dependency, state))
+            targets.append(Target(kind, line, tuple(sorted(inputs))))
+        return targets
+
+    def _cargo_targets(self, changed: List[str], state: TreeState) -> List[Target]:
+        def relevant(path: str) -> bool:
+            return path.endswith('.rs') or os.path.basename(path) in CARGO_FILES
+
+        def dependencies(manifest: str) -> Iterable[str]:
+            try:
+                import tomllib
+                data = tomllib.loads(self._read(manifest))
+            except Exception:
+                return []
+            tables = [data.get(key, {}) for key in ('dependencies', 'dev-dependencies', 'build-dependencies')]
+            return [spec['path'] for table in tables for spec in table.values()
+                    if isinstance(spec, dict) and 'path' in spec]
+
+        return self._package_targets('cargo', 'Cargo.toml', changed, state, relevant, dependencies,
+                                     lambda package, manifest: f"cargo test --quiet --manifest-path {shlex.quote(manifest)}")
+
+    def _npm_targets(self, changed: List[str], state: TreeState) -> List[Target]:
+        def load(manifest: str) -> dict:
+            try:
+                data = json.loads(self._read(manifest))
+            except ValueError:
+                return {}
+            return data if isinstance(data, dict) else {}
+
+        def relevant(path: str) -> bool:
+            return path.endswith(JS_SUFFIXES)
+
+        def dependencies(manifest: str) -> Iterable[str]:
+            data = load(manifest)
+            specs = [spec for key in ('dependencies', 'devDependencies')
+                     for spec in (data.get(key) or {}).values()]
+            return [spec[len('file:'):] for spec in specs if isinstance(spec, str) and spec.startswith('file:')]
+
+        def command(package: str, manifest: str) -> Optional[str]:
+            scripts = load(manifest).get('scripts') or {}
+            if scripts.get('test') and NPM_PLACEHOLDER not in scripts['test']:
+                return f"npm --prefix {shlex.quote(package or '.')} test"
+            if scripts.get('build'):
+                return f"npm --prefix {shlex.quote(package or '.')} run build"
+            return None
+
+        return self._package_targets('npm', 'package.json', changed, state, relevant, dependencies, command)
+
+
+def format_results(changed: List[str], results: List[TargetResult]) -> str:
+    shown = ', '.join(changed[:10]) + (f" and {len(changed) - 10} more" if len(changed) > 10 else '')
+    if not results:
+        return f"Verification: no tests or builds depend on {shown}"
+    lines = [f"Verification of {shown}:"]
+    for result in results:
+        status = 'cached' if result.cached else ('passed' if result.ok else 'FAILED')
+        lines.append(f"  {status} {result.target.command} ({result.seconds:.1f}s)")
+        if not result.ok:
+            lines.append(result.output)
+    return '\n'.join(lines)
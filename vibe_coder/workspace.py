@@ -0,0 +1,501 @@
+import functools
+import heapq
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .context import approximate_tokens
+
+# Never worth indexing, whatever .gitignore says
+DEFAULT_IGNORES = {
+    '.git', '.hg', '.svn', '__pycache__', 'node_modules', '.venv', 'venv',
+    '.mypy_cache', '.pytest_cache', '.tox',
+}
+# Files vibe_coder keeps in a workspace while a plan runs, never indexed
+PRIVATE_PREFIX = '.vibe_coder-'
+# Directories holding workspace snapshots (see snapshot.py)
+SNAPSHOT_PREFIX = PRIVATE_PREFIX + 'snapshot-'
+
+WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+# Words of camelCase and acronyms: parse|HTTP|Request
+CAMEL = re.compile(r'[a-z]+|[A-Z](?:[a-z]+|[A-Z]*(?![a-z]))|[0-9]+')
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'i', 'in', 'is', 'it',
+    'me', 'my', 'of', 'on', 'or', 'please', 'so', 'that', 'the', 'this', 'to', 'we', 'with', 'you',
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# A posting packs (chunk id << TF_BITS) | term frequency into one integer
+TF_BITS = 16
+TF_MAX = (1 << TF_BITS) - 1
+
+
+@functools.lru_cache(maxsize=65536)
+def _expand(word: str) -> Tuple[str, ...]:
+    lower = word.lower()
+    parts = [part.lower() for piece in word.split('_') for part in CAMEL.findall(piece)]
+    return (lower, *parts) if len(parts) > 1 else (lower,)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased identifiers, plus their snake_case and camelCase parts"""
+    return [token for word in WORD.findall(text) for token in _expand(word)]
+
+
+def term_counts(text: str) -> Counter:
+    """Terms of a text with their counts: every identifier, lower-cased, and every
+    snake_case/camelCase part of one. Both passes run in C; a one-part word is
+    counted by both, which BM25's saturation barely notices."""
+    counts = Counter(WORD.findall(text.lower()))
+    counts.update(map(str.lower, CAMEL.findall(text)))
+    return counts
+
+
+def worth_indexing(root: str) -> bool:
+    """False for / and the home directory (or above): far too big, and rarely the project"""
+    root = os.path.abspath(root)
+    home = os.path.abspath(os.path.expanduser('~'))
+    return root != '/' and not (home + '/').startswith(root.rstrip('/') + '/')
+
+
+class IgnoreRule(NamedTuple):
+    pattern: "re.Pattern"
+    negate: bool
+    dir_only: bool
+
+
+def parse_gitignore(text: str) -> List[IgnoreRule]:
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate or line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        # A pattern with a slash is relative to the .gitignore's directory;
+        # otherwise it matches a name at any depth
+        anchored = '/' in line
+        body = _glob_to_regex(line.lstrip('/'))
+        rules.append(IgnoreRule(re.compile(body if anchored else f'(?:.*/)?{body}'), negate, dir_only))
+    return rules
+
+
+def _glob_to_regex(glob: str) -> str:
+    out, i = [], 0
+    while i < len(glob):
+        if glob.startswith('**/', i):
+            out.append('(?:.*/)?')
+            i += 3
+        elif glob.startswith('/**', i) and i + 3 == len(glob):
+            out.append('/.*')
+            i += 3
+        elif glob[i] == '*':
+            out.append('[^/]*')
+            i += 1
+        elif glob[i] == '?':
+            out.append('[^/]')
+            i += 1
+        elif glob[i] == '[' and ']' in glob[i + 1:]:
+            end = glob.index(']', i + 1)
+            out.append('[' + glob[i + 1:end].replace('\\', '\\\\') + ']')
+            i = end + 1
+        else:
+            out.append(re.escape(glob[i]))
+            i += 1
+    return ''.join(out)
+
+
+class IgnoreFile(NamedTuple):
+    # A root-relative path p is matched as prefix + p[strip:], i.e. relative
+    # to the directory of the .gitignore, which may be above the root
+    prefix: str
+    strip: int
+    rules: Tuple[IgnoreRule, ...]
+
+
+RuleStack = Tuple[IgnoreFile, ...]
+
+
+def is_ignored(path: str, is_dir: bool, stack: RuleStack) -> bool:
+    """Whether a root-relative path is ignored; the last matching rule wins"""
+    ignored = False
+    for ignore in stack:
+        relative = ignore.prefix + path[ignore.strip:]
+        for rule in ignore.rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.pattern.fullmatch(relative):
+                ignored = not rule.negate
+    return ignored
+
+
+def git_root(path: str) -> Optional[str]:
+    """The nearest directory at or above path that holds a .git"""
+    path = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(path, '.git')):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+class Snippet(NamedTuple):
+    path: str
+    start: int
+    end: int
+    score: float
+
+
+class RefreshStats(NamedTuple):
+    files: int
+    updated: int
+    removed: int
+
+
+class _Directory(NamedTuple):
+    mtime_ns: int
+    signature: Tuple[int, ...]
+    files: Tuple[str, ...]
+    dirs: Tuple[str, ...]
+
+
+class _File(NamedTuple):
+    mtime_ns: int
+    size: int
+    # Chunks of a file have consecutive ids
+    first: int
+    count: int
+
+
+class TreeWalker:
+    """Lists the files under a directory that no .gitignore excludes.
+
+    Listings, with their ignore decisions, are cached and reused while
+    neither the directory's mtime nor any .gitignore they depend on
+    (including those up to the git root) changed.
+    """
+
+    def __init__(self, root: str, max_files: int = 20000):
+        self.root = os.path.abspath(root)
+        self.max_files = max_files
+        self._dirs: Dict[str, _Directory] = {}
+        self._gitignores: Dict[str, Tuple[int, Tuple[IgnoreRule, ...]]] = {}
+
+    def walk(self) -> Iterator[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]:
+        """(directory, subdirectories, files) for each directory, like os.walk with relative paths"""
+        stack, signature = self._outer_rules()
+        pending: List[Tuple[str, RuleStack, Tuple[int, ...]]] = [('', stack, signature)]
+        while pending:
+            directory, stack, signature = pending.pop()
+            absolute = os.path.join(self.root, directory)
+            try:
+                mtime_ns = os.stat(absolute).st_mtime_ns
+            except OSError:
+                continue
+            stack, signature = self._rules(directory, stack, signature)
+            listing = self._dirs.get(directory)
+            if listing is None or listing.mtime_ns != mtime_ns or listing.signature != signature:
+                listing = self._list(directory, mtime_ns, stack, signature)
+                if listing is None:
+                    continue
+                self._dirs[directory] = listing
+            yield directory, listing.dirs, listing.files
+            for name in reversed(listing.dirs):
+                pending.append((os.path.join(directory, name) if directory else name, stack, signature))
+
+    def files(self) -> Iterator[str]:
+        """Relative paths of at most max_files files"""
+        count = 0
+        for directory, _, files in self.walk():
+            for name in files:
+                if count >= self.max_files:
+                    return
+                count += 1
+                yield os.path.join(directory, name) if directory else name
+
+    def _outer_rules(self) -> Tuple[RuleStack, Tuple[int, ...]]:
+        """.gitignore files between the git root and the index root, outermost first"""
+        top = git_root(self.root)
+        if top is None or top == self.root:
+            return (), ()
+        stack: List[IgnoreFile] = []
+        signature: List[int] = []
+        directory = top
+        for name in os.path.relpath(self.root, top).split(os.sep):
+            mtime_ns, rules = self._load_gitignore(os.path.join(directory, '.gitignore'), directory)
+            signature.append(mtime_ns)
+            if rules:
+                stack.append(IgnoreFile(os.path.relpath(self.root, directory) + '/', 0, rules))
+            directory = os.path.join(directory, name)
+        return tuple(stack), tuple(signature)
+
+    def _rules(self, directory: str, stack: RuleStack, signature: Tuple[int, ...]):
+        """Add a directory's .gitignore, if any, to the rules inherited from its parents"""
+        mtime_ns, rules = self._load_gitignore(os.path.join(self.root, directory, '.gitignore'), directory)
+        if not mtime_ns:
+            return stack, signature + (0,)
+        return stack + (IgnoreFile('', len(directory) + 1 if directory else 0, rules),), signature + (mtime_ns,)
+
+    def _load_gitignore(self, path: str, key: str) -> Tuple[int, Tuple[IgnoreRule, ...]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self._gitignores.pop(key, None)
+            return 0, ()
+        cached = self._gitignores.get(key)
+        if cached is None or cached[0] != mtime_ns:
+            try:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    cached = (mtime_ns, tuple(parse_gitignore(f.read())))
+            except OSError:
+                cached = (mtime_ns, ())
+            self._gitignores[key] = cached
+        return cached
+
+    def _list(self, directory: str, mtime_ns: int, stack: RuleStack,
+              signature: Tuple[int, ...]) -> Optional[_Directory]:
+        files, dirs = [], []
+        try:
+            with os.scandir(os.path.join(self.root, directory)) as entries:
+                for entry in entries:
+                    if entry.name in DEFAULT_IGNORES or entry.name.startswith(PRIVATE_PREFIX) or entry.is_symlink():
+                        continue
+                    is_dir = entry.is_dir()
+                    if not is_dir and not entry.is_file():
+                        continue
+                    path = os.path.join(directory, entry.name) if directory else entry.name
+                    if is_ignored(path, is_dir, stack):
+                        continue
+                    (dirs if is_dir else files).append(entry.name)
+        except OSError:
+            return None
+        return _Directory(mtime_ns, signature, tuple(sorted(files)), tuple(sorted(dirs)))
+
+
+class WorkspaceIndex:
+    """BM25 index of the text files under a directory, kept current incrementally.
+
+    A refresh stats every file but only reads the ones whose mtime or size
+    changed; directory listings (with their .gitignore decisions, including
+    those of .gitignore files up to the git root) are reused while nothing
+    they depend on changed. Files are read and tokenized without holding
+    the index lock, so searches keep answering from the previous state
+    while a refresh runs. At most max_files files and max_bytes of text
+    are indexed.
+
+    Chunks live in flat arrays and each term's postings in one array of
+    packed integers. Replaced chunks are only marked dead, and the arrays
+    are compacted once dead chunks outnumber live ones.
+    """
+
+    def __init__(self, root: str, chunk_lines: int = 40, max_files: int = 20000,
+                 max_bytes: int = 16 * 1024 * 1024, max_file_bytes: int = 256 * 1024):
+        self.root = os.path.abspath(root)
+        self.chunk_lines = chunk_lines
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        # Set once the first full refresh has finished
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        # Only used by the refreshing thread
+        self._walker = TreeWalker(self.root, max_files)
+        # Index state, guarded by _lock
+        self._files: Dict[str, _File] = {}
+        self._chunk_path: List[str] = []
+        self._chunk_start = array('I')
+        self._chunk_end = array('I')
+        # 0 marks a dead chunk
+        self._chunk_length = array('I')
+        self._postings: Dict[str, array] = {}
+        self._live = 0
+        self._total_length = 0
+        self._indexed_bytes = 0
+
+    def refresh(self) -> RefreshStats:
+        with self._refresh_lock:
+            seen: Set[str] = set()
+            updated = 0
+            for path in self._walker.files():
+                try:
+                    st = os.stat(os.path.join(self.root, path))
+                except OSError:
+                    continue
+                seen.add(path)
+                known = self._files.get(path)
+                if known is not None and known.mtime_ns == st.st_mtime_ns and known.size == st.st_size:
+                    continue
+                freed = known.size if known is not None and known.count else 0
+                if st.st_size <= self.max_file_bytes and self._indexed_bytes - freed + st.st_size > self.max_bytes:
+                    continue
+                chunks = self._read_chunks(path, st.st_size)
+                with self._lock:
+                    self._remove(path)
+                    self._add(path, st, chunks)
+                updated += 1
+            with self._lock:
+                removed = [path for path in self._files if path not in seen]
+                for path in removed:
+                    self._remove(path)
+                if len(self._chunk_length) - self._live > max(self._live, 1024):
+                    self._compact()
+                files = len(self._files)
+            self.ready.set()
+            return RefreshStats(files, updated, len(removed))
+
+    def refresh_async(self) -> threading.Thread:
+        """Refresh in a background thread, unless one is already running"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.refresh, name="vibe-coder-index", daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def _read_chunks(self, path: str, size: int) -> List[Tuple[int, int, Counter]]:
+        """(first line, last line, term counts) per chunk; none for large, binary and unreadable files"""
+        if size > self.max_file_bytes:
+            return []
+        try:
+            with open(os.path.join(self.root, path), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return []
+        if b'\0' in data[:8192]:
+            return []
+        lines = data.decode('utf-8', errors='replace').splitlines()
+        path_terms = term_counts(path)
+        chunks = []
+        for start in range(0, len(lines), self.chunk_lines):
+            end = min(start + self.chunk_lines, len(lines))
+            terms = term_counts('\n'.join(lines[start:end]))
+            terms.update(path_terms)
+            chunks.append((start + 1, end, terms))
+        return chunks
+
+    def _add(self, path: str, st: os.stat_result, chunks: List[Tuple[int, int, Counter]]):
+        first = len(self._chunk_length)
+        postings = self._postings
+        for start, end, terms in chunks:
+            chunk_id = len(self._chunk_length)
+            length = max(sum(terms.values()), 1)
+            self._chunk_path.append(path)
+            self._chunk_start.append(start)
+            self._chunk_end.append(end)
+            self._chunk_length.append(length)
+            self._total_length += length
+            shifted = chunk_id << TF_BITS
+            for term, count in terms.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = array('Q')
+                posting.append(shifted | (count if count < TF_MAX else TF_MAX))
+        self._live += len(chunks)
+        if chunks:
+            self._indexed_bytes += st.st_size
+        self._files[path] = _File(st.st_mtime_ns, st.st_size, first, len(chunks))
+
+    def _remove(self, path: str):
+        known = self._files.pop(path, None)
+        if known is None:
+            return
+        for chunk_id in range(known.first, known.first + known.count):
+            self._total_length -= self._chunk_length[chunk_id]
+            self._chunk_length[chunk_id] = 0
+        self._live -= known.count
+        if known.count:
+            self._indexed_bytes -= known.size
+
+    def _compact(self):
+        """Drop dead chunks and their postings, renumbering the live ones"""
+        renumber = array('q', [-1]) * len(self._chunk_length)
+        paths: List[str] = []
+        starts, ends, lengths = array('I'), array('I'), array('I')
+        for chunk_id, length in enumerate(self._chunk_length):
+            if length:
+                renumber[chunk_id] = len(lengths)
+                paths.append(self._chunk_path[chunk_id])
+                starts.append(self._chunk_start[chunk_id])
+                ends.append(self._chunk_end[chunk_id])
+                lengths.append(length)
+        postings: Dict[str, array] = {}
+        for term, posting in self._postings.items():
+            kept = array('Q', (renumber[entry >> TF_BITS] << TF_BITS | entry & TF_MAX
+                               for entry in posting if renumber[entry >> TF_BITS] >= 0))
+            if kept:
+                postings[term] = kept
+        self._files = {path: known._replace(first=renumber[known.first]) if known.count else known
+                       for path, known in self._files.items()}
+        self._chunk_path, self._chunk_start, self._chunk_end, self._chunk_length = paths, starts, ends, lengths
+        self._postings = postings
+
+    def search(self, query: str, k: int = 5) -> List[Snippet]:
+        """The k chunks that best match the query, best first"""
+        with self._lock:
+            total = self._live
+            if not total:
+                return []
+            average = self._total_length / total
+            lengths = self._chunk_length
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)) - STOPWORDS:
+                posting = self._postings.get(term)
+                # Terms in most chunks say little and cost the most to score
+                if not posting or len(posting) > total // 2 + 1:
+                    continue
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                for entry in posting:
+                    chunk_id = entry >> TF_BITS
+                    length = lengths[chunk_id]
+                    if not length:
+                        continue
+                    count = entry & TF_MAX
+                    norm = K1 * (1 - B + B * length / average)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (K1 + 1) / (count + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [Snippet(self._chunk_path[chunk_id], self._chunk_start[chunk_id],
+                            self._chunk_end[chunk_id], score) for chunk_id, score in best]
+
+    def context(self, query: str, budget_tokens: int, k: int = 8,
+                count_tokens: Callable[[str], int] = approximate_tokens) -> str:
+        """The best matching snippets that fit the budget, formatted for a prompt.
+
+        Starts a background refresh and answers from the index as it is:
+        nothing until the first refresh has finished, possibly slightly
+        stale results after that.
+        """
+        ready = self.ready.is_set()
+        self.refresh_async()
+        if not ready:
+            return ''
+        sections = []
+        for snippet in self.search(query, k):
+            try:
+                with open(os.path.join(self.root, snippet.path), encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()[snippet.start - 1:snippet.end]
+            except OSError:
+                continue
+            section = f"{snippet.path} (lines {snippet.start}-{snippet.end}):\n```\n" + '\n'.join(lines) + "\n```"
+            cost = count_tokens(section)
+            if cost > budget_tokens:
+                continue
+            budget_tokens -= cost
+            sections.append(section)
+        if not sections:
+            return ''
+        return "Relevant files in the current directory:\n\n" + '\n\n'.join(sections)